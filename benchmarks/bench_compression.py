@@ -0,0 +1,90 @@
+"""Compare compression codecs on a representative habits + tasks database.
+
+Usage: python benchmarks/bench_compression.py [--habits 40] [--years 3] [--tasks 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.db import init_db, open_memory_db  # noqa: E402
+from services.security_service import derive_session_key, encrypt_stream, decrypt_stream  # noqa: E402
+
+WORDS = "zrobic raport spotkanie zakupy trening czytanie projekt poprawki klient faktura".split()
+
+
+def build_image(habits: int, years: int, tasks: int) -> bytes:
+    rng = random.Random(42)
+    conn = open_memory_db()
+    init_db(conn)
+    conn.executemany(
+        "INSERT INTO habits(name, type, goal_type, goal_value) VALUES (?, ?, ?, ?)",
+        [
+            (f"Nawyk {i}", rng.choice(["binary", "quantity"]), rng.choice(["daily", "weekly"]), 1)
+            for i in range(habits)
+        ],
+    )
+    start = date.today() - timedelta(days=365 * years)
+    logs = [
+        (h, (start + timedelta(days=d)).isoformat(), rng.randint(1, 5))
+        for h in range(1, habits + 1)
+        for d in range(365 * years)
+        if rng.random() < 0.7
+    ]
+    conn.executemany("INSERT INTO habit_logs(habit_id, date, value) VALUES (?, ?, ?)", logs)
+    conn.execute("INSERT INTO projects(name) VALUES ('General')")
+    conn.executemany(
+        "INSERT INTO tasks(project_id, title, status, priority, notes) VALUES (1, ?, ?, ?, ?)",
+        [
+            (
+                " ".join(rng.choices(WORDS, k=4)),
+                rng.choice(["TODO", "IN_PROGRESS", "DONE", "CANCELED"]),
+                rng.randint(1, 5),
+                " ".join(rng.choices(WORDS, k=rng.randint(0, 30))) or None,
+            )
+            for _ in range(tasks)
+        ],
+    )
+    conn.commit()
+    # Leave some free pages behind, as a long-lived DB would have.
+    conn.execute("DELETE FROM tasks WHERE id % 7 = 0")
+    conn.commit()
+    return conn.serialize()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--habits", type=int, default=40)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--tasks", type=int, default=20000)
+    args = parser.parse_args()
+
+    image = build_image(args.habits, args.years, args.tasks)
+    session = derive_session_key("bench")
+    print(f"image: {len(image) / 1e6:.2f} MB")
+    print(f"{'codec':<10}{'level':>6}{'size MB':>10}{'ratio':>8}{'enc s':>8}{'dec s':>8}")
+    for codec, level in [("none", None), ("zlib", 1), ("zlib", 6), ("lzma", 1), ("lzma", 6), ("bz2", 9)]:
+        out = io.BytesIO()
+        t0 = time.perf_counter()
+        encrypt_stream(io.BytesIO(image), out, session, codec=codec, level=level)
+        t1 = time.perf_counter()
+        back = io.BytesIO()
+        decrypt_stream(io.BytesIO(out.getvalue()), back, session)
+        t2 = time.perf_counter()
+        assert back.getvalue() == image
+        size = len(out.getvalue())
+        print(
+            f"{codec:<10}{level if level is not None else '-':>6}{size / 1e6:>10.2f}"
+            f"{len(image) / size:>8.1f}{t1 - t0:>8.2f}{t2 - t1:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Time a large task import through the streaming JSON / NDJSON readers.
+
+Usage: python benchmarks/bench_import.py [--tasks 100000] [--updates 20000] [--format ndjson] [--memory]
+
+``--memory`` reports the peak Python allocation; tracing slows the run down.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.db import init_db, open_memory_db  # noqa: E402
+from services.task_import import iter_records  # noqa: E402
+from services.tasks_service import import_tasks  # noqa: E402
+
+WORDS = "zrobic raport spotkanie zakupy trening czytanie projekt poprawki klient faktura".split()
+
+
+def make_records(tasks: int, updates: int, rng: random.Random):
+    for _ in range(tasks):
+        record = {"title": " ".join(rng.choices(WORDS, k=4)), "priority": rng.randint(1, 5)}
+        if rng.random() < 0.5:
+            record["week"] = f"2024-W{rng.randint(1, 52):02d}"
+        yield record
+    for _ in range(updates):
+        record = {"id": rng.randint(1, tasks), "status": rng.choice(["IN_PROGRESS", "DONE"])}
+        if rng.random() < 0.3:
+            record["notes"] = "zmienione"
+        yield record
+
+
+def write_input(path: Path, fmt: str, tasks: int, updates: int) -> None:
+    rng = random.Random(7)
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "ndjson":
+            for record in make_records(tasks, updates, rng):
+                f.write(json.dumps(record) + "\n")
+        else:
+            f.write('{"tasks": [\n')
+            for i, record in enumerate(make_records(tasks, updates, rng)):
+                f.write((",\n" if i else "") + json.dumps(record))
+            f.write("\n]}\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--format", choices=["json", "ndjson"], default="ndjson")
+    parser.add_argument("--memory", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"tasks.{args.format}"
+        write_input(path, args.format, args.tasks, args.updates)
+        size = path.stat().st_size
+
+        conn = open_memory_db()
+        init_db(conn)
+        if args.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        report = import_tasks(conn, iter_records(path), keep_results=False)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if args.memory else None
+        tracemalloc.stop()
+        conn.close()
+
+    print(f"input      {size / 1e6:8.1f} MB ({args.format})")
+    print(f"records    {report.total:8d}  {report.counts}")
+    print(f"assigned   {report.assigned:8d}")
+    print(f"time       {elapsed:8.2f} s  ({report.total / elapsed:,.0f} rows/s)")
+    if peak is not None:
+        print(f"peak alloc {peak / 1e6:8.1f} MB (Python heap, excluding SQLite)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Time the weekly flow report over a multi-year task history.
+
+Usage: python benchmarks/bench_reports.py [--years 5] [--tasks-per-week 150]
+
+History is generated straight into ``tasks`` / ``task_events`` /
+``weekly_assignments``; only :func:`weekly_report` is timed.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.analytics_service import weekly_report  # noqa: E402
+from services.db import init_db, open_memory_db  # noqa: E402
+from services.week_service import iso_week  # noqa: E402
+
+
+def populate(conn, years: int, per_week: int, rng: random.Random) -> int:
+    start = datetime.combine(date.today() - timedelta(weeks=52 * years), datetime.min.time())
+    tasks, events, plans = [], [], []
+    task_id = 0
+    for week in range(52 * years):
+        monday = start + timedelta(weeks=week)
+        for _ in range(per_week):
+            task_id += 1
+            created = monday - timedelta(hours=rng.randint(0, 24 * 14))
+            tasks.append((task_id, f"t{task_id}", created.strftime("%Y-%m-%d %H:%M:%S")))
+            events.append((task_id, created, None, "TODO"))
+            plans.append((task_id, iso_week(monday.date())))
+            at, status = created, "TODO"
+            for target in ("IN_PROGRESS", "DONE"):
+                if rng.random() < 0.15:
+                    break
+                at = max(at, monday) + timedelta(hours=rng.randint(1, 24 * 4))
+                events.append((task_id, at, status, target))
+                status = target
+    conn.execute("DROP TRIGGER tr_tasks_insert_event")
+    conn.executemany(
+        "INSERT INTO tasks(id, project_id, title, created_at) VALUES (?, 1, ?, ?)", tasks
+    )
+    conn.executemany(
+        "INSERT INTO task_events(task_id, at, from_status, to_status) VALUES (?, ?, ?, ?)",
+        [(t, at.strftime("%Y-%m-%d %H:%M:%S"), f, s) for t, at, f, s in events],
+    )
+    conn.executemany(
+        "INSERT INTO weekly_assignments(task_id, iso_week) VALUES (?, ?)", plans
+    )
+    conn.commit()
+    return len(events)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--tasks-per-week", type=int, default=150)
+    args = parser.parse_args()
+
+    conn = open_memory_db()
+    init_db(conn)
+    conn.execute("INSERT INTO projects(name) VALUES ('General')")
+    events = populate(conn, args.years, args.tasks_per_week, random.Random(3))
+    today = date.today()
+    first = iso_week(today - timedelta(weeks=52 * args.years))
+
+    start = time.perf_counter()
+    report = weekly_report(conn, first, iso_week(today))
+    elapsed = time.perf_counter() - start
+
+    print(f"events     {events:8d}")
+    print(f"weeks      {len(report.weeks):8d}")
+    print(f"planned    {int(report.planned.sum()):8d}  done {int(report.done.sum())}")
+    print(f"time       {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
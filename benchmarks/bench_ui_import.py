@@ -0,0 +1,80 @@
+"""Measure GUI frame pacing while a large import runs on the database executor.
+
+Usage: python benchmarks/bench_ui_import.py [--tasks 100000] [--updates 20000]
+
+A 60 Hz timer stands in for painting; the gaps between its ticks show how long
+the event loop was kept from drawing while the main window's views stay open.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from PySide6.QtCore import QEventLoop, QTimer  # noqa: E402
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+from app import MainWindow  # noqa: E402
+from bench_import import write_input  # noqa: E402
+from services.db import init_db, open_memory_db  # noqa: E402
+from services.db_executor import BACKGROUND, DbExecutor  # noqa: E402
+from services.task_import import iter_records  # noqa: E402
+from services.tasks_service import import_tasks  # noqa: E402
+
+FRAME_MS = 16
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--updates", type=int, default=20_000)
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication([])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "tasks.ndjson"
+        write_input(path, "ndjson", args.tasks, args.updates)
+
+        conn = open_memory_db(check_same_thread=False)
+        init_db(conn)
+        executor = DbExecutor(conn)
+        win = MainWindow(conn, executor=executor)
+        win.resize(1000, 700)
+        win.show()
+
+        ticks: list[float] = []
+        frames = QTimer()
+        frames.timeout.connect(lambda: ticks.append(time.perf_counter()))
+        frames.start(FRAME_MS)
+        start = time.perf_counter()
+        job = executor.submit(import_tasks, iter_records(path), keep_results=False, priority=BACKGROUND)
+        loop = QEventLoop()
+        poll = QTimer()
+        poll.timeout.connect(lambda: job.done() and loop.quit())
+        poll.start(FRAME_MS)
+        loop.exec()
+        elapsed = time.perf_counter() - start
+        frames.stop()
+        report = job.result()
+        executor.shutdown()
+        conn.close()
+
+    gaps = sorted((b - a) * 1000 for a, b in zip(ticks, ticks[1:]))
+    print(f"records    {report.total:8d}  {report.counts}")
+    print(f"import     {elapsed:8.2f} s on the worker")
+    print(f"frames     {len(ticks):8d}  ({len(ticks) / elapsed:.0f}/s, timer at {1000 / FRAME_MS:.0f}/s)")
+    if gaps:
+        print(
+            f"frame gap  p50 {gaps[len(gaps) // 2]:.1f} ms  p99 {gaps[int(len(gaps) * 0.99)]:.1f} ms"
+            f"  max {gaps[-1]:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
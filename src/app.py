@@ -1,74 +1,292 @@
 """Application bootstrap."""
 from __future__ import annotations
 
+import time
+
+_LAUNCHED = time.perf_counter()  # before the imports below, which count toward startup
+
+import importlib
 import sys
 from pathlib import Path
-from datetime import date
+from typing import Optional
 
-import yaml
-from PySide6.QtWidgets import QApplication, QMainWindow, QTabWidget
+from PySide6.QtCore import QEvent, QObject
+from PySide6.QtWidgets import QApplication, QMainWindow, QTabWidget, QVBoxLayout, QWidget
 
-from services.db import get_connection, init_db
-from services.week_service import rollover_tasks
-from services.security_service import decrypt_file, encrypt_file, secure_delete
-from services.backup_service import local_backup
+# Services are imported in main() where each phase first needs them, so the
+# cost of crypto, backups and the executor counts toward that phase and not
+# toward loading this module.
 
 DEFAULT_CONFIG = {
     "db_plain_path": "./data/app.db",
     "db_encrypted_path": "./data/app.db.enc",
     "backup_path": "./backup/",
+    "backup_keep_last": 14,
+    "backup_max_age_days": 90,
+    "upload_backend": "none",
     "auto_lock_minutes": 10,
-    "default_view": "minimal",
+    "checkpoint_interval_seconds": 120,
+    "checkpoint_idle_seconds": 15,
+    "kdf_target_ms": 500,
+    "db_mode": "memory",
+    "compression": "zlib",
+    "compression_level": 6,
+    "default_view": "today",
+    "startup_report": False,
+}
+
+# Tab key -> (title, module, class), in tab order.  Modules are imported when
+# their tab is first shown, so e.g. NumPy loads with the reports.
+VIEWS = {
+    "today": ("Dziś", "ui.today_view", "TodayView"),
+    "calendar": ("Kalendarz", "ui.calendar_view", "CalendarView"),
+    "tasks": ("Zadania", "ui.tasks_view", "TasksView"),
+    "reports": ("Raporty", "ui.reports_view", "ReportsView"),
 }
+# Older config files call the Today tab "minimal".
+VIEW_ALIASES = {"minimal": "today"}
 
 
 def load_config() -> dict:
     path = Path("config.yaml")
     if path.exists():
+        import yaml
+
         return yaml.safe_load(path.read_text())
     return DEFAULT_CONFIG.copy()
 
 
+class StartupTimer(QObject):
+    """Wall-clock phases from launch to the first painted frame."""
+
+    def __init__(self, started: float = _LAUNCHED):
+        super().__init__()
+        self.started = self._last = started
+        self.phases: list[tuple[str, float]] = []
+        self.first_paint: Optional[float] = None
+
+    def mark(self, phase: str) -> None:
+        """Close *phase*: it took the time since the previous mark."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def watch(self, window: QWidget) -> None:
+        """Record the first paint of *window* as the end of startup."""
+        window.installEventFilter(self)
+
+    # Qt override
+    def eventFilter(self, obj, event):  # noqa: N802
+        if event.type() == QEvent.Paint and self.first_paint is None:
+            obj.removeEventFilter(self)
+            self.mark("first paint")
+            self.first_paint = time.perf_counter() - self.started
+        return False
+
+    def report(self) -> str:
+        lines = [f"{phase:<14}{seconds * 1000:8.1f} ms" for phase, seconds in self.phases]
+        total = self.first_paint if self.first_paint is not None else self._last - self.started
+        label = "to first paint" if self.first_paint is not None else "total"
+        return "\n".join(["startup:", *lines, f"{label:<14}{total * 1000:8.1f} ms"])
+
+
 class MainWindow(QMainWindow):
-    def __init__(self, conn):
+    """Tabbed main window; each view is built the first time its tab is shown."""
+
+    def __init__(self, conn, executor=None, default_view: str = "today"):
         super().__init__()
         self.setWindowTitle("Habits + To-Do")
-        tabs = QTabWidget()
-        from ui.today_view import TodayView
-        from ui.calendar_view import CalendarView
-        from ui.tasks_view import TasksView
-        from ui.reports_view import ReportsView
+        from ui.db_runner import DbRunner
+
+        self.conn = conn
+        # One runner for all views: results and change notifications from
+        # the database worker arrive on the GUI thread.
+        self.runner = DbRunner(conn, executor, parent=self)
+        self.tabs = QTabWidget()
+        for title, _, _ in VIEWS.values():
+            page = QWidget()
+            page.setLayout(QVBoxLayout())
+            page.layout().setContentsMargins(0, 0, 0, 0)
+            self.tabs.addTab(page, title)
+        self.setCentralWidget(self.tabs)
 
-        tabs.addTab(TodayView(conn), "Dziś")
-        tabs.addTab(CalendarView(conn), "Kalendarz")
-        tabs.addTab(TasksView(conn), "Zadania")
-        tabs.addTab(ReportsView(conn), "Raporty")
-        self.setCentralWidget(tabs)
+        key = VIEW_ALIASES.get(default_view, default_view)
+        index = list(VIEWS).index(key) if key in VIEWS else 0
+        self.tabs.setCurrentIndex(index)
+        self.tabs.currentChanged.connect(self.view)
+        self.view(index)
+
+    def view(self, index: int) -> QWidget:
+        """Return the view of tab *index*, building it on first use."""
+        page = self.tabs.widget(index)
+        item = page.layout().itemAt(0)
+        if item is not None:
+            return item.widget()
+        _, module, name = list(VIEWS.values())[index]
+        view = getattr(importlib.import_module(module), name)(self.conn, runner=self.runner)
+        page.layout().addWidget(view)
+        return view
 
 
 def main() -> int:
+    timer = StartupTimer()
+    timer.mark("imports")
     config = load_config()
     plain = Path(config["db_plain_path"])
     enc = Path(config["db_encrypted_path"])
     plain.parent.mkdir(parents=True, exist_ok=True)
     backup_dir = Path(config["backup_path"])
 
-    if enc.exists():
-        decrypt_file(enc, plain, "password")  # TODO: prompt for password
+    def setting(key: str):
+        # Older config.yaml files may predate newer keys.
+        return config.get(key, DEFAULT_CONFIG[key])
+
+    from services.db import ReadPool, get_connection, init_db, open_memory_db
+    from services.security_service import (
+        decrypt_file,
+        decrypt_to_bytes,
+        encrypt_bytes,
+        open_session,
+        secure_delete,
+        store_security_meta,
+    )
 
-    conn = get_connection(str(plain))
+    # Derive the key once; every encrypt/decrypt below reuses it.
+    session = open_session(enc, "password", setting("kdf_target_ms"))  # TODO: prompt for password
+    # "memory" keeps the plaintext DB off the disk entirely, "paged" does the
+    # same but saves only changed page blocks; "file" is the original
+    # decrypt-to-disk flow.
+    mode = setting("db_mode")
+    in_memory = mode in ("memory", "paged")
+    store = previous = None
+    if mode == "paged":
+        from services.page_store import PageStore
+
+        # Also reads a whole image saved by another mode; saving converts it.
+        store = PageStore(enc, session)
+    elif enc.exists():
+        from services.page_store import PageStore, is_page_store
+
+        if is_page_store(enc, session):
+            # Saved in "paged" mode: read the blocks once, then save whole images.
+            previous = PageStore(enc, session)
+    # The connection is handed to the database worker once the UI starts.
+    if store is not None:
+        conn = open_memory_db(store.load(), check_same_thread=False)
+    elif in_memory:
+        if previous is not None:
+            data = previous.load()
+        else:
+            data = decrypt_to_bytes(enc, session) if enc.exists() else None
+        conn = open_memory_db(data, check_same_thread=False)
+    else:
+        if enc.exists():
+            # Wipe what a crashed run left behind; SQLite would replay a stale
+            # -wal onto the freshly decrypted image.
+            secure_delete(plain)
+        if previous is not None:
+            plain.write_bytes(previous.load())
+        elif enc.exists():
+            decrypt_file(enc, plain, session)
+        conn = get_connection(str(plain), check_same_thread=False)
+    timer.mark("unlock")
     init_db(conn)
-    rollover_tasks(conn)
+    store_security_meta(conn, session)
+
+    def save(image: bytes) -> None:
+        if store is not None:
+            store.save(image)
+        else:
+            encrypt_bytes(
+                image,
+                enc,
+                session,
+                codec=setting("compression"),
+                level=setting("compression_level"),
+            )
+            if previous is not None:
+                # The manifest is gone; so is any use for its block file.
+                for path in previous.files()[1:]:
+                    path.unlink(missing_ok=True)
 
-    app = QApplication(sys.argv)
-    win = MainWindow(conn)
+    from services.checkpoint_service import Checkpointer
+
+    checkpointer = Checkpointer(conn, save)
+
+    # Off-site uploads left over from earlier runs resume in the background.
+    uploads = None
+    if setting("upload_backend") != "none":
+        from services.upload_service import UploadQueue, make_backend
+
+        backend = make_backend(config)
+        if backend is not None:
+            uploads = UploadQueue(backup_dir / "upload_queue.json", backend)
+            uploads.start()
+    timer.mark("database")
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    from services.db_executor import BACKGROUND, NORMAL, DbExecutor
+    from services.week_service import rollover_tasks
+    from ui.checkpoint_scheduler import CheckpointScheduler
+
+    # From here until shutdown only the executor's worker touches conn.  A
+    # file database can also be opened again read-only, so reports, calendar
+    # months and task pages get readers of their own beside the writer.
+    readers = ReadPool(plain) if mode == "file" else None
+    executor = DbExecutor(conn, read_pool=readers)
+    # Queued ahead of the views' first writer jobs.  Read-only loads on pooled
+    # readers ("file" mode) may still run before it commits; the assignment
+    # change it publishes then patches those views.
+    executor.submit(rollover_tasks, priority=NORMAL)
+    scheduler = CheckpointScheduler(
+        checkpointer,
+        interval_ms=setting("checkpoint_interval_seconds") * 1000,
+        idle_ms=setting("checkpoint_idle_seconds") * 1000,
+        lock_ms=setting("auto_lock_minutes") * 60 * 1000,
+        run=lambda fn: executor.submit(lambda _conn: fn(), priority=BACKGROUND),
+    )
+    # No unlock prompt exists yet, so locking ends the session.
+    scheduler.locked.connect(app.quit)
+    timer.mark("qt")
+    win = MainWindow(conn, executor, setting("default_view"))
+    timer.mark("window")
+    timer.watch(win)
     win.show()
     code = app.exec()
+    if setting("startup_report"):
+        print(timer.report(), file=sys.stderr)
+
+    scheduler.stop()
+    from services.backup_service import drive_backup, snapshot_backup
+    from services.calendar_service import release_month_cache
 
+    # Writes queued at exit (e.g. the last habit clicks) still land.
+    executor.shutdown()
+    if readers is not None:
+        readers.close()
+    release_month_cache(conn)
+    checkpointer.checkpoint()
+    checkpointer.close()
+    image = conn.serialize()
     conn.close()
-    encrypt_file(plain, enc, "password")
-    secure_delete(plain)
-    local_backup(enc, backup_dir)
+    if not in_memory:
+        secure_delete(plain)
+    info = snapshot_backup(
+        image,
+        backup_dir,
+        session,
+        "password",
+        keep_last=setting("backup_keep_last"),
+        max_age_days=setting("backup_max_age_days"),
+        codec=setting("compression"),
+        level=setting("compression_level"),
+    )
+    session.zeroize()
+    if uploads is not None:
+        # Queued for the next run's worker; exit never waits on the network.
+        if info:
+            drive_backup(uploads, backup_dir, info["files"])
+        uploads.stop()
     return code
 
 
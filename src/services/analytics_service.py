@@ -0,0 +1,152 @@
+"""Task flow metrics computed with NumPy over the status history.
+
+``task_events`` (one row per status change, written by triggers) is read once
+into column arrays and reduced per task to creation, first start and close
+times.  Weekly figures for a whole range of weeks then come from a few
+``bincount`` calls instead of one query or Python loop per week, so
+multi-year reports stay fast.
+
+Times are float days since 1970-01-01 in local time; weeks are Monday-based
+ISO weeks like everywhere else in the app.
+"""
+from __future__ import annotations
+
+import sqlite3
+from datetime import date, timedelta
+from typing import NamedTuple
+
+import numpy as np
+
+from .tasks_service import TASK_STATUSES
+
+STATUS_CODES = {status: code for code, status in enumerate(TASK_STATUSES)}
+IN_PROGRESS = STATUS_CODES["IN_PROGRESS"]
+DONE = STATUS_CODES["DONE"]
+CANCELED = STATUS_CODES["CANCELED"]
+_UNIX_EPOCH_JULIAN = 2440587.5
+_EVENT_DTYPE = np.dtype([("task", np.int64), ("at", np.float64), ("status", np.int8)])
+
+
+class TaskTimeline(NamedTuple):
+    """Per-task arrays, sorted by task id; NaN where a moment never happened."""
+
+    ids: np.ndarray
+    created: np.ndarray
+    started: np.ndarray  # first move to IN_PROGRESS
+    closed: np.ndarray  # last move to DONE or CANCELED, if that is the current status
+    status: np.ndarray  # current status code (index into TASK_STATUSES)
+
+
+class WeeklyReport(NamedTuple):
+    """Flow metrics for consecutive ISO weeks; every array has one entry per week."""
+
+    weeks: list[str]
+    planned: np.ndarray  # tasks assigned to the week
+    done: np.ndarray  # planned tasks DONE by the end of the week
+    throughput: np.ndarray  # tasks that reached DONE during the week, planned or not
+    carry_over: np.ndarray  # share of planned tasks still open at the end of the week
+    cycle_time: np.ndarray  # mean days from first start to DONE, by week of DONE
+    lead_time: np.ndarray  # mean days from creation to DONE, by week of DONE
+    burndown: np.ndarray  # (weeks, 7): planned tasks still open after Monday..Sunday
+
+
+def _week_number(iso_week: str) -> int:
+    """Monday-based week count since the epoch (1970-01-01 was a Thursday)."""
+    year, week = iso_week.split("-W")
+    monday = date.fromisocalendar(int(year), int(week), 1)
+    return ((monday - date(1970, 1, 1)).days + 3) // 7
+
+
+def _week_label(number: int) -> str:
+    year, week, _ = (date(1970, 1, 1) + timedelta(days=number * 7 - 3)).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _mean_by(groups: np.ndarray, values: np.ndarray, n: int) -> np.ndarray:
+    sums = np.bincount(groups, weights=values, minlength=n)
+    counts = np.bincount(groups, minlength=n)
+    return np.divide(sums, counts, out=np.full(n, np.nan), where=counts > 0)
+
+
+def task_timeline(conn: sqlite3.Connection) -> TaskTimeline:
+    """Read the whole status history once and reduce it to one entry per task."""
+    cases = " ".join(f"WHEN '{status}' THEN {code}" for status, code in STATUS_CODES.items())
+    cur = conn.cursor()
+    cur.row_factory = None  # plain tuples; Row objects would double the load time
+    cur.execute(
+        f"""
+        SELECT task_id, julianday(at, 'localtime') - {_UNIX_EPOCH_JULIAN},
+               CASE to_status {cases} END
+        FROM task_events ORDER BY id
+        """
+    )
+    events = np.fromiter(cur, dtype=_EVENT_DTYPE)
+    if not len(events):
+        empty = np.empty(0)
+        return TaskTimeline(np.empty(0, np.int64), empty, empty, empty, np.empty(0, np.int8))
+    # Stable sort keeps each task's events in the order they were recorded.
+    events = events[np.argsort(events["task"], kind="stable")]
+    task, at, status = events["task"], events["at"], events["status"]
+    starts = np.flatnonzero(np.r_[True, task[1:] != task[:-1]])
+    ends = np.r_[starts[1:], len(events)] - 1
+
+    current = status[ends]
+    is_closed = (current == DONE) | (current == CANCELED)
+    closed = np.where(is_closed, at[ends], np.nan)
+
+    moves = np.flatnonzero(status == IN_PROGRESS)
+    owners, first = np.unique(np.searchsorted(starts, moves, side="right") - 1, return_index=True)
+    started = np.full(len(starts), np.nan)
+    started[owners] = at[moves[first]]
+    return TaskTimeline(task[starts], at[starts], started, closed, current)
+
+
+def weekly_report(conn: sqlite3.Connection, first_week: str, last_week: str) -> WeeklyReport:
+    """Return flow metrics for every ISO week from *first_week* to *last_week*."""
+    start = _week_number(first_week)
+    n = max(0, _week_number(last_week) - start + 1)
+    timeline = task_timeline(conn)
+
+    # Completions, grouped by the week they happened in.
+    week_done = np.floor((timeline.closed + 3) / 7) - start
+    in_range = (timeline.status == DONE) & (week_done >= 0) & (week_done < n)
+    groups = week_done[in_range].astype(np.int64)
+    closed = timeline.closed[in_range]
+    throughput = np.bincount(groups, minlength=n)
+    lead_time = _mean_by(groups, closed - timeline.created[in_range], n)
+    cycle = closed - timeline.started[in_range]
+    known = ~np.isnan(cycle)
+    cycle_time = _mean_by(groups[known], cycle[known], n)
+
+    # Plans: bucket each assignment by week and the weekday its task closed
+    # (7 = still open at the end of the week).
+    rows = conn.execute(
+        "SELECT task_id, iso_week FROM weekly_assignments WHERE iso_week BETWEEN ? AND ?",
+        (first_week, last_week),
+    ).fetchall()
+    task_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    labels, inverse = np.unique(np.array([row[1] for row in rows], dtype=str), return_inverse=True)
+    plan_week = np.array([_week_number(label) for label in labels], dtype=np.int64)[inverse] - start
+    pos = np.searchsorted(timeline.ids, task_ids)
+    known = pos < len(timeline.ids)
+    known[known] = timeline.ids[pos[known]] == task_ids[known]
+    plan_week, pos = plan_week[known], pos[known]
+    monday = (start + plan_week) * 7 - 3
+    offset = np.nan_to_num(np.floor(timeline.closed[pos]) - monday, nan=7)
+    offset = np.clip(offset, 0, 7).astype(np.int64)
+    buckets = np.bincount(plan_week * 8 + offset, minlength=n * 8).reshape(n, 8)
+    planned = buckets.sum(axis=1)
+    burndown = planned[:, None] - np.cumsum(buckets[:, :7], axis=1)
+    finished = (timeline.status[pos] == DONE) & (offset < 7)
+    done = np.bincount(plan_week[finished], minlength=n)
+    carry_over = np.divide(burndown[:, 6], planned, out=np.full(n, np.nan), where=planned > 0)
+    return WeeklyReport(
+        [_week_label(start + i) for i in range(n)],
+        planned,
+        done,
+        throughput,
+        carry_over,
+        cycle_time,
+        lead_time,
+        burndown,
+    )
@@ -1,25 +1,274 @@
-"""Backup helpers."""
+"""Backup helpers.
+
+:class:`BackupRepository` keeps deduplicated, encrypted snapshots of the
+database image::
+
+    <root>/repo.key                 repository keys, sealed with the session key
+    <root>/chunks/ab/<chunk id>     one encrypted chunk, stored once
+    <root>/snapshots/<stamp>.snap   encrypted manifest: ordered chunk ids
+
+Chunk boundaries are content defined at page granularity: a chunk ends after a
+page whose digest matches a mask (within min/max bounds), so inserting or
+freeing pages only changes the chunks around the edit.  Chunk ids are keyed
+HMACs of the plaintext and chunks are sealed deterministically (the nonce is
+a keyed hash of the stored payload), which is what lets identical chunks from
+different snapshots dedupe.  Chunks may be compressed before sealing; the
+first payload byte names the codec.
+"""
 from __future__ import annotations
 
-import shutil
+import base64
+import hashlib
+import hmac
+import json
+import os
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional, Union
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from .compression import CODECS, compress, decompress
+from .db import image_page_size
+from .security_service import (
+    NONCE_SIZE,
+    EncryptedFormatError,
+    SessionKey,
+    atomic_output,
+    decrypt_to_bytes,
+    derive_session_key,
+    encrypt_bytes,
+    read_kdf_meta,
+)
+from .upload_service import UploadQueue
+
+CHUNK_AVG_PAGES = 16
+CHUNK_MIN_PAGES = 4
+CHUNK_MAX_PAGES = 64
+CHUNK_FORMAT = 2  # 1: raw chunk, nonce from id; 2: codec byte + body, nonce from payload
+
+
+def iter_chunks(image: bytes) -> Iterator[memoryview]:
+    """Split a database image into content-defined runs of whole pages."""
+    page = image_page_size(image)
+    view = memoryview(image)
+    start = 0
+    pages = 0
+    for offset in range(0, len(image), page):
+        pages += 1
+        end = offset + page
+        digest = hashlib.blake2b(view[offset:end], digest_size=8).digest()
+        boundary = int.from_bytes(digest[:4], "big") % CHUNK_AVG_PAGES == 0
+        if (boundary and pages >= CHUNK_MIN_PAGES) or pages >= CHUNK_MAX_PAGES:
+            yield view[start:end]
+            start = end
+            pages = 0
+    if start < len(image):
+        yield view[start:]
+
+
+class BackupRepository:
+    """Content-addressed, deduplicated snapshot store."""
+
+    def __init__(
+        self,
+        root: Path,
+        enc_key: bytes,
+        mac_key: bytes,
+        chunk_format: int = CHUNK_FORMAT,
+        codec: str = "none",
+        level: Optional[int] = None,
+    ):
+        self.root = Path(root)
+        self.chunks_dir = self.root / "chunks"
+        self.snapshots_dir = self.root / "snapshots"
+        self._aead = AESGCM(enc_key)
+        self._mac_key = mac_key
+        self.chunk_format = chunk_format
+        self.codec = codec if chunk_format >= 2 else "none"
+        self.level = level
+
+    @classmethod
+    def open(
+        cls,
+        root: Union[str, Path],
+        session: SessionKey,
+        password: Optional[str] = None,
+        codec: str = "none",
+        level: Optional[int] = None,
+    ) -> "BackupRepository":
+        """Open (or create) the repository at *root*.
+
+        The repository keys are wrapped with the session key.  If the database
+        was re-keyed since, *password* unwraps them under the old parameters
+        once and they are re-wrapped for the current session.
+        """
+        root = Path(root)
+        key_file = root / "repo.key"
+        if not key_file.exists():
+            root.mkdir(parents=True, exist_ok=True)
+            keys = {
+                "enc": base64.b64encode(AESGCM.generate_key(bit_length=256)).decode("ascii"),
+                "mac": base64.b64encode(os.urandom(32)).decode("ascii"),
+                "chunk_format": CHUNK_FORMAT,
+            }
+            encrypt_bytes(json.dumps(keys).encode("utf-8"), key_file, session)
+        else:
+            try:
+                raw = decrypt_to_bytes(key_file, session)
+            except EncryptedFormatError:
+                if password is None:
+                    raise
+                with derive_session_key(password, read_kdf_meta(key_file)) as old:
+                    raw = decrypt_to_bytes(key_file, old)
+                encrypt_bytes(bytes(raw), key_file, session)
+            keys = json.loads(bytes(raw))
+        return cls(
+            root,
+            base64.b64decode(keys["enc"]),
+            base64.b64decode(keys["mac"]),
+            keys.get("chunk_format", 1),
+            codec,
+            level,
+        )
+
+    # --- chunks ---
+    def _chunk_path(self, chunk_id: str) -> Path:
+        return self.chunks_dir / chunk_id[:2] / chunk_id
+
+    def _put_chunk(self, data: memoryview) -> tuple[str, bool]:
+        chunk_id = hmac.new(self._mac_key, data, hashlib.sha256).hexdigest()
+        path = self._chunk_path(chunk_id)
+        if path.exists():
+            return chunk_id, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        aad = chunk_id.encode("ascii")
+        if self.chunk_format < 2:
+            nonce = bytes.fromhex(chunk_id)[:NONCE_SIZE]
+            blob = self._aead.encrypt(nonce, data, aad)
+        else:
+            payload = bytes([0]) + data
+            if self.codec != "none":
+                packed = compress(data, self.codec, self.level)
+                if len(packed) < len(data):
+                    payload = bytes([CODECS.index(self.codec)]) + packed
+            # Same payload, same nonce: deterministic, never reused across payloads.
+            nonce = hmac.new(self._mac_key, b"nonce" + payload, hashlib.sha256).digest()[:NONCE_SIZE]
+            blob = nonce + self._aead.encrypt(nonce, payload, aad)
+        with atomic_output(path) as f:
+            f.write(blob)
+        return chunk_id, True
+
+    def _get_chunk(self, chunk_id: str) -> bytes:
+        blob = self._chunk_path(chunk_id).read_bytes()
+        aad = chunk_id.encode("ascii")
+        if self.chunk_format < 2:
+            return self._aead.decrypt(bytes.fromhex(chunk_id)[:NONCE_SIZE], blob, aad)
+        payload = self._aead.decrypt(blob[:NONCE_SIZE], blob[NONCE_SIZE:], aad)
+        codec = CODECS[payload[0]]
+        return payload[1:] if codec == "none" else decompress(payload[1:], codec)
+
+    # --- snapshots ---
+    def _seal(self, manifest: dict) -> bytes:
+        nonce = os.urandom(NONCE_SIZE)
+        return nonce + self._aead.encrypt(nonce, json.dumps(manifest).encode("utf-8"), b"snapshot")
+
+    def _manifest(self, name: str) -> dict:
+        blob = (self.snapshots_dir / name).read_bytes()
+        return json.loads(self._aead.decrypt(blob[:NONCE_SIZE], blob[NONCE_SIZE:], b"snapshot"))
+
+    def snapshots(self) -> list[str]:
+        """Return snapshot names, oldest first."""
+        if not self.snapshots_dir.exists():
+            return []
+        return sorted(p.name for p in self.snapshots_dir.glob("*.snap"))
+
+    def snapshot(self, image: bytes, now: Optional[datetime] = None) -> dict:
+        """Store *image* as a new snapshot; only unseen chunks hit the disk."""
+        now = now or datetime.now()
+        ids = []
+        new_files = []
+        new_bytes = 0
+        for chunk in iter_chunks(image):
+            chunk_id, stored = self._put_chunk(chunk)
+            ids.append(chunk_id)
+            if stored:
+                new_bytes += len(chunk)
+                new_files.append(self._chunk_path(chunk_id))
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{now:%Y%m%dT%H%M%S%f}.snap"
+        manifest = {"created": now.isoformat(), "size": len(image), "chunks": ids}
+        # The manifest goes last: a crash before it only leaves orphan chunks.
+        with atomic_output(self.snapshots_dir / name) as f:
+            f.write(self._seal(manifest))
+        new_files.append(self.snapshots_dir / name)
+        return {"name": name, "chunks": len(ids), "new_bytes": new_bytes, "files": new_files}
+
+    def restore(self, name: str) -> bytearray:
+        image = bytearray()
+        for chunk_id in self._manifest(name)["chunks"]:
+            image += self._get_chunk(chunk_id)
+        return image
+
+    def prune(
+        self,
+        keep_last: Optional[int] = None,
+        max_age_days: Optional[int] = None,
+        now: Optional[datetime] = None,
+    ) -> int:
+        """Drop snapshots outside the retention policy and unreferenced chunks.
+
+        The newest snapshot is always kept.  Returns the number of snapshots
+        removed.
+        """
+        names = self.snapshots()
+        now = now or datetime.now()
+        drop = set()
+        if keep_last is not None:
+            drop.update(names[: max(0, len(names) - max(keep_last, 1))])
+        if max_age_days is not None:
+            cutoff = f"{now - timedelta(days=max_age_days):%Y%m%dT%H%M%S%f}.snap"
+            drop.update(n for n in names[:-1] if n < cutoff)
+        keep = [n for n in names if n not in drop]
+        for name in drop:
+            (self.snapshots_dir / name).unlink()
 
+        live = set()
+        for name in keep:
+            live.update(self._manifest(name)["chunks"])
+        if self.chunks_dir.exists():
+            for path in self.chunks_dir.glob("*/*"):
+                if path.name not in live:
+                    path.unlink()
+        return len(drop)
 
-def rotate_backups(backup_dir: Path) -> None:
-    files = sorted(backup_dir.glob("*.enc"), key=lambda p: p.stat().st_mtime, reverse=True)
-    for old in files[2:]:
-        old.unlink()
 
+def snapshot_backup(
+    image: bytes,
+    backup_dir: Path,
+    session: SessionKey,
+    password: Optional[str] = None,
+    keep_last: Optional[int] = None,
+    max_age_days: Optional[int] = None,
+    codec: str = "none",
+    level: Optional[int] = None,
+) -> dict:
+    """Snapshot *image* into the repository at *backup_dir* and apply retention."""
+    repo = BackupRepository.open(backup_dir, session, password, codec, level)
+    info = repo.snapshot(image)
+    info["pruned"] = repo.prune(keep_last, max_age_days)
+    return info
 
-def local_backup(enc_db_path: Path, backup_dir: Path) -> Path:
-    backup_dir.mkdir(parents=True, exist_ok=True)
-    dest = backup_dir / f"app.db.enc.bak"
-    shutil.copy2(enc_db_path, dest)
-    rotate_backups(backup_dir)
-    return dest
 
+def drive_backup(queue: UploadQueue, repo_root: Path, files: list[Path]) -> int:
+    """Queue new repository files for off-site upload; return how many.
 
-def drive_backup(path: Path, drive_folder_id: str) -> None:
-    # Placeholder: integrate google drive API
-    pass
+    Chunks and manifests are immutable and content addressed, so only what a
+    snapshot added needs to leave the machine.  The key file is always sent
+    because re-wrapping rewrites it; the backend replaces its earlier copy.
+    """
+    repo_root = Path(repo_root)
+    paths = [repo_root / "repo.key"] + [Path(f) for f in files]
+    for path in paths:
+        queue.enqueue(path, path.relative_to(repo_root).as_posix())
+    return len(paths)
@@ -0,0 +1,205 @@
+"""In-memory bitmaps of done days for binary habits.
+
+Each habit year is one Python int whose bit *n* is day *n* of the year
+(January 1st is bit 0), about 46 bytes of payload per habit-year.  Years load
+lazily from ``habit_logs`` with one index range query and stay cached; whole
+ranges are then answered with masks, shifts and ``int.bit_count`` instead of
+per-day rows, so multi-year streaks and calendar lookups take microseconds.
+
+Caches are per connection (:func:`bitsets_for`) and follow committed
+``habit_log`` changes on the change bus, so a write that is rolled back never
+reaches the bitmaps.  :func:`~services.rollup_service.habit_streak` answers
+daily one-a-day goals from here.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import date, timedelta
+from typing import Optional
+
+from .change_bus import Change, subscribe
+
+# id(conn) -> cache; the cache holds the connection, so the id cannot be reused
+# while the entry exists.  Drop entries with release_bitsets().
+_registry: dict[int, "HabitBitsets"] = {}
+
+
+def _year_length(year: int) -> int:
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+
+def _run_ending_at(bits: int, index: int) -> int:
+    """Length of the run of set bits ending at bit *index* (inclusive)."""
+    holes = ~bits & ((1 << (index + 1)) - 1)
+    if not holes:
+        return index + 1
+    return index - (holes.bit_length() - 1)
+
+
+def _longest_run(bits: int) -> int:
+    n = 0
+    while bits:
+        bits &= bits >> 1
+        n += 1
+    return n
+
+
+class HabitBitsets:
+    """Lazily loaded per-year bitmaps for one connection."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self._years: dict[tuple[int, int], int] = {}
+        self._spans: dict[int, Optional[tuple[int, int]]] = {}
+        self.unsubscribe = subscribe(conn, self._changed, ("habit_log",))
+
+    # --- loading ---
+    def year_bits(self, habit_id: int, year: int) -> int:
+        key = (habit_id, year)
+        bits = self._years.get(key)
+        if bits is None:
+            bits = 0
+            first = date(year, 1, 1).toordinal()
+            for (day,) in self.conn.execute(
+                "SELECT date FROM habit_logs WHERE habit_id=? AND date BETWEEN ? AND ? AND value > 0",
+                (habit_id, f"{year}-01-01", f"{year}-12-31"),
+            ):
+                bits |= 1 << (date.fromisoformat(str(day)).toordinal() - first)
+            self._years[key] = bits
+        return bits
+
+    def _span(self, habit_id: int) -> Optional[tuple[int, int]]:
+        """Return the first and last year with logs, or ``None``."""
+        if habit_id not in self._spans:
+            row = self.conn.execute(
+                "SELECT MIN(date), MAX(date) FROM habit_logs WHERE habit_id=? AND value > 0",
+                (habit_id,),
+            ).fetchone()
+            self._spans[habit_id] = (int(str(row[0])[:4]), int(str(row[1])[:4])) if row[0] else None
+        return self._spans[habit_id]
+
+    def mark(self, habit_id: int, day: date, done: bool) -> None:
+        """Record that *day* was (un)done; only years already loaded change."""
+        if done and habit_id in self._spans:
+            span = self._spans[habit_id]
+            # Spans only grow; a stale wider span just means a few empty years.
+            self._spans[habit_id] = (
+                (min(span[0], day.year), max(span[1], day.year)) if span else (day.year, day.year)
+            )
+        key = (habit_id, day.year)
+        bits = self._years.get(key)
+        if bits is None:
+            return
+        bit = 1 << (day.timetuple().tm_yday - 1)
+        self._years[key] = bits | bit if done else bits & ~bit
+
+    def _changed(self, change: Change) -> None:
+        """Re-read the committed logs of loaded years that *change* touched."""
+        for habit_id in change.ids:
+            self._spans.pop(habit_id, None)  # reloaded with one MIN/MAX lookup
+        days = [d for d in change.days if any((h, d.year) in self._years for h in change.ids)]
+        if not days:
+            return
+        done = {
+            (row[0], date.fromisoformat(str(row[1])))
+            for row in self.conn.execute(
+                """
+                SELECT habit_id, date FROM habit_logs
+                WHERE habit_id IN (SELECT value FROM json_each(?))
+                  AND date IN (SELECT value FROM json_each(?)) AND value > 0
+                """,
+                (json.dumps(change.ids), json.dumps([d.isoformat() for d in days])),
+            )
+        }
+        for habit_id in change.ids:
+            for day in days:
+                self.mark(habit_id, day, (habit_id, day) in done)
+
+    def forget(self, habit_id: Optional[int] = None) -> None:
+        if habit_id is None:
+            self._years.clear()
+            self._spans.clear()
+            return
+        self._years = {k: v for k, v in self._years.items() if k[0] != habit_id}
+        self._spans.pop(habit_id, None)
+
+    # --- queries ---
+    def is_done(self, habit_id: int, day: date) -> bool:
+        return bool(self.year_bits(habit_id, day.year) >> (day.timetuple().tm_yday - 1) & 1)
+
+    def range_bits(self, habit_id: int, start: date, end: date) -> int:
+        """Return done days in ``[start, end]`` as an int; bit 0 is *start*."""
+        out = 0
+        shift = 0
+        for year in range(start.year, end.year + 1):
+            lo = (start if year == start.year else date(year, 1, 1)).timetuple().tm_yday - 1
+            hi = (end if year == end.year else date(year, 12, 31)).timetuple().tm_yday - 1
+            bits = self.year_bits(habit_id, year) >> lo & ((1 << (hi - lo + 1)) - 1)
+            out |= bits << shift
+            shift += hi - lo + 1
+        return out
+
+    def done_days(self, habit_id: int, start: date, end: date) -> list[date]:
+        bits = self.range_bits(habit_id, start, end)
+        days = []
+        while bits:
+            low = bits & -bits
+            days.append(start + timedelta(days=low.bit_length() - 1))
+            bits ^= low
+        return days
+
+    def window_count(self, habit_id: int, end: date, days: int) -> int:
+        """Number of done days among the *days* days ending with *end*."""
+        return self.range_bits(habit_id, end - timedelta(days=days - 1), end).bit_count()
+
+    def streak(self, habit_id: int, day: date) -> int:
+        """Consecutive done days up to *day*; an undone *day* itself is skipped."""
+        if not self.is_done(habit_id, day):
+            day -= timedelta(days=1)
+        span = self._span(habit_id)
+        if span is None or day.year < span[0]:
+            return 0
+        total = 0
+        year, index = day.year, day.timetuple().tm_yday - 1
+        while year >= span[0]:
+            run = _run_ending_at(self.year_bits(habit_id, year), index)
+            total += run
+            if run <= index:
+                break
+            year -= 1
+            index = _year_length(year) - 1
+        return total
+
+    def longest_streak(self, habit_id: int) -> int:
+        """Longest run of done days over the habit's whole history."""
+        span = self._span(habit_id)
+        if span is None:
+            return 0
+        best = carry = 0
+        for year in range(span[0], span[1] + 1):
+            bits = self.year_bits(habit_id, year)
+            length = _year_length(year)
+            head = (~bits & (bits + 1)).bit_length() - 1  # run starting at Jan 1
+            if head >= length:
+                carry += length
+                best = max(best, carry)
+                continue
+            best = max(best, carry + head, _longest_run(bits))
+            carry = _run_ending_at(bits, length - 1)
+        return max(best, carry)
+
+
+def bitsets_for(conn: sqlite3.Connection) -> HabitBitsets:
+    """Return the cache for *conn*, creating it on first use."""
+    cache = _registry.get(id(conn))
+    if cache is None or cache.conn is not conn:
+        cache = _registry[id(conn)] = HabitBitsets(conn)
+    return cache
+
+
+def release_bitsets(conn: sqlite3.Connection) -> None:
+    cache = _registry.get(id(conn))
+    if cache is not None and cache.conn is conn:
+        del _registry[id(conn)]
+        cache.unsubscribe()
@@ -0,0 +1,129 @@
+"""Month blocks of habit logs for the calendar heatmap.
+
+A block is every habit's value per day of one month, read with one range
+query over ``ix_habit_logs_date``.  :class:`MonthCache` keeps the most recently
+used blocks (bounded by month count); the heatmap fills it ahead of scrolling
+through its :class:`~ui.db_runner.DbRunner`, on a pooled reader when there is
+one.  Habit writes drop the months they touch through :func:`invalidate_days`.
+"""
+from __future__ import annotations
+
+import calendar
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Iterable, Optional
+
+Month = tuple[int, int]  # (year, month)
+MonthBlock = dict[int, list[int]]  # habit_id -> value per day (index 0 is the 1st)
+DEFAULT_MAX_MONTHS = 48
+
+# id(conn) -> cache; see bitset_cache for why the connection is held.
+_registry: dict[int, "MonthCache"] = {}
+
+
+def shift_month(month: Month, delta: int) -> Month:
+    index = month[0] * 12 + month[1] - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+def load_month(conn: sqlite3.Connection, month: Month) -> MonthBlock:
+    year, mon = month
+    days = calendar.monthrange(year, mon)[1]
+    block: MonthBlock = {}
+    for habit_id, day, value in conn.execute(
+        "SELECT habit_id, date, value FROM habit_logs WHERE date BETWEEN ? AND ?",
+        (f"{year}-{mon:02d}-01", f"{year}-{mon:02d}-{days:02d}"),
+    ):
+        row = block.get(habit_id)
+        if row is None:
+            row = block[habit_id] = [0] * days
+        row[int(str(day)[8:10]) - 1] = value
+    return block
+
+
+class MonthCache:
+    """LRU cache of month blocks, safe to fill from any thread.
+
+    :meth:`load` may read through another connection to the same database
+    (e.g. a pooled reader); a block read before a write that invalidated its
+    month is not stored.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, max_months: int = DEFAULT_MAX_MONTHS):
+        self.conn = conn
+        self.max_months = max_months
+        self._blocks: OrderedDict[Month, MonthBlock] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped per month (and all at once by invalidate()) on invalidation,
+        # so a load that read old data before the write cannot store it after.
+        self._versions: dict[Month, int] = {}
+        self._epoch = 0
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def cached(self, month: Month) -> Optional[MonthBlock]:
+        with self._lock:
+            block = self._blocks.get(month)
+            if block is not None:
+                self._blocks.move_to_end(month)
+            return block
+
+    def get(self, month: Month) -> MonthBlock:
+        """Return the block for *month*, loading it on the calling thread if needed."""
+        block = self.cached(month)
+        return block if block is not None else self.load(month)
+
+    def load(self, month: Month, conn: Optional[sqlite3.Connection] = None) -> MonthBlock:
+        """Read *month* through *conn* (default: the cache's own) and keep it."""
+        version = self._version(month)
+        block = load_month(conn or self.conn, month)
+        self._store(month, block, version)
+        return block
+
+    def _version(self, month: Month) -> tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._versions.get(month, 0)
+
+    def _store(self, month: Month, block: MonthBlock, version: tuple[int, int]) -> None:
+        with self._lock:
+            if (self._epoch, self._versions.get(month, 0)) != version:
+                return
+            self._blocks[month] = block
+            self._blocks.move_to_end(month)
+            while len(self._blocks) > self.max_months:
+                self._blocks.popitem(last=False)
+
+    def invalidate(self, months: Optional[Iterable[Month]] = None) -> None:
+        """Drop *months* (default: all) so the next read sees fresh data."""
+        with self._lock:
+            if months is None:
+                self._blocks.clear()
+                self._epoch += 1
+                return
+            for month in months:
+                self._blocks.pop(month, None)
+                self._versions[month] = self._versions.get(month, 0) + 1
+
+
+def month_cache_for(conn: sqlite3.Connection, **kwargs) -> MonthCache:
+    """Return the cache for *conn*, creating it with *kwargs* on first use."""
+    cache = _registry.get(id(conn))
+    if cache is None or cache.conn is not conn:
+        cache = _registry[id(conn)] = MonthCache(conn, **kwargs)
+    return cache
+
+
+def invalidate_days(conn: sqlite3.Connection, days: Iterable[date]) -> None:
+    """Drop cached months containing *days*; habit writers call this."""
+    cache = _registry.get(id(conn))
+    if cache is not None and cache.conn is conn:
+        cache.invalidate({(d.year, d.month) for d in days})
+
+
+def release_month_cache(conn: sqlite3.Connection) -> None:
+    cache = _registry.get(id(conn))
+    if cache is not None and cache.conn is conn:
+        del _registry[id(conn)]
@@ -0,0 +1,110 @@
+"""Change notifications from the service layer.
+
+Writers describe what they changed with a :class:`Change` and :func:`publish`
+it; views :func:`subscribe` per connection and patch just the rows named in
+it instead of reloading.  A change published inside an open unit of work
+(:func:`~services.db.transaction`) is held until the outermost block commits
+and dropped if it rolls back, so subscribers only ever see committed data.
+
+Entities:
+
+* ``task`` - ids are task ids; *fields* lists the updated columns.
+* ``assignment`` - a task was planned for a week; ids are task ids.
+* ``habit`` - ids are habit ids.
+* ``habit_log`` - ids are habit ids, *days* the dates whose logs changed.
+"""
+from __future__ import annotations
+
+import inspect
+import logging
+import sqlite3
+import weakref
+from datetime import date
+from typing import Callable, Iterable, NamedTuple, Optional
+
+log = logging.getLogger(__name__)
+
+CREATED = "created"
+UPDATED = "updated"
+
+
+class Change(NamedTuple):
+    entity: str
+    action: str  # CREATED or UPDATED
+    ids: tuple[int, ...]
+    fields: frozenset[str] = frozenset()  # empty for CREATED: the whole row is new
+    days: tuple[date, ...] = ()
+
+
+Callback = Callable[[Change], None]
+
+# id(conn) -> (conn, [(callback ref, entities)]); holding the connection keeps
+# its id from being reused while subscribers exist.
+_subscribers: dict[int, tuple[sqlite3.Connection, list]] = {}
+# id(conn) -> (conn, changes) published inside the open transaction.
+_pending: dict[int, tuple[sqlite3.Connection, list[Change]]] = {}
+
+
+def subscribe(
+    conn: sqlite3.Connection, callback: Callback, entities: Optional[Iterable[str]] = None
+) -> Callable[[], None]:
+    """Call *callback* with every committed change on *conn*; return an unsubscribe function.
+
+    Bound methods are held weakly, so a subscribed view can still be
+    garbage-collected; its subscription ends with it.
+    """
+    ref = weakref.WeakMethod(callback) if inspect.ismethod(callback) else (lambda: callback)
+    entry = (ref, frozenset(entities) if entities is not None else None)
+    _subscribers.setdefault(id(conn), (conn, []))[1].append(entry)
+
+    def unsubscribe() -> None:
+        subscribed = _subscribers.get(id(conn))
+        if subscribed is not None and subscribed[0] is conn and entry in subscribed[1]:
+            subscribed[1].remove(entry)
+            if not subscribed[1]:
+                del _subscribers[id(conn)]
+
+    return unsubscribe
+
+
+def publish(conn: sqlite3.Connection, change: Change) -> None:
+    """Deliver *change* now, or when the surrounding transaction commits."""
+    subscribed = _subscribers.get(id(conn))
+    if not change.ids or subscribed is None or subscribed[0] is not conn:
+        return
+    if conn.in_transaction:
+        _pending.setdefault(id(conn), (conn, []))[1].append(change)
+    else:
+        _deliver(subscribed, [change])
+
+
+def flush_changes(conn: sqlite3.Connection) -> None:
+    """Deliver changes held for *conn*; :func:`~services.db.transaction` calls it after commit."""
+    held = _pending.pop(id(conn), None)
+    subscribed = _subscribers.get(id(conn))
+    if held is not None and held[0] is conn and subscribed is not None and subscribed[0] is conn:
+        _deliver(subscribed, held[1])
+
+
+def discard_changes(conn: sqlite3.Connection) -> None:
+    """Drop changes of a rolled-back transaction."""
+    _pending.pop(id(conn), None)
+
+
+def _deliver(subscribed: tuple[sqlite3.Connection, list], changes: list[Change]) -> None:
+    entries = subscribed[1]
+    for change in changes:
+        for entry in list(entries):
+            ref, entities = entry
+            if entities is not None and change.entity not in entities:
+                continue
+            callback = ref()
+            if callback is None:
+                entries.remove(entry)
+                continue
+            try:
+                callback(change)
+            except Exception:
+                # The write already committed; one broken view must not turn
+                # it into an error for the caller or starve other subscribers.
+                log.exception("change subscriber failed for %s", change.entity)
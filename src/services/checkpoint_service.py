@@ -0,0 +1,76 @@
+"""Encrypted checkpoints of the live database."""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class Checkpointer:
+    """Snapshot a connection and persist the image through *save*.
+
+    The snapshot (``Connection.serialize``) is a memory copy taken on the thread
+    that owns the connection; the expensive part - encrypting and writing the
+    image, e.g. :meth:`PageStore.save` or :func:`encrypt_bytes` - can run on a
+    single background worker.  *save* must write atomically so a crash never
+    leaves a half-written file.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, save: Callable[[bytes], object]):
+        self.conn = conn
+        self._save = save
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending: Optional[Future] = None
+        # None forces the first checkpoint, matching the old always-save exit.
+        self._saved_changes: Optional[int] = None
+        self.last_checkpoint: Optional[float] = None
+        self.last_error: Optional[BaseException] = None
+
+    def dirty(self) -> bool:
+        return self.conn.total_changes != self._saved_changes
+
+    def _snapshot(self) -> Optional[tuple[int, bytes]]:
+        # Never capture a half-applied transaction.
+        if self.conn.in_transaction or not self.dirty():
+            return None
+        return self.conn.total_changes, self.conn.serialize()
+
+    def _write(self, changes: int, image: bytes) -> None:
+        with self._lock:
+            self._save(image)
+            self._saved_changes = changes
+            self.last_checkpoint = time.time()
+
+    def checkpoint(self) -> bool:
+        """Write a checkpoint now, waiting for any background one first."""
+        self.wait()
+        snap = self._snapshot()
+        if snap is None:
+            return False
+        self._write(*snap)
+        return True
+
+    def checkpoint_async(self) -> Optional[Future]:
+        """Queue a background checkpoint; skipped while one is still running."""
+        if self._pending is not None and not self._pending.done():
+            return None
+        snap = self._snapshot()
+        if snap is None:
+            return None
+        self._pending = self._executor.submit(self._write, *snap)
+        self._pending.add_done_callback(self._record_error)
+        return self._pending
+
+    def _record_error(self, future: Future) -> None:
+        self.last_error = future.exception()
+
+    def wait(self) -> None:
+        if self._pending is not None:
+            self._pending.exception()  # blocks; errors are kept in last_error
+
+    def close(self) -> None:
+        self.wait()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,101 @@
+"""Streaming compression codecs used before encryption."""
+from __future__ import annotations
+
+import bz2
+import lzma
+import zlib
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+CODECS = ("none", "zlib", "lzma", "bz2")
+DEFAULT_LEVELS = {"zlib": 6, "lzma": 6, "bz2": 9}
+READ_SIZE = 256 * 1024
+
+
+def _check(codec: str) -> None:
+    if codec not in CODECS:
+        raise ValueError(f"unknown compression codec {codec!r}")
+
+
+def compressor(codec: str, level: Optional[int] = None):
+    _check(codec)
+    level = DEFAULT_LEVELS.get(codec) if level is None else level
+    if codec == "zlib":
+        return zlib.compressobj(level)
+    if codec == "lzma":
+        return lzma.LZMACompressor(preset=level)
+    if codec == "bz2":
+        return bz2.BZ2Compressor(level)
+    raise ValueError("codec 'none' has no compressor")
+
+
+def decompressor(codec: str):
+    _check(codec)
+    if codec == "zlib":
+        return zlib.decompressobj()
+    if codec == "lzma":
+        return lzma.LZMADecompressor()
+    if codec == "bz2":
+        return bz2.BZ2Decompressor()
+    raise ValueError("codec 'none' has no decompressor")
+
+
+def iter_compressed(src: BinaryIO, codec: str, level: Optional[int] = None) -> Iterator[bytes]:
+    """Yield the compressed form of *src*, reading it in fixed-size pieces."""
+    comp = compressor(codec, level)
+    while True:
+        data = src.read(READ_SIZE)
+        if not data:
+            break
+        out = comp.compress(data)
+        if out:
+            yield out
+    yield comp.flush()
+
+
+def _decompress_bounded(dec, data: bytes) -> Iterator[bytes]:
+    """Feed *data* to *dec*, yielding at most ``READ_SIZE`` bytes at a time.
+
+    A mostly empty database page compresses to almost nothing, so one input
+    piece may expand a thousandfold; it is never inflated in one go.
+    """
+    if hasattr(dec, "unconsumed_tail"):  # zlib keeps the input it has not used yet
+        while True:
+            out = dec.decompress(data, READ_SIZE)
+            data = dec.unconsumed_tail
+            if out:
+                yield out
+            if not data and len(out) < READ_SIZE:
+                return
+    out = dec.decompress(data, READ_SIZE)
+    while True:
+        if out:
+            yield out
+        if dec.eof or dec.needs_input:
+            return
+        out = dec.decompress(b"", READ_SIZE)
+
+
+def iter_decompressed(chunks: Iterable[bytes], codec: str) -> Iterator[bytes]:
+    """Reverse :func:`iter_compressed` over an iterable of compressed pieces.
+
+    Output comes in pieces of at most ``READ_SIZE`` bytes.
+    """
+    dec = decompressor(codec)
+    for chunk in chunks:
+        yield from _decompress_bounded(dec, chunk)
+    flush = getattr(dec, "flush", None)  # only zlib buffers output
+    if flush is not None:
+        tail = flush()
+        if tail:
+            yield tail
+    if not getattr(dec, "eof", True):
+        raise ValueError("compressed stream is truncated")
+
+
+def compress(data: bytes, codec: str, level: Optional[int] = None) -> bytes:
+    comp = compressor(codec, level)
+    return comp.compress(data) + comp.flush()
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    return b"".join(iter_decompressed([data], codec))
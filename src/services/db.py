@@ -2,17 +2,340 @@
 from __future__ import annotations
 
 import sqlite3
+import struct
+import threading
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from .change_bus import discard_changes, flush_changes
 
 SCHEMA_PATH = Path(__file__).resolve().parent.parent.parent / "schema.sql"
+DEFAULT_PAGE_SIZE = 4096
+
+# Connection profile for our workload: many small interactive writes, reads of
+# a DB that fits in memory.  WAL + synchronous=NORMAL needs one fsync per
+# checkpoint instead of several per commit and stays durable against app
+# crashes.  (In-memory databases ignore journal_mode and mmap_size.)
+CONNECTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,  # KiB, i.e. ~16 MB of page cache
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+# Readers beside the writer: reports, calendar months and task pages can run
+# in parallel; more would mostly contend for the GIL.
+READ_POOL_SIZE = 4
+# Prepared statements kept per read connection; well above the number of
+# distinct read queries, so a pooled reader never prepares one twice.
+READ_CACHED_STATEMENTS = 128
+
+# Open units of work per connection (by id; entries only live while one is open).
+_tx_depth: dict[int, int] = {}
+
 
+def apply_profile(conn: sqlite3.Connection, pragmas: Optional[dict] = None) -> None:
+    for name, value in (pragmas or CONNECTION_PRAGMAS).items():
+        conn.execute(f"PRAGMA {name}={value}").fetchall()
 
-def get_connection(db_path: str) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path)
+
+def get_connection(db_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open *db_path* with the app's profile.
+
+    Pass ``check_same_thread=False`` for a connection handed to a
+    :class:`~services.db_executor.DbExecutor`, whose worker thread then uses it.
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
+    apply_profile(conn)
     return conn
 
 
+def get_read_connection(
+    db_path: Union[str, Path],
+    check_same_thread: bool = True,
+    cached_statements: int = READ_CACHED_STATEMENTS,
+) -> sqlite3.Connection:
+    """Open a read-only connection for background readers of a file database.
+
+    journal_mode belongs to the writer (WAL lets readers run beside it), so
+    only the per-connection part of the profile applies here.
+    """
+    conn = sqlite3.connect(
+        f"{Path(db_path).resolve().as_uri()}?mode=ro",
+        uri=True,
+        check_same_thread=check_same_thread,
+        cached_statements=cached_statements,
+    )
+    conn.row_factory = sqlite3.Row
+    pragmas = {k: v for k, v in CONNECTION_PRAGMAS.items() if k != "journal_mode"}
+    apply_profile(conn, {**pragmas, "query_only": "ON"})
+    return conn
+
+
+class ReadPool:
+    """Bounded pool of read-only connections to a file database.
+
+    Beside the one writer connection, up to *size* readers can query in
+    parallel (WAL lets them run alongside a write).  Connections are opened on
+    first demand with :func:`get_read_connection` - so each carries the read
+    profile and its own prepared-statement cache - and are reused afterwards.
+    Checkout is thread-safe; :meth:`acquire` blocks while all are in use.
+    Reads through the pool only see committed data, and must not go through
+    per-connection caches such as :func:`~services.rollup_service.today_progress`
+    whose invalidation follows the writer.
+    """
+
+    def __init__(self, db_path: Union[str, Path], size: int = READ_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle: list[sqlite3.Connection] = []
+        self._opened = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self._closed or self._idle or self._opened < self.size, timeout
+            ):
+                raise TimeoutError(f"no free read connection within {timeout} s")
+            if self._closed:
+                raise RuntimeError("ReadPool is closed")
+            if self._idle:
+                return self._idle.pop()
+            self._opened += 1
+        try:
+            return get_read_connection(self.db_path, check_same_thread=False)
+        except BaseException:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        with self._cond:
+            if self._closed:
+                self._opened -= 1
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[sqlite3.Connection]:
+        """Check a reader out for the duration of the block."""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Close idle readers now and checked-out ones as they come back."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Unit of work: commit once when the outermost block exits.
+
+    Service functions wrap their writes in this, so a call made inside another
+    service call (or inside an explicit ``with transaction(conn):`` block)
+    joins the caller's transaction instead of committing on its own.  Any
+    exception rolls back the whole unit.  Changes published to the change
+    bus inside the unit are delivered after the commit.
+    """
+    key = id(conn)
+    depth = _tx_depth.get(key, 0)
+    _tx_depth[key] = depth + 1
+    try:
+        if depth == 0 and not conn.in_transaction:
+            conn.execute("BEGIN")
+        yield conn
+    except BaseException:
+        if depth == 0:
+            conn.rollback()
+            discard_changes(conn)
+        raise
+    else:
+        if depth == 0:
+            conn.commit()
+    finally:
+        if depth:
+            _tx_depth[key] = depth
+        else:
+            del _tx_depth[key]
+    if depth == 0:
+        flush_changes(conn)
+
+
+def image_page_size(image: bytes) -> int:
+    """Return the page size recorded in a serialized database image."""
+    # SQLite header: big-endian u16 at offset 16, where 1 means 65536.
+    if len(image) < 18:
+        return DEFAULT_PAGE_SIZE
+    size = struct.unpack_from(">H", image, 16)[0]
+    return 65536 if size == 1 else size or DEFAULT_PAGE_SIZE
+
+
+def open_memory_db(data: Optional[bytes] = None, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open an in-memory database, optionally loaded from a serialized image."""
+    conn = get_connection(":memory:", check_same_thread)
+    if data:
+        if data[18:20] == b"\x02\x02":
+            # Saved from a WAL file database (db_mode "file"); SQLite cannot open
+            # a WAL image in memory, so mark it as a rollback-journal image.
+            data = bytearray(data)
+            data[18:20] = b"\x01\x01"
+        conn.deserialize(data)
+    return conn
+
+
+# Ordered schema migrations.  ``schema.sql`` is version 1; entry ``n`` in this
+# list upgrades version ``n + 1`` to ``n + 2``.  Each migration runs in one
+# transaction together with the ``user_version`` bump, so it applies fully or
+# not at all.  Never edit a released entry - append a new one.
+MIGRATIONS: list[tuple[str, ...]] = [
+    # 2: hot-path indexes; habit_logs gets one row per habit and day.
+    (
+        # Fold duplicate (habit_id, date) rows into the oldest one first.
+        """
+        UPDATE habit_logs SET value = (
+            SELECT SUM(d.value) FROM habit_logs d
+            WHERE d.habit_id = habit_logs.habit_id AND d.date = habit_logs.date
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM habit_logs GROUP BY habit_id, date HAVING COUNT(*) > 1
+        )
+        AND habit_id IN (SELECT id FROM habits WHERE type = 'quantity')
+        """,
+        """
+        DELETE FROM habit_logs
+        WHERE id NOT IN (SELECT MIN(id) FROM habit_logs GROUP BY habit_id, date)
+        """,
+        "CREATE UNIQUE INDEX ux_habit_logs_habit_date ON habit_logs(habit_id, date)",
+        "CREATE INDEX ix_weekly_assignments_week ON weekly_assignments(iso_week)",
+        "CREATE INDEX ix_tasks_status ON tasks(status)",
+    ),
+    # 3: rolled-over assignments remember the week they were carried from.
+    ("ALTER TABLE weekly_assignments ADD COLUMN rolled_from TEXT",),
+    # 4: materialized per-habit day / ISO week / month totals, backfilled.
+    (
+        """
+        CREATE TABLE habit_rollups (
+          habit_id INTEGER NOT NULL,
+          period TEXT CHECK(period IN ('day','week','month')) NOT NULL,
+          period_key TEXT NOT NULL,
+          total INTEGER NOT NULL,
+          days INTEGER NOT NULL,
+          PRIMARY KEY (habit_id, period, period_key),
+          FOREIGN KEY (habit_id) REFERENCES habits(id)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO habit_rollups(habit_id, period, period_key, total, days)
+        SELECT habit_id, 'day', date, SUM(value), COUNT(DISTINCT date)
+        FROM habit_logs WHERE value > 0 GROUP BY habit_id, date
+        UNION ALL
+        SELECT habit_id, 'week',
+               strftime('%Y', date(date, '-3 days', 'weekday 4')) || '-W'
+               || printf('%02d', (strftime('%j', date(date, '-3 days', 'weekday 4')) - 1) / 7 + 1) AS wk,
+               SUM(value), COUNT(DISTINCT date)
+        FROM habit_logs WHERE value > 0 GROUP BY habit_id, wk
+        UNION ALL
+        SELECT habit_id, 'month', substr(date, 1, 7) AS mo, SUM(value), COUNT(DISTINCT date)
+        FROM habit_logs WHERE value > 0 GROUP BY habit_id, mo
+        """,
+    ),
+    # 5: date-range reads across all habits (calendar months), index-only.
+    ("CREATE INDEX ix_habit_logs_date ON habit_logs(date, habit_id, value)",),
+    # 6: task status history.  Triggers record every status change (whichever
+    # code path makes it) and keep tasks.closed_at in step.
+    (
+        """
+        CREATE TABLE task_events (
+          id INTEGER PRIMARY KEY,
+          task_id INTEGER NOT NULL,
+          at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          from_status TEXT,
+          to_status TEXT NOT NULL,
+          FOREIGN KEY (task_id) REFERENCES tasks(id)
+        )
+        """,
+        # Earlier history is unknown: existing tasks get a creation event and,
+        # unless still TODO, one transition dated at creation (or closed_at).
+        """
+        UPDATE tasks SET closed_at = created_at
+        WHERE closed_at IS NULL AND status IN ('DONE','CANCELED')
+        """,
+        """
+        INSERT INTO task_events(task_id, at, from_status, to_status)
+        SELECT id, created_at, NULL, 'TODO' FROM tasks
+        UNION ALL
+        SELECT id, COALESCE(closed_at, created_at), 'TODO', status FROM tasks WHERE status <> 'TODO'
+        ORDER BY 1, 3  -- NULL from_status (creation) first
+        """,
+        """
+        CREATE TRIGGER tr_tasks_insert_event AFTER INSERT ON tasks
+        BEGIN
+          INSERT INTO task_events(task_id, at, from_status, to_status)
+          VALUES (NEW.id, NEW.created_at, NULL, NEW.status);
+          UPDATE tasks SET closed_at = NEW.created_at
+          WHERE id = NEW.id AND closed_at IS NULL AND NEW.status IN ('DONE','CANCELED');
+        END
+        """,
+        """
+        CREATE TRIGGER tr_tasks_status_event AFTER UPDATE OF status ON tasks
+        WHEN NEW.status IS NOT OLD.status
+        BEGIN
+          INSERT INTO task_events(task_id, from_status, to_status)
+          VALUES (NEW.id, OLD.status, NEW.status);
+          UPDATE tasks
+          SET closed_at = CASE WHEN NEW.status IN ('DONE','CANCELED') THEN CURRENT_TIMESTAMP END
+          WHERE id = NEW.id;
+        END
+        """,
+    ),
+]
+SCHEMA_VERSION = 1 + len(MIGRATIONS)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations in order and return the resulting version."""
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"database schema v{version} is newer than this app (v{SCHEMA_VERSION})"
+        )
+    if conn.in_transaction:
+        conn.commit()
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        conn.execute("BEGIN")
+        try:
+            for statement in MIGRATIONS[target - 2]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    return SCHEMA_VERSION
+
+
 def init_db(conn: sqlite3.Connection) -> None:
     cursor = conn.execute(
         "SELECT name FROM sqlite_master WHERE type='table' AND name='habits';"
@@ -21,3 +344,7 @@ def init_db(conn: sqlite3.Connection) -> None:
         with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
             conn.executescript(f.read())
         conn.commit()
+    if schema_version(conn) == 0:
+        # Databases created before migrations existed match the v1 baseline.
+        conn.execute("PRAGMA user_version = 1")
+    migrate(conn)
@@ -0,0 +1,155 @@
+"""Run database work on one worker thread that owns the connection.
+
+The GUI thread hands service calls to a :class:`DbExecutor` instead of running
+them itself, so an import or a report never stalls painting.  Jobs run one at
+a time - the connection and :func:`~services.db.transaction` are only ever
+used by the worker - in priority order, first come first served within a
+priority.  A running job is never preempted, but interactive writes queued
+behind it still go ahead of reports waiting for their turn.
+
+:meth:`DbExecutor.submit` returns a :class:`~concurrent.futures.Future`.
+Cancelling it drops a job that has not started; a running job stops at its
+next :meth:`DbExecutor.checkpoint` (long services accept one as a callback),
+which rolls its transaction back.
+
+With a :class:`~services.db.ReadPool` (file databases only), jobs submitted
+with ``read_only=True`` run on their own threads with a pooled reader, in
+parallel with each other and with the writer.  Without one they simply join
+the writer's queue.
+"""
+from __future__ import annotations
+
+import itertools
+import queue
+import sqlite3
+import threading
+from concurrent.futures import CancelledError, Future
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Optional
+
+from .db import ReadPool
+
+INTERACTIVE = 0  # edits the user is waiting to see: clicks, drags, dialogs
+NORMAL = 10  # loading what is on screen
+REPORT = 20  # derived figures and prefetching
+BACKGROUND = 30  # imports, checkpoints
+_STOP = float("inf")  # after every queued job, so shutdown drains the queue
+
+
+class DbJob(Future):
+    """Future of a submitted call; :meth:`cancel` also stops it once running."""
+
+    def __init__(self):
+        super().__init__()
+        self.cancel_requested = False
+
+    def cancel(self) -> bool:
+        self.cancel_requested = True
+        return super().cancel()
+
+
+class DbExecutor:
+    """Serialize calls ``fn(conn, *args, **kwargs)`` on a dedicated thread.
+
+    *conn* must be opened with ``check_same_thread=False`` and, once the
+    executor runs, must not be used from other threads until
+    :meth:`shutdown` returns.  *read_pool* adds one thread per pooled reader
+    for ``read_only`` jobs.
+    """
+
+    def __init__(
+        self, conn: sqlite3.Connection, name: str = "db", read_pool: Optional[ReadPool] = None
+    ):
+        self.conn = conn
+        self.read_pool = read_pool
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._read_queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._local = threading.local()  # the job running on this thread
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self._readers = [
+            threading.Thread(target=self._run_reads, name=f"{name}-read-{i}", daemon=True)
+            for i in range(read_pool.size if read_pool is not None else 0)
+        ]
+        for thread in self._readers:
+            thread.start()
+
+    def submit(
+        self, fn: Callable, *args, priority: int = NORMAL, read_only: bool = False, **kwargs
+    ) -> DbJob:
+        """Queue ``fn(conn, *args, **kwargs)``; lower *priority* values run first.
+
+        ``read_only=True`` marks a job that only queries committed data, so it
+        may get a pooled reader instead of the writer connection.
+        """
+        if self._closed:
+            raise RuntimeError("DbExecutor is shut down")
+        job = DbJob()
+        target = self._read_queue if read_only and self._readers else self._queue
+        target.put((priority, next(self._seq), job, fn, args, kwargs))
+        return job
+
+    def in_worker(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def checkpoint(self) -> None:
+        """Raise :class:`CancelledError` in a job whose future was cancelled.
+
+        Long jobs call it between chunks of work; it is a no-op elsewhere.
+        """
+        job = getattr(self._local, "job", None)
+        if job is not None and job.cancel_requested:
+            raise CancelledError()
+
+    def pending(self) -> int:
+        return self._queue.qsize() + self._read_queue.qsize()
+
+    def _run(self) -> None:
+        writer = nullcontext(self.conn)
+        while self._next(self._queue, lambda: writer):
+            pass
+
+    def _run_reads(self) -> None:
+        # A reader is checked out per job, so the pool stays shared.
+        while self._next(self._read_queue, self.read_pool.connection):
+            pass
+
+    def _next(self, jobs: queue.PriorityQueue, connection: Callable[[], ContextManager]) -> bool:
+        """Run the next job from *jobs* on a connection from *connection*; False on stop."""
+        priority, _, job, fn, args, kwargs = jobs.get()
+        if priority == _STOP:
+            return False
+        if not job.set_running_or_notify_cancel():
+            return True
+        self._local.job = job
+        try:
+            with connection() as conn:
+                result = fn(conn, *args, **kwargs)
+        except BaseException as exc:  # handed to the caller through the future
+            job.set_exception(exc)
+        else:
+            job.set_result(result)
+        finally:
+            self._local.job = None
+        return True
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        """Stop after the queued jobs (or drop them with *cancel_pending*)."""
+        if not self._closed:
+            self._closed = True
+            for jobs in (self._queue, self._read_queue):
+                while cancel_pending:
+                    try:
+                        item = jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    item[2].cancel()
+            self._queue.put((_STOP, next(self._seq), None, None, (), {}))
+            for _ in self._readers:
+                self._read_queue.put((_STOP, next(self._seq), None, None, (), {}))
+        if wait and not self.in_worker():
+            for thread in (self._thread, *self._readers):
+                if thread is not threading.current_thread():
+                    thread.join()
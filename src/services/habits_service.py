@@ -1,9 +1,16 @@
 """Habit management helpers."""
 from __future__ import annotations
 
+import json
 import sqlite3
+import threading
 from datetime import date
+from typing import Callable, Iterable, Mapping, Optional
 
+from .calendar_service import invalidate_days
+from .change_bus import CREATED, UPDATED, Change, publish
+from .db import transaction
+from .rollup_service import apply_log_delta, apply_log_deltas, cached_progress, invalidate_progress
 
 
 def add_habit(
@@ -14,14 +21,16 @@ def add_habit(
     goal_value: int,
 ) -> int:
     """Insert a new habit and return its id."""
-    cur = conn.execute(
-        """
-        INSERT INTO habits(name, type, goal_type, goal_value)
-        VALUES (?, ?, ?, ?)
-        """,
-        (name, type_, goal_type, goal_value),
-    )
-    conn.commit()
+    with transaction(conn):
+        cur = conn.execute(
+            """
+            INSERT INTO habits(name, type, goal_type, goal_value)
+            VALUES (?, ?, ?, ?)
+            """,
+            (name, type_, goal_type, goal_value),
+        )
+        invalidate_progress(conn)
+        publish(conn, Change("habit", CREATED, (cur.lastrowid,)))
     return cur.lastrowid
 
 
@@ -34,37 +43,239 @@ def get_active_habits(conn: sqlite3.Connection):
 
 
 
-def toggle_binary_habit(conn: sqlite3.Connection, habit_id: int, day: date) -> None:
-    cur = conn.execute(
-        "SELECT id FROM habit_logs WHERE habit_id=? AND date=?", (habit_id, day)
-    )
-    row = cur.fetchone()
-    if row:
-        conn.execute("DELETE FROM habit_logs WHERE id=?", (row["id"],))
-    else:
-        conn.execute(
-            "INSERT INTO habit_logs(habit_id, date, value) VALUES(?, ?, 1)",
-            (habit_id, day),
-        )
-    conn.commit()
+def _logged(conn: sqlite3.Connection, changes: Iterable[tuple[int, date]]) -> None:
+    """Drop cached months after ``(habit_id, day)`` log writes and announce the writes."""
+    habits, days = set(), set()
+    for habit_id, day in changes:
+        habits.add(habit_id)
+        days.add(day)
+    invalidate_days(conn, days)
+    publish(conn, Change("habit_log", UPDATED, tuple(sorted(habits)), frozenset({"value"}), tuple(sorted(days))))
+
+
+def _clamp(type_: str, value: int) -> int:
+    return min(1, max(0, value)) if type_ == "binary" else max(0, value)
+
+
+def toggle_binary_habit(conn: sqlite3.Connection, habit_id: int, day: date) -> bool:
+    """Flip the habit's log for *day*; return whether it is now done."""
+    with transaction(conn):
+        # RETURNING applies the change on the first step, so one statement both
+        # probes and deletes; the INSERT only runs when nothing was there.
+        removed = conn.execute(
+            "DELETE FROM habit_logs WHERE habit_id=? AND date=? RETURNING value", (habit_id, day)
+        ).fetchall()
+        if removed:
+            apply_log_delta(conn, habit_id, day, -removed[0]["value"], -1)
+        else:
+            conn.execute(
+                "INSERT INTO habit_logs(habit_id, date, value) VALUES(?, ?, 1)",
+                (habit_id, day),
+            )
+            apply_log_delta(conn, habit_id, day, 1, 1)
+    _logged(conn, [(habit_id, day)])
+    return not removed
 
 
 def increment_quantity_habit(
     conn: sqlite3.Connection, habit_id: int, day: date, delta: int
-) -> None:
-    cur = conn.execute(
-        "SELECT id, value FROM habit_logs WHERE habit_id=? AND date=?", (habit_id, day)
-    )
-    row = cur.fetchone()
-    if row:
-        new_val = max(0, row["value"] + delta)
-        if new_val == 0:
-            conn.execute("DELETE FROM habit_logs WHERE id=?", (row["id"],))
+) -> int:
+    """Add *delta* to the habit's value for *day* (never below 0); return the new value."""
+    with transaction(conn):
+        if delta > 0:
+            new = conn.execute(
+                """
+                INSERT INTO habit_logs(habit_id, date, value) VALUES(?, ?, ?)
+                ON CONFLICT(habit_id, date) DO UPDATE SET value = value + excluded.value
+                RETURNING value
+                """,
+                (habit_id, day, delta),
+            ).fetchall()[0]["value"]
+        elif delta < 0:
+            rows = conn.execute(
+                "UPDATE habit_logs SET value = value + ? WHERE habit_id=? AND date=? RETURNING value",
+                (delta, habit_id, day),
+            ).fetchall()
+            if not rows:
+                return 0
+            new = rows[0]["value"]
+            if new <= 0:
+                conn.execute("DELETE FROM habit_logs WHERE habit_id=? AND date=?", (habit_id, day))
         else:
-            conn.execute("UPDATE habit_logs SET value=? WHERE id=?", (new_val, row["id"]))
-    elif delta > 0:
-        conn.execute(
-            "INSERT INTO habit_logs(habit_id, date, value) VALUES(?, ?, ?)",
-            (habit_id, day, delta),
-        )
-    conn.commit()
+            row = conn.execute(
+                "SELECT value FROM habit_logs WHERE habit_id=? AND date=?", (habit_id, day)
+            ).fetchone()
+            return row["value"] if row else 0
+        old = new - delta
+        new = max(0, new)
+        apply_log_delta(conn, habit_id, day, new - old, (new > 0) - (old > 0))
+    _logged(conn, [(habit_id, day)])
+    return new
+
+
+def log_habits(conn: sqlite3.Connection, day: date, deltas: Mapping[int, int]) -> dict[int, int]:
+    """Apply ``{habit_id: delta}`` for one day in a single transaction.
+
+    Binary habits are clamped to 0/1 and quantities to >= 0.  Returns the new
+    value per habit; unknown habit ids are ignored.
+    """
+    if not deltas:
+        return {}
+    values = {}
+    changes = []
+    with transaction(conn):
+        rows = conn.execute(
+            """
+            SELECT h.id, h.type, COALESCE(l.value, 0) AS value
+            FROM habits h
+            LEFT JOIN habit_logs l ON l.habit_id = h.id AND l.date = ?
+            WHERE h.id IN (SELECT value FROM json_each(?))
+            """,
+            (day, json.dumps(list(deltas))),
+        ).fetchall()
+        upserts = []
+        deletes = []
+        for row in rows:
+            old = row["value"]
+            new = _clamp(row["type"], old + deltas[row["id"]])
+            values[row["id"]] = new
+            if new == old:
+                continue
+            if new:
+                upserts.append((row["id"], day, new))
+            else:
+                deletes.append((row["id"], day))
+            changes.append((row["id"], day, new - old, (new > 0) - (old > 0)))
+        if upserts:
+            conn.executemany(
+                """
+                INSERT INTO habit_logs(habit_id, date, value) VALUES(?, ?, ?)
+                ON CONFLICT(habit_id, date) DO UPDATE SET value = excluded.value
+                """,
+                upserts,
+            )
+        if deletes:
+            conn.executemany("DELETE FROM habit_logs WHERE habit_id=? AND date=?", deletes)
+        apply_log_deltas(conn, changes)
+    _logged(conn, [(habit_id, day) for habit_id, _, _, _ in changes])
+    return values
+
+
+class HabitLogBuffer:
+    """Coalesce rapid habit clicks into one write per habit and day.
+
+    :meth:`add` returns the value to show right away (stored value plus
+    pending clicks) and calls *schedule*, which the UI wires to a restartable
+    single-shot timer so :meth:`flush` runs once the clicking stops.  Only the
+    deltas are written, so edits made meanwhile through other paths are kept;
+    views learn about those from the change bus and pass them to
+    :meth:`refresh`.  :meth:`flush` may run on a database worker thread while
+    the GUI thread keeps clicking.
+
+    Values not primed yet come from the cached :func:`today_progress`
+    snapshot, or else from a query on *conn*.  A buffer used off the
+    connection's thread passes ``read_through=False`` and is never the one
+    to query it; there an unknown value raises :class:`KeyError`.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        schedule: Optional[Callable[[], None]] = None,
+        read_through: bool = True,
+    ):
+        self.conn = conn
+        self._schedule = schedule
+        self._read_through = read_through
+        self._pending: dict[tuple[int, date], int] = {}
+        self._shown: dict[tuple[int, date], int] = {}
+        self._types: dict[int, str] = {}
+        self._lock = threading.Lock()  # guards _pending against a concurrent flush
+
+    def prime(self, day: date, rows: Iterable[tuple[int, str, int]]) -> None:
+        """Seed ``(habit_id, type, value)`` for *day* from an already loaded snapshot."""
+        for habit_id, type_, value in rows:
+            self._types[habit_id] = type_
+            self._shown.setdefault((habit_id, day), value)
+
+    def refresh(self, day: date, rows: Iterable[tuple[int, str, int]]) -> None:
+        """Replace shown values with fresh ``(habit_id, type, value)`` rows.
+
+        Habits with clicks still pending keep their shown value.
+        """
+        for habit_id, type_, value in rows:
+            if not self._pending.get((habit_id, day)):
+                self._types[habit_id] = type_
+                self._shown[(habit_id, day)] = value
+
+    def value(self, habit_id: int, day: date) -> int:
+        key = (habit_id, day)
+        if key not in self._shown:
+            snapshot = cached_progress(self.conn, day)
+            if snapshot is not None:
+                self.prime(day, ((p.id, p.type, p.today) for p in snapshot))
+        if key not in self._shown:
+            if not self._read_through:
+                raise KeyError(f"habit {habit_id} is not loaded for {day}")
+            row = self.conn.execute(
+                """
+                SELECT h.type, COALESCE(l.value, 0) AS value
+                FROM habits h
+                LEFT JOIN habit_logs l ON l.habit_id = h.id AND l.date = ?
+                WHERE h.id = ?
+                """,
+                (day, habit_id),
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"no habit with id {habit_id}")
+            self._types[habit_id] = row["type"]
+            self._shown[key] = row["value"]
+        return self._shown[key]
+
+    def add(self, habit_id: int, day: date, delta: int) -> int:
+        old = self.value(habit_id, day)
+        new = _clamp(self._types[habit_id], old + delta)
+        key = (habit_id, day)
+        self._shown[key] = new
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + new - old
+        if self._schedule is not None:
+            self._schedule()
+        return new
+
+    def toggle(self, habit_id: int, day: date) -> int:
+        return self.add(habit_id, day, -1 if self.value(habit_id, day) else 1)
+
+    def click(self, habit_id: int, day: date) -> int:
+        """One tap: toggle a binary habit, add 1 to a quantity habit."""
+        self.value(habit_id, day)
+        if self._types[habit_id] == "binary":
+            return self.toggle(habit_id, day)
+        return self.add(habit_id, day, 1)
+
+    def pending(self) -> int:
+        return sum(1 for delta in self._pending.values() if delta)
+
+    def flush(self) -> int:
+        """Write all pending clicks in one transaction; return how many logs changed.
+
+        If the write fails the clicks are pending again, merged with any made
+        meanwhile, and the error is raised.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        by_day: dict[date, dict[int, int]] = {}
+        for (habit_id, day), delta in pending.items():
+            if delta:
+                by_day.setdefault(day, {})[habit_id] = delta
+        if by_day:
+            try:
+                with transaction(self.conn):
+                    for day, deltas in by_day.items():
+                        log_habits(self.conn, day, deltas)
+            except BaseException:
+                with self._lock:
+                    for key, delta in pending.items():
+                        self._pending[key] = self._pending.get(key, 0) + delta
+                raise
+        return sum(len(d) for d in by_day.values())
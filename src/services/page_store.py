@@ -0,0 +1,206 @@
+"""Incremental, page-block encrypted storage for the SQLite image.
+
+The database image is split into blocks of whole SQLite pages.  Each block is
+sealed independently with a data key (DEK) and written to one of two slots in
+``<manifest>.<file id>.blocks``; the manifest lists the live slot, generation and digest
+of every block and is itself an encrypted container sealed with the session
+key.  Saving re-encrypts only the blocks whose digest changed, writes them to
+their inactive slot and then atomically replaces the manifest, so a crash at
+any point leaves the previous save readable.  Re-keying the session only
+rewrites the small manifest because the DEK never changes.
+
+The other ``db_mode`` settings keep the whole image in one container at the
+same path.  The two layouts are told apart by their plaintext (an SQLite
+header or a JSON manifest), so switching modes converts the file on the next
+save instead of failing to read it.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Optional, Union
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from .db import image_page_size
+from .security_service import (
+    NONCE_SIZE,
+    TAG_SIZE,
+    EncryptedFormatError,
+    SessionKey,
+    atomic_output,
+    decrypt_to_bytes,
+    encrypt_stream,
+    iter_decrypted,
+)
+
+MANIFEST_FORMAT = "pages-1"
+DEFAULT_PAGES_PER_BLOCK = 16
+
+_BLOCK_AAD = struct.Struct(">QQ")
+_SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def _parse_manifest(data: bytes) -> dict:
+    try:
+        manifest = json.loads(bytes(data))
+    except ValueError:  # includes UnicodeDecodeError
+        raise EncryptedFormatError("not a page store manifest or database image") from None
+    if not isinstance(manifest, dict) or manifest.get("format") != MANIFEST_FORMAT:
+        raise EncryptedFormatError("unsupported page store manifest")
+    return manifest
+
+
+def is_page_store(path: Union[str, Path], session: SessionKey) -> bool:
+    """True if *path* holds a page store manifest rather than a whole database image.
+
+    Only the first decrypted chunk is read.
+    """
+    with open(path, "rb") as f:
+        for chunk in iter_decrypted(f, session):
+            if chunk:
+                return bytes(chunk[:len(_SQLITE_HEADER)]) != _SQLITE_HEADER
+    return False
+
+
+class PageStore:
+    """Encrypted database image that is saved block by block."""
+
+    def __init__(
+        self,
+        manifest_path: Union[str, Path],
+        session: SessionKey,
+        pages_per_block: int = DEFAULT_PAGES_PER_BLOCK,
+    ):
+        self.manifest_path = Path(manifest_path)
+        self.session = session
+        self.pages_per_block = pages_per_block
+        self._manifest: Optional[dict] = None
+        self._whole_image = False  # the file holds a whole image, not a manifest yet
+
+    def exists(self) -> bool:
+        return self.manifest_path.exists()
+
+    def files(self) -> list[Path]:
+        """Return the manifest and live block file (e.g. for backups)."""
+        if self._manifest is None:
+            return []
+        return [self.manifest_path, self.blocks_path(self._manifest)]
+
+    def blocks_path(self, manifest: dict) -> Path:
+        return self.manifest_path.with_name(
+            f"{self.manifest_path.name}.{manifest['file_id'][:16]}.blocks"
+        )
+
+    def _slot_size(self, block_size: int) -> int:
+        return NONCE_SIZE + block_size + TAG_SIZE
+
+    def _offset(self, index: int, slot: int, block_size: int) -> int:
+        return (2 * index + slot) * self._slot_size(block_size)
+
+    def _aad(self, manifest: dict, index: int, generation: int) -> bytes:
+        return bytes.fromhex(manifest["file_id"]) + _BLOCK_AAD.pack(index, generation)
+
+    def _read_manifest(self) -> Optional[dict]:
+        """Return the manifest, or ``None`` if the file holds a whole image."""
+        data = decrypt_to_bytes(self.manifest_path, self.session)
+        return None if data.startswith(_SQLITE_HEADER) else _parse_manifest(data)
+
+    def load(self) -> Optional[bytearray]:
+        """Return the stored image, or ``None`` if nothing has been saved yet.
+
+        A whole image saved by another ``db_mode`` is returned as is; the next
+        :meth:`save` replaces it with a page store.
+        """
+        if not self.exists():
+            return None
+        data = decrypt_to_bytes(self.manifest_path, self.session)
+        if data.startswith(_SQLITE_HEADER):
+            self._whole_image = True
+            return data
+        manifest = _parse_manifest(data)
+        aesgcm = AESGCM(base64.b64decode(manifest["dek"]))
+        block_size = manifest["block_size"]
+        size = manifest["size"]
+        image = bytearray()
+        with open(self.blocks_path(manifest), "rb") as f:
+            for index, (slot, generation, _) in enumerate(manifest["blocks"]):
+                length = min(block_size, size - index * block_size)
+                f.seek(self._offset(index, slot, block_size))
+                raw = f.read(NONCE_SIZE + length + TAG_SIZE)
+                if len(raw) != NONCE_SIZE + length + TAG_SIZE:
+                    raise EncryptedFormatError("page store block is truncated")
+                image += aesgcm.decrypt(
+                    raw[:NONCE_SIZE], raw[NONCE_SIZE:], self._aad(manifest, index, generation)
+                )
+        self._manifest = manifest
+        return image
+
+    def _fresh_manifest(self, block_size: int) -> dict:
+        return {
+            "format": MANIFEST_FORMAT,
+            "dek": base64.b64encode(AESGCM.generate_key(bit_length=256)).decode("ascii"),
+            "file_id": os.urandom(16).hex(),
+            "block_size": block_size,
+            "generation": 0,
+            "size": 0,
+            "blocks": [],
+        }
+
+    def save(self, image: bytes) -> int:
+        """Persist *image*, rewriting only changed blocks; return how many."""
+        if self._manifest is None and not self._whole_image and self.exists():
+            self._manifest = self._read_manifest()
+        block_size = image_page_size(image) * self.pages_per_block
+        prev = self._manifest
+        if prev is None or prev["block_size"] != block_size:
+            # New store, or the page size changed (e.g. after VACUUM): the old
+            # blocks cannot be reused, so write a new block file alongside.
+            prev = self._fresh_manifest(block_size)
+        stale = self._manifest if prev is not self._manifest else None
+        blocks_path = self.blocks_path(prev)
+        generation = prev["generation"] + 1
+        aesgcm = AESGCM(base64.b64decode(prev["dek"]))
+        view = memoryview(image)
+        count = (len(image) + block_size - 1) // block_size
+        blocks = []
+        written = 0
+        mode = "r+b" if blocks_path.exists() else "w+b"
+        with open(blocks_path, mode) as f:
+            for index in range(count):
+                chunk = view[index * block_size:(index + 1) * block_size]
+                digest = hashlib.blake2b(chunk, digest_size=16).hexdigest()
+                old = prev["blocks"][index] if index < len(prev["blocks"]) else None
+                if old is not None and old[2] == digest:
+                    blocks.append(old)
+                    continue
+                slot = 1 - old[0] if old is not None else 0
+                nonce = os.urandom(NONCE_SIZE)
+                sealed = aesgcm.encrypt(nonce, chunk, self._aad(prev, index, generation))
+                f.seek(self._offset(index, slot, block_size))
+                f.write(nonce + sealed)
+                blocks.append([slot, generation, digest])
+                written += 1
+            f.flush()
+            os.fsync(f.fileno())
+
+        manifest = dict(prev, generation=generation, size=len(image), blocks=blocks)
+        self._write_manifest(manifest)
+        self._manifest = manifest
+        self._whole_image = False
+        # Only shrink or drop block files once the new manifest is durable.
+        with open(blocks_path, "r+b") as f:
+            f.truncate(self._offset(count, 0, block_size))
+        if stale is not None:
+            self.blocks_path(stale).unlink(missing_ok=True)
+        return written
+
+    def _write_manifest(self, manifest: dict) -> None:
+        data = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+        with atomic_output(self.manifest_path) as f:
+            encrypt_stream(io.BytesIO(data), f, self.session)
@@ -0,0 +1,307 @@
+"""Materialized habit totals per day, ISO week and month.
+
+``habit_rollups`` holds one row per habit and period with the summed log value
+(``total``) and the number of logged days (``days``).  Habit writes keep it
+current through :func:`apply_log_delta`, so goal progress, streaks and
+completion rates read a handful of period rows instead of scanning
+``habit_logs``.  :func:`rebuild_rollups` recomputes everything from the logs
+and :func:`verify_rollups` reports drift.
+
+For binary habits every log is worth 1, so ``total`` counts done days and one
+rule covers both habit types: a period meets the goal when
+``total >= goal_value``.
+"""
+from __future__ import annotations
+
+import sqlite3
+from datetime import date, timedelta
+from typing import Iterable, NamedTuple, Optional
+
+from .bitset_cache import bitsets_for
+from .db import transaction
+
+PERIODS = {"daily": "day", "weekly": "week", "monthly": "month"}
+
+# id(conn) -> (conn, day, rows): the last today_progress() result.  Holding the
+# connection keeps its id from being reused while the entry exists.
+_snapshots: dict[int, tuple[sqlite3.Connection, date, tuple]] = {}
+
+# Period keys computed in SQL; ``date(d, '-3 days', 'weekday 4')`` is the
+# Thursday of d's ISO week, which fixes the ISO year and week number.
+_ROLLUP_SELECT = """
+    SELECT habit_id, 'day' AS period, date AS period_key, SUM(value) AS total, COUNT(DISTINCT date) AS days
+    FROM habit_logs WHERE value > 0 {filter} GROUP BY habit_id, date
+    UNION ALL
+    SELECT habit_id, 'week',
+           strftime('%Y', date(date, '-3 days', 'weekday 4')) || '-W'
+           || printf('%02d', (strftime('%j', date(date, '-3 days', 'weekday 4')) - 1) / 7 + 1) AS wk,
+           SUM(value), COUNT(DISTINCT date)
+    FROM habit_logs WHERE value > 0 {filter} GROUP BY habit_id, wk
+    UNION ALL
+    SELECT habit_id, 'month', substr(date, 1, 7) AS mo, SUM(value), COUNT(DISTINCT date)
+    FROM habit_logs WHERE value > 0 {filter} GROUP BY habit_id, mo
+"""
+
+
+class GoalProgress(NamedTuple):
+    """Progress of one habit in the goal period containing a day."""
+
+    period: str
+    key: str
+    total: int
+    goal: int
+
+    @property
+    def done(self) -> bool:
+        return self.total >= self.goal
+
+    @property
+    def ratio(self) -> float:
+        return min(1.0, self.total / self.goal) if self.goal > 0 else 1.0
+
+
+class HabitProgress(NamedTuple):
+    """An active habit with its progress in the current goal period."""
+
+    id: int
+    name: str
+    type: str
+    goal_type: str
+    goal: int
+    total: int  # logged in the current goal period
+    today: int  # logged on the day itself
+
+    @property
+    def done(self) -> bool:
+        return self.total >= self.goal
+
+    @property
+    def ratio(self) -> float:
+        return min(1.0, self.total / self.goal) if self.goal > 0 else 1.0
+
+
+def period_key(period: str, day: date) -> str:
+    if period == "day":
+        return day.isoformat()
+    if period == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    return f"{day.year}-{day.month:02d}"
+
+
+def _previous_start(period: str, day: date) -> date:
+    """Return a day inside the period before the one containing *day*."""
+    if period == "day":
+        return day - timedelta(days=1)
+    if period == "week":
+        return day - timedelta(days=7)
+    return day.replace(day=1) - timedelta(days=1)
+
+
+def _period_count(period: str, start: date, end: date) -> int:
+    if period == "day":
+        return (end - start).days + 1
+    if period == "week":
+        monday = lambda d: d - timedelta(days=d.weekday())  # noqa: E731
+        return (monday(end) - monday(start)).days // 7 + 1
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def apply_log_delta(
+    conn: sqlite3.Connection, habit_id: int, day: date, value_delta: int, day_delta: int
+) -> None:
+    """Fold a change of one habit log into its day, week and month rows.
+
+    *value_delta* is the change of the logged value and *day_delta* is +1 when
+    the day gains a log, -1 when it loses it and 0 otherwise.  Call it inside
+    the transaction that changed ``habit_logs``.
+    """
+    apply_log_deltas(conn, [(habit_id, day, value_delta, day_delta)])
+
+
+def apply_log_deltas(conn: sqlite3.Connection, changes: Iterable[tuple[int, date, int, int]]) -> None:
+    """Batch form of :func:`apply_log_delta` for ``(habit_id, day, value_delta, day_delta)``."""
+    rows = []
+    gone = []
+    for habit_id, day, value_delta, day_delta in changes:
+        if not value_delta and not day_delta:
+            continue
+        for period in ("day", "week", "month"):
+            key = (habit_id, period, period_key(period, day))
+            rows.append((*key, value_delta, day_delta))
+            if day_delta < 0:
+                gone.append(key)
+    if not rows:
+        return
+    invalidate_progress(conn)
+    conn.executemany(
+        """
+        INSERT INTO habit_rollups(habit_id, period, period_key, total, days)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(habit_id, period, period_key) DO UPDATE SET
+            total = total + excluded.total, days = days + excluded.days
+        """,
+        rows,
+    )
+    if gone:
+        conn.executemany(
+            "DELETE FROM habit_rollups WHERE habit_id=? AND period=? AND period_key=? AND days <= 0",
+            gone,
+        )
+
+
+def rebuild_rollups(conn: sqlite3.Connection, habit_id: Optional[int] = None) -> None:
+    """Recompute rollups from ``habit_logs`` for one habit or all of them."""
+    invalidate_progress(conn)
+    with transaction(conn):
+        if habit_id is None:
+            conn.execute("DELETE FROM habit_rollups")
+            conn.execute(
+                "INSERT INTO habit_rollups(habit_id, period, period_key, total, days) "
+                + _ROLLUP_SELECT.format(filter="")
+            )
+        else:
+            conn.execute("DELETE FROM habit_rollups WHERE habit_id=?", (habit_id,))
+            conn.execute(
+                "INSERT INTO habit_rollups(habit_id, period, period_key, total, days) "
+                + _ROLLUP_SELECT.format(filter="AND habit_id = :habit"),
+                {"habit": habit_id},
+            )
+
+
+def verify_rollups(conn: sqlite3.Connection) -> list[tuple]:
+    """Return ``(habit_id, period, period_key)`` of rows that differ from the logs."""
+    rows = conn.execute(
+        f"""
+        SELECT habit_id, period, period_key FROM (
+            SELECT * FROM ({_ROLLUP_SELECT.format(filter="")})
+            EXCEPT SELECT habit_id, period, period_key, total, days FROM habit_rollups
+        )
+        UNION
+        SELECT habit_id, period, period_key FROM (
+            SELECT habit_id, period, period_key, total, days FROM habit_rollups
+            EXCEPT SELECT * FROM ({_ROLLUP_SELECT.format(filter="")})
+        )
+        ORDER BY 1, 2, 3
+        """
+    ).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def _goal(conn: sqlite3.Connection, habit_id: int) -> tuple[str, int]:
+    row = conn.execute("SELECT goal_type, goal_value FROM habits WHERE id=?", (habit_id,)).fetchone()
+    if row is None:
+        raise KeyError(f"no habit with id {habit_id}")
+    return PERIODS[row["goal_type"]], row["goal_value"]
+
+
+def goal_progress(conn: sqlite3.Connection, habit_id: int, day: date) -> GoalProgress:
+    """Return progress towards the habit's goal in the period containing *day*."""
+    period, goal = _goal(conn, habit_id)
+    key = period_key(period, day)
+    row = conn.execute(
+        "SELECT total FROM habit_rollups WHERE habit_id=? AND period=? AND period_key=?",
+        (habit_id, period, key),
+    ).fetchone()
+    return GoalProgress(period, key, row["total"] if row else 0, goal)
+
+
+def habit_streak(conn: sqlite3.Connection, habit_id: int, day: date) -> int:
+    """Count consecutive goal periods met up to the one containing *day*.
+
+    A current period that has not met the goal yet does not break the streak.
+    Daily goals of one log a day are counted on the habit's day bitmaps.
+    """
+    period, goal = _goal(conn, habit_id)
+    if period == "day" and goal == 1:
+        return bitsets_for(conn).streak(habit_id, day)
+    expected = period_key(period, day)
+    met = conn.execute(
+        """
+        SELECT period_key FROM habit_rollups
+        WHERE habit_id=? AND period=? AND period_key<=? AND total>=?
+        ORDER BY period_key DESC
+        """,
+        (habit_id, period, expected, goal),
+    )
+    current = expected
+    cursor = day
+    streak = 0
+    for row in met:
+        if row["period_key"] != expected and streak == 0 and expected == current:
+            # The current period is still open; count back from the previous one.
+            cursor = _previous_start(period, cursor)
+            expected = period_key(period, cursor)
+        if row["period_key"] != expected:
+            break
+        streak += 1
+        cursor = _previous_start(period, cursor)
+        expected = period_key(period, cursor)
+    return streak
+
+
+def habit_streaks(conn: sqlite3.Connection, habit_ids: Iterable[int], day: date) -> dict[int, int]:
+    """Return :func:`habit_streak` for each of *habit_ids*."""
+    return {habit_id: habit_streak(conn, habit_id, day) for habit_id in habit_ids}
+
+
+def completion_rate(conn: sqlite3.Connection, habit_id: int, start: date, end: date) -> float:
+    """Return the share of goal periods between *start* and *end* that met the goal."""
+    period, goal = _goal(conn, habit_id)
+    met = conn.execute(
+        """
+        SELECT COUNT(*) FROM habit_rollups
+        WHERE habit_id=? AND period=? AND period_key BETWEEN ? AND ? AND total>=?
+        """,
+        (habit_id, period, period_key(period, start), period_key(period, end), goal),
+    ).fetchone()[0]
+    return met / _period_count(period, start, end)
+
+
+def today_progress(conn: sqlite3.Connection, day: Optional[date] = None) -> tuple[HabitProgress, ...]:
+    """Return every active habit with its progress for *day* (default today).
+
+    One query: each habit joins the rollup row of its own goal period plus its
+    day row, both primary-key lookups.  The result is cached per connection
+    and day until a habit write calls :func:`invalidate_progress` (rollup
+    updates and :func:`~services.habits_service.add_habit` do).  Results read
+    inside a transaction are not cached: a rollback would leave them stale.
+    """
+    day = day or date.today()
+    cached = _snapshots.get(id(conn))
+    if cached is not None and cached[0] is conn and cached[1] == day:
+        return cached[2]
+    rows = conn.execute(
+        """
+        SELECT h.id, h.name, h.type, h.goal_type, h.goal_value,
+               COALESCE(r.total, 0) AS total, COALESCE(d.total, 0) AS today
+        FROM habits h
+        LEFT JOIN habit_rollups r
+          ON r.habit_id = h.id
+         AND r.period = CASE h.goal_type WHEN 'daily' THEN 'day' WHEN 'weekly' THEN 'week' ELSE 'month' END
+         AND r.period_key = CASE h.goal_type WHEN 'daily' THEN :day WHEN 'weekly' THEN :week ELSE :month END
+        LEFT JOIN habit_rollups d
+          ON d.habit_id = h.id AND d.period = 'day' AND d.period_key = :day
+        WHERE h.is_active = 1
+        ORDER BY h.id
+        """,
+        {
+            "day": period_key("day", day),
+            "week": period_key("week", day),
+            "month": period_key("month", day),
+        },
+    ).fetchall()
+    snapshot = tuple(HabitProgress(*row) for row in rows)
+    if not conn.in_transaction:
+        _snapshots[id(conn)] = (conn, day, snapshot)
+    return snapshot
+
+
+def cached_progress(conn: sqlite3.Connection, day: date) -> Optional[tuple[HabitProgress, ...]]:
+    """Return the :func:`today_progress` snapshot of *day* if one is cached; never queries."""
+    cached = _snapshots.get(id(conn))
+    return cached[2] if cached is not None and cached[0] is conn and cached[1] == day else None
+
+
+def invalidate_progress(conn: sqlite3.Connection) -> None:
+    _snapshots.pop(id(conn), None)
@@ -1,54 +1,545 @@
-"""File-level AES-GCM encryption helpers."""
+"""File-level AES-GCM encryption helpers.
+
+Encrypted files use a framed, versioned container so that encryption and
+decryption stream from disk to disk with constant memory::
+
+    MAGIC | u8 version | u32 header_len | header (JSON)
+    segment*: u32 ct_len | nonce (12) | ciphertext + tag
+
+Every segment is sealed with its own random nonce.  The associated data binds
+the segment to the header, its position and whether it is the final one, so
+reordering, truncation or header tampering fail authentication.  Files written
+by the original single-blob layout (``nonce + ciphertext``) are still readable.
+
+The header also records the random salt and Argon2id parameters used to derive
+the key, so :func:`unlock` can run the KDF once per session and hand out a
+:class:`SessionKey` that every encrypt/decrypt in that session reuses, and the
+optional compression codec applied to the plaintext before encryption.
+"""
 from __future__ import annotations
 
+import base64
+import io
+import json
 import os
+import sqlite3
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Callable, Iterable, Iterator, NamedTuple, Optional, Union
 
 from argon2.low_level import hash_secret_raw, Type
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
-DEFAULT_SALT = b"static_salt_change_me"  # placeholder; load from security_meta in real use
+from .compression import iter_compressed, iter_decompressed
+from .db import transaction
+
+DEFAULT_SALT = b"static_salt_change_me"  # only used to read files written before per-file salts
+SALT_SIZE = 16
+DEFAULT_KDF_PARAMS = {"time_cost": 3, "memory_cost": 2 ** 15, "parallelism": 1}
+DEFAULT_KDF_TARGET_MS = 500
+MIN_MEMORY_COST = 2 ** 15  # KiB
+MAX_MEMORY_COST = 2 ** 20  # KiB
+MAX_PARALLELISM = 16
+ERASE_BUFFER_SIZE = 1024 * 1024
+SQLITE_SIDECARS = ("-wal", "-shm", "-journal")
+
+MAGIC = b"KSZE"
+FORMAT_VERSION = 2  # version 1 is the legacy ``nonce + ciphertext`` blob
+DEFAULT_SEGMENT_SIZE = 1024 * 1024
+NONCE_SIZE = 12
+TAG_SIZE = 16
 
+_PREAMBLE = struct.Struct(">4sBI")
+_SEGMENT_LEN = struct.Struct(">I")
+_SEGMENT_AAD = struct.Struct(">QB")
+_MAX_HEADER_LEN = 64 * 1024
 
-def _derive_key(password: str, salt: bytes = DEFAULT_SALT) -> bytes:
+
+class EncryptedFormatError(ValueError):
+    """Raised when an encrypted container is malformed or truncated."""
+
+
+def _derive_key(
+    password: str, salt: bytes = DEFAULT_SALT, params: Optional[dict] = None
+) -> bytes:
+    params = params or DEFAULT_KDF_PARAMS
     return hash_secret_raw(
         password.encode("utf-8"),
         salt,
-        time_cost=3,
-        memory_cost=2 ** 15,
-        parallelism=1,
+        time_cost=params["time_cost"],
+        memory_cost=params["memory_cost"],
+        parallelism=params["parallelism"],
         hash_len=32,
         type=Type.ID,
     )
 
 
-def encrypt_file(src: Union[str, Path], dest: Union[str, Path], password: str) -> None:
-    key = _derive_key(password)
+def new_kdf_meta(params: Optional[dict] = None) -> dict:
+    """Return a fresh KDF description with a random salt."""
+    meta = {"alg": "argon2id", "salt": base64.b64encode(os.urandom(SALT_SIZE)).decode("ascii")}
+    meta.update(params or DEFAULT_KDF_PARAMS)
+    return meta
+
+
+def _kdf_params(kdf: dict) -> dict:
+    return {name: int(kdf[name]) for name in DEFAULT_KDF_PARAMS}
+
+
+class SessionKey:
+    """Derived key held in memory for one unlocked session.
+
+    The key lives in a mutable buffer so :meth:`zeroize` can wipe it on lock or
+    exit.  ``legacy_key`` is only set when the file on disk predates per-file
+    salts; it is used to read that file once and is never used for writing.
+    """
+
+    def __init__(self, key: bytes, kdf: dict, legacy_key: Optional[bytes] = None):
+        self._key = bytearray(key)
+        self.kdf = kdf
+        self._legacy = bytearray(legacy_key) if legacy_key is not None else None
+
+    @property
+    def key(self) -> bytes:
+        if not self._key:
+            raise RuntimeError("session key has been zeroized")
+        return bytes(self._key)
+
+    def key_for(self, kdf: Optional[dict]) -> bytes:
+        """Return the key matching the KDF description found in a file header."""
+        if kdf is None:
+            if self._legacy is None:
+                raise EncryptedFormatError("file has no KDF metadata and no legacy key is loaded")
+            return bytes(self._legacy)
+        if kdf.get("salt") != self.kdf["salt"] or _kdf_params(kdf) != _kdf_params(self.kdf):
+            raise EncryptedFormatError("file was encrypted under a different key")
+        return self.key
+
+    def zeroize(self) -> None:
+        for buf in (self._key, self._legacy):
+            if buf is not None:
+                buf[:] = bytes(len(buf))
+                buf.clear()
+        self._legacy = None
+
+    def __enter__(self) -> "SessionKey":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.zeroize()
+
+
+def derive_session_key(password: str, kdf: Optional[dict] = None) -> SessionKey:
+    """Run the KDF once and wrap the result in a :class:`SessionKey`."""
+    kdf = kdf or new_kdf_meta()
+    salt = base64.b64decode(kdf["salt"])
+    return SessionKey(_derive_key(password, salt, _kdf_params(kdf)), kdf)
+
+
+def read_container_meta(path: Union[str, Path]) -> dict:
+    """Return the JSON header of an encrypted file (empty for legacy files)."""
+    with open(path, "rb") as f:
+        version, header = read_header(f)
+    return json.loads(header) if version > 1 else {}
+
+
+def read_kdf_meta(path: Union[str, Path]) -> Optional[dict]:
+    """Return the KDF description stored in an encrypted file, if any."""
+    return read_container_meta(path).get("kdf")
+
+
+@contextmanager
+def atomic_output(dest: Union[str, Path]) -> Iterator[BinaryIO]:
+    """Write to a temp file beside *dest*, fsync it and rename it into place.
+
+    Readers (and a crash) only ever see the old or the complete new file.
+    """
+    dest = Path(dest)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=dest.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, dest)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _time_kdf(params: dict) -> float:
+    start = time.perf_counter()
+    hash_secret_raw(
+        b"calibration",
+        os.urandom(SALT_SIZE),
+        time_cost=params["time_cost"],
+        memory_cost=params["memory_cost"],
+        parallelism=params["parallelism"],
+        hash_len=32,
+        type=Type.ID,
+    )
+    return time.perf_counter() - start
+
+
+def calibrate_kdf(
+    target_seconds: float = DEFAULT_KDF_TARGET_MS / 1000,
+    max_memory_cost: int = MAX_MEMORY_COST,
+    max_parallelism: Optional[int] = None,
+    measure: Optional[Callable[[dict], float]] = None,
+) -> dict:
+    """Benchmark Argon2id here and pick parameters close to *target_seconds*.
+
+    Lanes follow the CPU count, memory is doubled while a single pass stays
+    under half the budget, and the rest of the budget is spent on passes.
+    """
+    measure = measure or _time_kdf
+    parallelism = max(1, min(max_parallelism or os.cpu_count() or 1, MAX_PARALLELISM))
+    params = {
+        "time_cost": 1,
+        "memory_cost": max(MIN_MEMORY_COST, 8 * parallelism),
+        "parallelism": parallelism,
+    }
+    elapsed = measure(params)
+    while elapsed * 2 <= target_seconds and params["memory_cost"] * 2 <= max_memory_cost:
+        params["memory_cost"] *= 2
+        elapsed = measure(params)
+    # Argon2 cost is linear in time_cost, so one measurement is enough.
+    params["time_cost"] = max(1, int(target_seconds / elapsed)) if elapsed > 0 else 1
+    params["target_ms"] = round(target_seconds * 1000)
+    return params
+
+
+def kdf_outdated(kdf: Optional[dict], target_ms: int) -> bool:
+    """Whether *kdf* predates calibration or was calibrated for another target."""
+    return kdf is None or kdf.get("target_ms") != target_ms
+
+
+def unlock(
+    enc_path: Union[str, Path], password: str, params: Optional[dict] = None
+) -> SessionKey:
+    """Derive the session key for *enc_path* (or for a new database).
+
+    Files with a recorded salt reuse it.  Legacy files and fresh databases get a
+    new random salt (and *params*, if given); for legacy files the old
+    static-salt key is kept alongside so the existing data can still be read.
+    """
+    enc_path = Path(enc_path)
+    kdf = read_kdf_meta(enc_path) if enc_path.exists() else None
+    if kdf is not None:
+        return derive_session_key(password, kdf)
+    kdf = new_kdf_meta(params)
+    legacy_key = _derive_key(password) if enc_path.exists() else None
+    key = _derive_key(password, base64.b64decode(kdf["salt"]), _kdf_params(kdf))
+    return SessionKey(key, kdf, legacy_key)
+
+
+def rekey_file(
+    enc_path: Union[str, Path], session: SessionKey, password: str, params: dict
+) -> SessionKey:
+    """Re-encrypt *enc_path* under a fresh salt and *params*; return the new key.
+
+    Segments are decrypted and re-encrypted in a single streaming pass into a
+    file that atomically replaces the original, so no plaintext touches the
+    disk and a crash leaves the old file intact.
+    """
+    new = derive_session_key(password, new_kdf_meta(params))
+    codec = read_container_meta(enc_path).get("codec", "none")
+    try:
+        # Close the source before the rename; Windows refuses to replace open files.
+        with atomic_output(enc_path) as fout:
+            with open(enc_path, "rb") as fin:
+                plain = _ChunkReader(iter_decrypted(fin, session))
+                encrypt_stream(plain, fout, new, codec=codec)
+    except BaseException:
+        new.zeroize()
+        raise
+    session.zeroize()
+    return new
+
+
+def open_session(
+    enc_path: Union[str, Path], password: str, target_ms: int = DEFAULT_KDF_TARGET_MS
+) -> SessionKey:
+    """Unlock *enc_path*, calibrating and re-keying when its KDF is outdated.
+
+    Calibration only runs for new databases, legacy files and files whose
+    recorded target differs from *target_ms*; other unlocks just read the
+    stored parameters back.
+    """
+    enc_path = Path(enc_path)
+    kdf = read_kdf_meta(enc_path) if enc_path.exists() else None
+    if not kdf_outdated(kdf, target_ms):
+        return derive_session_key(password, kdf)
+    params = calibrate_kdf(target_ms / 1000)
+    session = unlock(enc_path, password, params)
+    if kdf is not None:
+        session = rekey_file(enc_path, session, password, params)
+    return session
+
+
+def store_security_meta(conn: sqlite3.Connection, session: SessionKey) -> None:
+    """Mirror the session's KDF description into the ``security_meta`` table."""
+    with transaction(conn):
+        conn.executemany(
+            "INSERT INTO security_meta(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            [(f"kdf_{name}", str(value)) for name, value in session.kdf.items()],
+        )
+
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise EncryptedFormatError("unexpected end of encrypted file")
+    return data
+
+
+def _segment_aad(header: bytes, index: int, final: bool) -> bytes:
+    return _SEGMENT_AAD.pack(index, 1 if final else 0) + header
+
+
+def _write_header(dest: BinaryIO, meta: dict) -> bytes:
+    header = json.dumps(meta, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    dest.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+    dest.write(header)
+    return header
+
+
+def read_header(src: BinaryIO) -> tuple[int, bytes]:
+    """Return ``(version, raw_header)`` and leave *src* positioned after it.
+
+    Legacy single-blob files report version 1 with an empty header and *src*
+    rewound to the start.
+    """
+    start = src.tell()
+    preamble = src.read(_PREAMBLE.size)
+    if len(preamble) < _PREAMBLE.size or preamble[:4] != MAGIC:
+        src.seek(start)
+        return 1, b""
+    _, version, header_len = _PREAMBLE.unpack(preamble)
+    if version != FORMAT_VERSION:
+        raise EncryptedFormatError(f"unsupported encrypted format version {version}")
+    if header_len > _MAX_HEADER_LEN:
+        raise EncryptedFormatError("encrypted header too large")
+    return version, _read_exact(src, header_len)
+
+
+def encrypt_stream(
+    src: BinaryIO,
+    dest: BinaryIO,
+    key: Union[bytes, SessionKey],
+    segment_size: int = DEFAULT_SEGMENT_SIZE,
+    codec: str = "none",
+    level: Optional[int] = None,
+) -> None:
+    """Encrypt *src* into *dest* segment by segment, compressing first."""
+    if segment_size <= 0:
+        raise ValueError("segment_size must be positive")
+    meta: dict = {"segment_size": segment_size}
+    if codec != "none":
+        meta["codec"] = codec
+        src = _ChunkReader(iter_compressed(src, codec, level))
+    if isinstance(key, SessionKey):
+        meta["kdf"] = key.kdf
+        key = key.key
     aesgcm = AESGCM(key)
-    nonce = os.urandom(12)
-    data = Path(src).read_bytes()
-    enc = aesgcm.encrypt(nonce, data, None)
-    Path(dest).write_bytes(nonce + enc)
+    header = _write_header(dest, meta)
+    index = 0
+    chunk = src.read(segment_size)
+    while True:
+        # Read one segment ahead so the last one can be flagged as final.
+        nxt = src.read(segment_size) if len(chunk) == segment_size else b""
+        final = not nxt
+        nonce = os.urandom(NONCE_SIZE)
+        enc = aesgcm.encrypt(nonce, chunk, _segment_aad(header, index, final))
+        dest.write(_SEGMENT_LEN.pack(len(enc)))
+        dest.write(nonce)
+        dest.write(enc)
+        if final:
+            return
+        chunk = nxt
+        index += 1
+
+
+def iter_decrypted(src: BinaryIO, key: Union[bytes, SessionKey]) -> Iterator[bytes]:
+    """Yield the plaintext of a container, decompressing it if needed."""
+    version, header = read_header(src)
+    meta = json.loads(header) if version > 1 else {}
+    segments = _iter_segments(src, key, version, header, meta)
+    codec = meta.get("codec", "none")
+    return segments if codec == "none" else iter_decompressed(segments, codec)
 
 
-def decrypt_file(src: Union[str, Path], dest: Union[str, Path], password: str) -> None:
-    key = _derive_key(password)
+def _iter_segments(
+    src: BinaryIO, key: Union[bytes, SessionKey], version: int, header: bytes, meta: dict
+) -> Iterator[bytes]:
+    if isinstance(key, SessionKey):
+        key = key.key_for(meta.get("kdf"))
     aesgcm = AESGCM(key)
-    blob = Path(src).read_bytes()
-    nonce, ciphertext = blob[:12], blob[12:]
-    data = aesgcm.decrypt(nonce, ciphertext, None)
-    Path(dest).write_bytes(data)
+    if version == 1:
+        blob = src.read()
+        yield aesgcm.decrypt(blob[:NONCE_SIZE], blob[NONCE_SIZE:], None)
+        return
+
+    max_len = int(meta["segment_size"]) + TAG_SIZE
+    index = 0
+    raw_len = src.read(_SEGMENT_LEN.size)
+    while True:
+        if len(raw_len) != _SEGMENT_LEN.size:
+            raise EncryptedFormatError("encrypted file is truncated")
+        (ct_len,) = _SEGMENT_LEN.unpack(raw_len)
+        if not TAG_SIZE <= ct_len <= max_len:
+            raise EncryptedFormatError("invalid segment length")
+        nonce = _read_exact(src, NONCE_SIZE)
+        enc = _read_exact(src, ct_len)
+        # Peek at the next length prefix to learn whether this segment is final.
+        raw_len = src.read(_SEGMENT_LEN.size)
+        final = not raw_len
+        yield aesgcm.decrypt(nonce, enc, _segment_aad(header, index, final))
+        if final:
+            return
+        index += 1
+
+
+def decrypt_stream(src: BinaryIO, dest: BinaryIO, key: Union[bytes, SessionKey]) -> None:
+    """Decrypt a container produced by :func:`encrypt_stream` into *dest*."""
+    for chunk in iter_decrypted(src, key):
+        dest.write(chunk)
+
+
+class _ChunkReader(io.RawIOBase):
+    """Minimal file-like ``read`` over an iterator of byte chunks."""
 
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buf = b""
 
-def secure_delete(path: Union[str, Path]) -> None:
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        parts = [self._buf]
+        have = len(self._buf)
+        while size < 0 or have < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            parts.append(chunk)
+            have += len(chunk)
+        data = b"".join(parts)
+        if size < 0:
+            self._buf = b""
+            return data
+        self._buf = data[size:]
+        return data[:size]
+
+
+def decrypt_to_bytes(src: Union[str, Path], key: Union[SessionKey, str]) -> bytearray:
+    """Decrypt *src* into memory, e.g. for :meth:`sqlite3.Connection.deserialize`."""
+    key = _session_for(key, src)
+    data = bytearray()
+    with open(src, "rb") as fin:
+        for chunk in iter_decrypted(fin, key):
+            data += chunk
+    return data
+
+
+def encrypt_bytes(
+    data: bytes,
+    dest: Union[str, Path],
+    key: Union[SessionKey, str],
+    segment_size: int = DEFAULT_SEGMENT_SIZE,
+    codec: str = "none",
+    level: Optional[int] = None,
+) -> None:
+    """Encrypt an in-memory image (e.g. ``Connection.serialize()``) to *dest*."""
+    key = _session_for(key, dest)
+    with atomic_output(dest) as fout:
+        encrypt_stream(io.BytesIO(data), fout, key, segment_size, codec, level)
+
+
+def _session_for(key: Union[SessionKey, str], enc_path: Union[str, Path]) -> SessionKey:
+    # A bare password still works but pays the KDF on every call.
+    return key if isinstance(key, SessionKey) else unlock(enc_path, key)
+
+
+def encrypt_file(
+    src: Union[str, Path],
+    dest: Union[str, Path],
+    key: Union[SessionKey, str],
+    segment_size: int = DEFAULT_SEGMENT_SIZE,
+    codec: str = "none",
+    level: Optional[int] = None,
+) -> None:
+    key = _session_for(key, dest)
+    with open(src, "rb") as fin, atomic_output(dest) as fout:
+        encrypt_stream(fin, fout, key, segment_size, codec, level)
+
+
+def decrypt_file(
+    src: Union[str, Path], dest: Union[str, Path], key: Union[SessionKey, str]
+) -> None:
+    key = _session_for(key, src)
     try:
-        p = Path(path)
-        if p.exists():
-            size = p.stat().st_size
-            with open(p, "ba", buffering=0) as f:
-                f.seek(0)
-                f.write(os.urandom(size))
-            p.unlink()
+        with open(src, "rb") as fin, open(dest, "wb") as fout:
+            decrypt_stream(fin, fout, key)
+    except Exception:
+        # Never leave a partially decrypted plaintext behind.
+        Path(dest).unlink(missing_ok=True)
+        raise
+
+
+class EraseReport(NamedTuple):
+    """Result of :func:`secure_delete`."""
+
+    files: list[Path]
+    bytes: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        """Overwrite throughput in bytes per second."""
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+
+def sqlite_sidecars(path: Union[str, Path]) -> list[Path]:
+    """Return the existing ``-wal``/``-shm``/``-journal`` files for a DB path."""
+    p = Path(path)
+    return [s for s in (p.with_name(p.name + suffix) for suffix in SQLITE_SIDECARS) if s.exists()]
+
+
+def _overwrite(path: Path, buf: memoryview) -> int:
+    try:
+        f = open(path, "r+b", buffering=0)
     except FileNotFoundError:
-        pass
+        return 0
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        remaining = size
+        while remaining:
+            n = f.write(buf[: min(remaining, len(buf))])
+            remaining -= n
+        os.fsync(f.fileno())
+    return size
+
+
+def secure_delete(
+    path: Union[str, Path], buffer_size: int = ERASE_BUFFER_SIZE
+) -> EraseReport:
+    """Overwrite *path* and its SQLite sidecars in place, fsync, then unlink.
+
+    One random buffer of *buffer_size* is reused for every write, so memory use
+    does not depend on the file size.  (On SSDs and copy-on-write filesystems
+    an in-place overwrite is best effort; the plaintext should not reach the
+    disk in the first place - see ``db_mode``.)
+    """
+    p = Path(path)
+    files = [p] + sqlite_sidecars(p) if p.exists() else sqlite_sidecars(p)
+    buf = memoryview(os.urandom(buffer_size))
+    start = time.perf_counter()
+    total = 0
+    for f in files:
+        total += _overwrite(f, buf)
+        f.unlink(missing_ok=True)
+    return EraseReport(files, total, time.perf_counter() - start)
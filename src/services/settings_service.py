@@ -4,6 +4,8 @@ from __future__ import annotations
 import sqlite3
 from typing import Optional
 
+from .db import transaction
+
 
 def get_setting(conn: sqlite3.Connection, key: str, default: Optional[str] = None) -> Optional[str]:
     cur = conn.execute("SELECT value FROM app_settings WHERE key=?", (key,))
@@ -12,8 +14,8 @@ def get_setting(conn: sqlite3.Connection, key: str, default: Optional[str] = Non
 
 
 def set_setting(conn: sqlite3.Connection, key: str, value: str) -> None:
-    conn.execute(
-        "INSERT INTO app_settings(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
-        (key, value),
-    )
-    conn.commit()
+    with transaction(conn):
+        conn.execute(
+            "INSERT INTO app_settings(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            (key, value),
+        )
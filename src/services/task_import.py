@@ -0,0 +1,164 @@
+"""Streaming readers for task import files.
+
+Two formats are accepted:
+
+* JSON - either ``{"tasks": [...]}`` (what the bulk-update dialog shows) or a
+  bare ``[...]`` array.  The array is decoded one element at a time, so a
+  large file never has to fit in memory.
+* NDJSON - one task object per line.
+
+Readers yield whatever each element decodes to; checking that a record is a
+usable task is left to :func:`services.tasks_service.import_tasks`, which
+reports bad rows instead of failing the whole import.  An NDJSON line that is
+not valid JSON is yielded as a :class:`RecordError` for the same reason.
+"""
+from __future__ import annotations
+
+import io
+import json
+from pathlib import Path
+from typing import Iterator, Optional, TextIO, Union
+
+READ_SIZE = 64 * 1024
+NDJSON_SUFFIXES = {".ndjson", ".jsonl"}
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+# A decode error this close to the end of the buffer may just be a literal,
+# number or \uXXXX escape cut off by the read size.
+_CUT_TOKEN = 6
+
+
+class RecordError(ValueError):
+    """A single record could not be decoded; the rest of the input is fine."""
+
+
+class _Reader:
+    """Buffered text cursor that decodes one JSON value at a time."""
+
+    def __init__(self, f: TextIO):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.f.read(READ_SIZE)
+        if not data:
+            self.eof = True
+            return False
+        # Drop consumed text only when reading more, not after every value.
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character ('' at end of input)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"expected {char!r} in JSON input, found {found or 'end of input'!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as exc:
+                # Cut off at the buffer edge: retry with more text.  Any other
+                # error is final; reading on would pull the rest of the file
+                # into the buffer and decode it again on every read.
+                cut_off = exc.msg.startswith("Unterminated string") or len(self.buf) - exc.pos <= _CUT_TOKEN
+                if cut_off and self._fill():
+                    continue
+                raise
+            # A number at the buffer edge may continue in the next read.
+            if end == len(self.buf) and not self.eof and isinstance(value, (int, float)):
+                if self._fill():
+                    continue
+            self.pos = end
+            return value
+
+
+def iter_json_records(f: TextIO) -> Iterator[object]:
+    """Yield the task elements of a JSON document without loading all of it."""
+    reader = _Reader(f)
+    first = reader.peek()
+    if first == "{":
+        reader.expect("{")
+        while True:
+            if reader.peek() == "}":
+                return
+            key = reader.value()
+            reader.expect(":")
+            if key == "tasks" and reader.peek() == "[":
+                break
+            reader.value()  # some other top-level key: skip its value
+            if reader.peek() == ",":
+                reader.expect(",")
+    elif first != "[":
+        raise ValueError("JSON import must be an object with a 'tasks' list or a list")
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.value()
+        if reader.peek() == "]":
+            return
+        reader.expect(",")
+
+
+def iter_ndjson_records(f: TextIO) -> Iterator[object]:
+    """Yield one decoded record per non-blank line."""
+    for lineno, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield RecordError(f"line {lineno}: {exc.msg}")
+
+
+def _looks_like_ndjson(first_line: str) -> bool:
+    try:
+        value = json.loads(first_line)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(value, dict) and "tasks" not in value
+
+
+def iter_records(path: Union[str, Path], fmt: Optional[str] = None) -> Iterator[object]:
+    """Stream task records from *path*.
+
+    *fmt* is ``"json"`` or ``"ndjson"``; by default it follows the file suffix.
+    """
+    path = Path(path)
+    if fmt is None:
+        fmt = "ndjson" if path.suffix.lower() in NDJSON_SUFFIXES else "json"
+    with open(path, "r", encoding="utf-8-sig") as f:
+        if fmt == "ndjson":
+            yield from iter_ndjson_records(f)
+        else:
+            yield from iter_json_records(f)
+
+
+def parse_records(text: str) -> Iterator[object]:
+    """Stream task records from pasted text, detecting JSON vs NDJSON."""
+    stripped = text.lstrip()
+    if not stripped:
+        return iter(())
+    first_line = stripped.split("\n", 1)[0]
+    if _looks_like_ndjson(first_line):
+        return iter_ndjson_records(io.StringIO(text))
+    return iter_json_records(io.StringIO(text))
@@ -1,8 +1,18 @@
 """Task-related helpers."""
 from __future__ import annotations
 
+import json
+import re
 import sqlite3
-from typing import Optional
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from .change_bus import CREATED, UPDATED, Change, publish
+from .db import transaction
+
+TASK_COLUMNS = ("title", "priority", "estimate", "notes", "status")
+TASK_STATUSES = ("TODO", "IN_PROGRESS", "DONE", "CANCELED")
+IMPORT_BATCH_SIZE = 2000
+_WEEK_RE = re.compile(r"^\d{4}-W\d{2}$")
 
 
 def get_or_create_default_project(conn: sqlite3.Connection) -> int:
@@ -11,10 +21,10 @@ def get_or_create_default_project(conn: sqlite3.Connection) -> int:
     row = cur.fetchone()
     if row:
         return row["id"]
-    cur = conn.execute(
-        "INSERT INTO projects(name, status) VALUES ('General', 'ACTIVE')"
-    )
-    conn.commit()
+    with transaction(conn):
+        cur = conn.execute(
+            "INSERT INTO projects(name, status) VALUES ('General', 'ACTIVE')"
+        )
     return cur.lastrowid
 
 
@@ -47,6 +57,75 @@ def get_backlog_tasks(conn: sqlite3.Connection):
     return cur.fetchall()
 
 
+class TaskRecord(NamedTuple):
+    """The few task columns list views keep in memory."""
+
+    id: int
+    title: str
+    status: str
+
+
+def get_backlog_page(conn: sqlite3.Connection, after_id: int = 0, limit: int = 200) -> list[TaskRecord]:
+    """Return up to *limit* unplanned tasks with ids above *after_id*, by id."""
+    cur = conn.execute(
+        """
+        SELECT t.id, t.title, t.status
+        FROM tasks t
+        WHERE t.id > ? AND NOT EXISTS (SELECT 1 FROM weekly_assignments w WHERE w.task_id = t.id)
+        ORDER BY t.id
+        LIMIT ?
+        """,
+        (after_id, limit),
+    )
+    return [TaskRecord(*row) for row in cur]
+
+
+def get_week_page(
+    conn: sqlite3.Connection,
+    iso_week: str,
+    statuses: Iterable[str],
+    after_id: int = 0,
+    limit: int = 200,
+) -> list[TaskRecord]:
+    """Return up to *limit* tasks of *iso_week* in *statuses* with ids above *after_id*."""
+    statuses = tuple(statuses)
+    cur = conn.execute(
+        f"""
+        SELECT t.id, t.title, t.status
+        FROM weekly_assignments w
+        JOIN tasks t ON t.id = w.task_id
+        WHERE w.iso_week = ? AND t.status IN ({", ".join("?" * len(statuses))}) AND t.id > ?
+        ORDER BY t.id
+        LIMIT ?
+        """,
+        (iso_week, *statuses, after_id, limit),
+    )
+    return [TaskRecord(*row) for row in cur]
+
+
+class TaskPlacement(NamedTuple):
+    """Where a task belongs on the board of one week."""
+
+    record: TaskRecord
+    in_week: bool  # planned for that week
+    planned: bool  # planned for any week, i.e. not in the backlog
+
+
+def locate_tasks(conn: sqlite3.Connection, ids: Iterable[int], iso_week: str) -> list[TaskPlacement]:
+    """Return the placement of each existing task in *ids*, by id."""
+    cur = conn.execute(
+        """
+        SELECT t.id, t.title, t.status,
+               EXISTS (SELECT 1 FROM weekly_assignments w WHERE w.task_id = t.id AND w.iso_week = ?),
+               EXISTS (SELECT 1 FROM weekly_assignments w WHERE w.task_id = t.id)
+        FROM tasks t
+        WHERE t.id IN (SELECT value FROM json_each(?))
+        ORDER BY t.id
+        """,
+        (iso_week, json.dumps(list(ids))),
+    )
+    return [TaskPlacement(TaskRecord(*row[:3]), bool(row[3]), bool(row[4])) for row in cur]
+
 
 def add_task(
     conn: sqlite3.Connection,
@@ -56,66 +135,278 @@ def add_task(
     estimate: Optional[int] = None,
     notes: Optional[str] = None,
 ) -> int:
-    cur = conn.execute(
-        """
-        INSERT INTO tasks(project_id, title, priority, estimate, notes)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        (project_id, title, priority, estimate, notes),
-    )
-    conn.commit()
+    with transaction(conn):
+        cur = conn.execute(
+            """
+            INSERT INTO tasks(project_id, title, priority, estimate, notes)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (project_id, title, priority, estimate, notes),
+        )
+        publish(conn, Change("task", CREATED, (cur.lastrowid,)))
     return cur.lastrowid
 
 
 def assign_to_week(
     conn: sqlite3.Connection, task_id: int, iso_week: str, rolled_over: bool = False
 ) -> None:
-    conn.execute(
-        "INSERT OR IGNORE INTO weekly_assignments(task_id, iso_week, planned, rolled_over) VALUES (?, ?, 1, ?)",
-        (task_id, iso_week, 1 if rolled_over else 0),
-    )
-    conn.commit()
+    with transaction(conn):
+        conn.execute(
+            "INSERT OR IGNORE INTO weekly_assignments(task_id, iso_week, planned, rolled_over) VALUES (?, ?, 1, ?)",
+            (task_id, iso_week, 1 if rolled_over else 0),
+        )
+        publish(conn, Change("assignment", CREATED, (task_id,)))
 
 
 def update_status(conn: sqlite3.Connection, task_id: int, status: str) -> None:
-    conn.execute("UPDATE tasks SET status=? WHERE id=?", (status, task_id))
-    conn.commit()
-
-
-def bulk_update(conn: sqlite3.Connection, tasks: list[dict]) -> None:
-    """Create or update tasks in bulk based on a JSON-friendly structure."""
-    default_project = get_or_create_default_project(conn)
-    for item in tasks:
-        task_id = item.get("id")
-        if task_id:
-            fields = []
-            values = []
-            for col in ["title", "priority", "estimate", "notes", "status"]:
-                if col in item:
-                    fields.append(f"{col}=?")
-                    values.append(item[col])
-            if fields:
-                conn.execute(
-                    f"UPDATE tasks SET {', '.join(fields)} WHERE id=?",
-                    (*values, task_id),
-                )
+    with transaction(conn):
+        conn.execute("UPDATE tasks SET status=? WHERE id=?", (status, task_id))
+        publish(conn, Change("task", UPDATED, (task_id,), frozenset({"status"})))
+
+
+class RowResult(NamedTuple):
+    """Outcome of one import record."""
+
+    row: int  # 1-based position in the input
+    action: str  # "inserted", "updated", "unchanged" or "error"
+    task_id: Optional[int]
+    error: Optional[str] = None
+
+
+class ImportReport:
+    """Counts for an import plus, unless disabled, one :class:`RowResult` per row.
+
+    Failed rows are always kept in :attr:`errors`.
+    """
+
+    def __init__(self, keep_results: bool = True):
+        self.keep_results = keep_results
+        self.results: list[RowResult] = []
+        self.errors: list[RowResult] = []
+        self.counts = {"inserted": 0, "updated": 0, "unchanged": 0, "error": 0}
+        self.assigned = 0
+
+    def add(self, result: RowResult) -> None:
+        self.counts[result.action] += 1
+        if result.action == "error":
+            self.errors.append(result)
+        if self.keep_results:
+            self.results.append(result)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _record_error(item) -> Optional[str]:
+    """Return why *item* cannot be imported, or ``None`` if it is valid."""
+    if isinstance(item, Exception):
+        return str(item)
+    if not isinstance(item, dict):
+        return "record is not an object"
+    task_id = item.get("id")
+    if task_id is not None and not (_is_int(task_id) and task_id > 0):
+        return "id must be a positive integer"
+    if task_id is None or "title" in item:
+        title = item.get("title")
+        if not isinstance(title, str) or not title.strip():
+            return "title is required"
+    if "priority" in item and not (_is_int(item["priority"]) and 1 <= item["priority"] <= 5):
+        return "priority must be an integer from 1 to 5"
+    if "status" in item and item["status"] not in TASK_STATUSES:
+        return f"unknown status {item['status']!r}"
+    estimate = item.get("estimate")
+    if estimate is not None and not (_is_int(estimate) and estimate >= 0):
+        return "estimate must be a non-negative integer"
+    if item.get("notes") is not None and not isinstance(item["notes"], str):
+        return "notes must be text"
+    if "project_id" in item and not _is_int(item["project_id"]):
+        return "project_id must be an integer"
+    if "week" in item and not (isinstance(item["week"], str) and _WEEK_RE.match(item["week"])):
+        return "week must look like 2024-W05"
+    return None
+
+
+class _ImportBatch:
+    """Records buffered between two flushes of :func:`import_tasks`."""
+
+    def __init__(self):
+        # (row, task_id, kind, columns, values, week); errors carry the message as values
+        self.rows: list[tuple] = []
+        self.inserts: list[tuple] = []
+        self.update_ids: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class _Touched:
+    """Task ids an import changed, published once it commits."""
+
+    def __init__(self):
+        self.created: list[int] = []
+        self.updated: list[int] = []
+        self.fields: set[str] = set()
+        self.planned: list[int] = []
+
+
+def _flush(
+    conn: sqlite3.Connection,
+    batch: _ImportBatch,
+    first_new: int,
+    report: ImportReport,
+    touched: _Touched,
+) -> None:
+    if batch.inserts:
+        conn.executemany(
+            """
+            INSERT INTO tasks(id, project_id, title, priority, estimate, notes, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            batch.inserts,
+        )
+    # Ids older than this import must be checked; ids it allocated exist.
+    old_ids = [task_id for task_id in batch.update_ids if task_id < first_new]
+    existing = set()
+    if old_ids:
+        existing = {
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM tasks WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(old_ids),),
+            )
+        }
+    groups: dict[tuple, list[tuple]] = {}
+    weeks = []
+    for row, task_id, kind, columns, values, week in batch.rows:
+        if kind == "error":
+            report.add(RowResult(row, "error", task_id, values))
+            continue
+        if kind == "update" and task_id not in existing and task_id < first_new:
+            report.add(RowResult(row, "error", task_id, f"no task with id {task_id}"))
+            continue
+        if kind == "update":
+            if columns:
+                groups.setdefault(columns, []).append((*values, task_id))
+                touched.updated.append(task_id)
+                touched.fields.update(columns)
+            report.add(RowResult(row, "updated" if columns else "unchanged", task_id))
         else:
-            cur = conn.execute(
-                """
-                INSERT INTO tasks(project_id, title, priority, estimate, notes, status)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    item.get("project_id", default_project),
-                    item["title"],
-                    item.get("priority", 3),
-                    item.get("estimate"),
-                    item.get("notes"),
-                    item.get("status", "TODO"),
-                ),
+            report.add(RowResult(row, "inserted", task_id))
+            touched.created.append(task_id)
+        if week is not None:
+            weeks.append((task_id, week))
+            touched.planned.append(task_id)
+    # One statement per distinct column set instead of one per row.
+    for columns, params in groups.items():
+        assignments = ", ".join(f"{col}=?" for col in columns)
+        conn.executemany(f"UPDATE tasks SET {assignments} WHERE id=?", params)
+    if weeks:
+        conn.executemany("INSERT INTO temp.import_weeks(task_id, iso_week) VALUES (?, ?)", weeks)
+
+
+def import_tasks(
+    conn: sqlite3.Connection,
+    records: Iterable[object],
+    batch_size: int = IMPORT_BATCH_SIZE,
+    keep_results: bool = True,
+    checkpoint: Optional[Callable[[], None]] = None,
+) -> ImportReport:
+    """Create or update tasks from a stream of JSON-friendly records.
+
+    Records without an ``id`` are inserted, records with one update the listed
+    columns of that task, and an optional ``week`` plans the task for that ISO
+    week.  *records* is consumed lazily and written in batches of *batch_size*,
+    so memory does not grow with the input (pass ``keep_results=False`` to
+    keep only failed rows).  Invalid records are reported and skipped; the
+    rest of the import is one transaction.  *checkpoint* is called after each
+    batch; raising from it (e.g. :meth:`DbExecutor.checkpoint
+    <services.db_executor.DbExecutor.checkpoint>` of a cancelled job) rolls
+    the whole import back.
+    """
+    report = ImportReport(keep_results)
+    touched = _Touched()
+    with transaction(conn):
+        default_project = get_or_create_default_project(conn)
+        # New ids are allocated here so the inserts can run as one executemany
+        # and still report per-row ids.  AUTOINCREMENT never reuses ids, so
+        # start past both the live maximum and the sequence.
+        first_new = next_id = 1 + conn.execute(
+            """
+            SELECT MAX(
+                COALESCE((SELECT MAX(id) FROM tasks), 0),
+                COALESCE((SELECT seq FROM sqlite_sequence WHERE name='tasks'), 0)
             )
-            task_id = cur.lastrowid
-            item["id"] = task_id
-        if "week" in item:
-            assign_to_week(conn, task_id, item["week"])
-    conn.commit()
+            """
+        ).fetchone()[0]
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS import_weeks(task_id INTEGER NOT NULL, iso_week TEXT NOT NULL)"
+        )
+
+        batch = _ImportBatch()
+        for row, item in enumerate(records, 1):
+            # Every record, bad ones included, counts towards the batch, so a
+            # long run of errors still flushes and reaches the checkpoint.
+            error = _record_error(item)
+            task_id = item.get("id") if isinstance(item, dict) else None
+            if error is not None:
+                batch.rows.append((row, task_id if _is_int(task_id) else None, "error", (), error, None))
+            elif task_id is None:
+                task_id = next_id
+                next_id += 1
+                batch.inserts.append(
+                    (
+                        task_id,
+                        item.get("project_id", default_project),
+                        item["title"],
+                        item.get("priority", 3),
+                        item.get("estimate"),
+                        item.get("notes"),
+                        item.get("status", "TODO"),
+                    )
+                )
+                batch.rows.append((row, task_id, "insert", (), (), item.get("week")))
+            elif task_id >= next_id:
+                batch.rows.append((row, task_id, "error", (), f"no task with id {task_id}", None))
+            else:
+                if task_id in batch.update_ids:
+                    # Updates are regrouped by column set, so keep repeated
+                    # edits of one task in separate batches to preserve order.
+                    _flush(conn, batch, first_new, report, touched)
+                    batch = _ImportBatch()
+                columns = tuple(col for col in TASK_COLUMNS if col in item)
+                batch.update_ids.add(task_id)
+                values = tuple(item[c] for c in columns)
+                batch.rows.append((row, task_id, "update", columns, values, item.get("week")))
+            if len(batch) >= batch_size:
+                _flush(conn, batch, first_new, report, touched)
+                batch = _ImportBatch()
+                if checkpoint is not None:
+                    checkpoint()
+        _flush(conn, batch, first_new, report, touched)
+
+        # Week planning for the whole import is a single set-based statement.
+        cur = conn.execute(
+            """
+            INSERT OR IGNORE INTO weekly_assignments(task_id, iso_week, planned, rolled_over)
+            SELECT task_id, iso_week, 1, 0 FROM temp.import_weeks
+            """
+        )
+        report.assigned = cur.rowcount
+        conn.execute("DELETE FROM temp.import_weeks")
+        publish(conn, Change("task", CREATED, tuple(touched.created)))
+        publish(conn, Change("task", UPDATED, tuple(touched.updated), frozenset(touched.fields)))
+        publish(conn, Change("assignment", CREATED, tuple(touched.planned)))
+    return report
+
+
+def bulk_update(conn: sqlite3.Connection, tasks: Iterable[object]) -> ImportReport:
+    """Create or update tasks in bulk based on a JSON-friendly structure.
+
+    Thin wrapper over :func:`import_tasks`, kept for existing callers.
+    """
+    return import_tasks(conn, tasks)
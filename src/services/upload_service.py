@@ -0,0 +1,359 @@
+"""Persistent, resumable off-site upload queue.
+
+Jobs live in a small JSON state file next to the backups, so an upload that
+was interrupted (network error, app exit, crash) resumes from the last
+acknowledged byte on the next run.  A daemon worker thread drains the queue,
+which means the GUI thread and app exit never wait on the network.
+
+Backends follow the shape of the Google Drive resumable-upload protocol:
+open an upload session, send chunks at explicit offsets, and ask the server
+how much it has when resuming.
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path, PurePosixPath
+from typing import Callable, Optional, Union
+from urllib.parse import urlencode
+
+from .security_service import atomic_output
+
+DEFAULT_CHUNK_SIZE = 8 * 256 * 1024  # Drive requires multiples of 256 KiB
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 15 * 60.0
+
+
+class UploadBackend(ABC):
+    """Interface implemented by upload targets.
+
+    *name* is the file's path relative to the backup root (e.g.
+    ``chunks/ab/<hash>``); uploading the same name again replaces the file.
+    """
+
+    @abstractmethod
+    def start(self, name: str, size: int) -> str:
+        """Open an upload session for *name* and return its id."""
+
+    @abstractmethod
+    def query_offset(self, session: str, size: int) -> int:
+        """Return how many bytes of *session* the target already holds."""
+
+    @abstractmethod
+    def put(self, session: str, offset: int, data: bytes, size: int) -> int:
+        """Send *data* at *offset*; return how many bytes the target now holds.
+
+        That may be less than ``offset + len(data)`` when only part of the
+        chunk was stored; *size* means the upload is complete.
+        """
+
+
+class LocalDirectoryBackend(UploadBackend):
+    """Upload into a local directory (tests, offline machines, NAS mounts)."""
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.partial = self.root / ".partial"
+
+    def start(self, name: str, size: int) -> str:
+        self.partial.mkdir(parents=True, exist_ok=True)
+        session = uuid.uuid4().hex
+        (self.partial / session).write_bytes(b"")
+        (self.partial / f"{session}.name").write_text(name, encoding="utf-8")
+        return session
+
+    def query_offset(self, session: str, size: int) -> int:
+        part = self.partial / session
+        if not part.exists():
+            raise KeyError(f"unknown upload session {session}")
+        return part.stat().st_size
+
+    def put(self, session: str, offset: int, data: bytes, size: int) -> int:
+        part = self.partial / session
+        with open(part, "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate(offset + len(data))
+        if offset + len(data) < size:
+            return offset + len(data)
+        name_file = self.partial / f"{session}.name"
+        dest = self.root / name_file.read_text(encoding="utf-8")
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(part, dest)
+        name_file.unlink()
+        return size
+
+
+class DriveBackend(UploadBackend):
+    """Google Drive resumable uploads into one folder.
+
+    Drive folders are flat here: each file is named after the last part of
+    its path and carries the full relative path in its ``appProperties``.
+    That property finds an earlier upload of the same path, which is then
+    updated in place instead of gaining a duplicate.
+
+    The Google client libraries are imported on first use, so machines that
+    never upload to Drive do not pay for them.
+    """
+
+    FILES_URL = "https://www.googleapis.com/drive/v3/files"
+    UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable"
+    UPDATE_URL = "https://www.googleapis.com/upload/drive/v3/files/{}?uploadType=resumable"
+
+    def __init__(self, token_path: Union[str, Path], folder_id: str):
+        self.token_path = Path(token_path)
+        self.folder_id = folder_id
+        self._http = None
+
+    def _client(self):
+        if self._http is None:
+            from google.oauth2.credentials import Credentials
+            from google_auth_httplib2 import AuthorizedHttp
+
+            creds = Credentials.from_authorized_user_file(str(self.token_path))
+            self._http = AuthorizedHttp(creds)
+        return self._http
+
+    def _request(self, uri: str, method: str, body=None, headers=None):
+        resp, content = self._client().request(uri, method, body=body, headers=headers or {})
+        if resp.status >= 400 and resp.status != 404:
+            raise ConnectionError(f"Drive upload failed: HTTP {resp.status} {content[:200]!r}")
+        return resp, content
+
+    def _find(self, name: str) -> Optional[str]:
+        """Return the id of the file uploaded earlier as *name*, if any."""
+        value = name.replace("\\", "\\\\").replace("'", "\\'")
+        query = (
+            f"'{self.folder_id}' in parents and trashed = false"
+            f" and appProperties has {{ key='path' and value='{value}' }}"
+        )
+        _, content = self._request(
+            f"{self.FILES_URL}?{urlencode({'q': query, 'fields': 'files(id)'})}", "GET"
+        )
+        files = json.loads(content).get("files", [])
+        return files[0]["id"] if files else None
+
+    def start(self, name: str, size: int) -> str:
+        meta = {"name": PurePosixPath(name).name, "appProperties": {"path": name}}
+        file_id = self._find(name)
+        if file_id is None:
+            meta["parents"] = [self.folder_id]
+            url, method = self.UPLOAD_URL, "POST"
+        else:
+            url, method = self.UPDATE_URL.format(file_id), "PATCH"
+        resp, _ = self._request(
+            url,
+            method,
+            body=json.dumps(meta),
+            headers={
+                "Content-Type": "application/json; charset=UTF-8",
+                "X-Upload-Content-Type": "application/octet-stream",
+                "X-Upload-Content-Length": str(size),
+            },
+        )
+        return resp["location"]
+
+    def query_offset(self, session: str, size: int) -> int:
+        resp, _ = self._request(session, "PUT", headers={"Content-Range": f"bytes */{size}"})
+        if resp.status == 404:
+            raise KeyError("Drive upload session expired")
+        return self._received(resp, size)
+
+    @staticmethod
+    def _received(resp, size: int) -> int:
+        """Bytes held by the session, from a 200/201 or a 308 and its ``Range``."""
+        if resp.status in (200, 201):
+            return size
+        received = resp.get("range")  # e.g. "bytes=0-524287"
+        return int(received.rsplit("-", 1)[1]) + 1 if received else 0
+
+    def put(self, session: str, offset: int, data: bytes, size: int) -> int:
+        end = offset + len(data) - 1
+        resp, _ = self._request(
+            session,
+            "PUT",
+            body=data,
+            headers={"Content-Range": f"bytes {offset}-{end}/{size}"},
+        )
+        if resp.status == 404:
+            raise KeyError("Drive upload session expired")
+        # A 308 may acknowledge only part of the chunk.
+        return self._received(resp, size)
+
+
+class UploadQueue:
+    """Persistent queue of files to upload through an :class:`UploadBackend`."""
+
+    def __init__(
+        self,
+        state_path: Union[str, Path],
+        backend: UploadBackend,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.state_path = Path(state_path)
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.jobs: list[dict] = []
+        if self.state_path.exists():
+            self.jobs = json.loads(self.state_path.read_text(encoding="utf-8"))
+
+    def _save(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(self.state_path) as f:
+            f.write(json.dumps(self.jobs, indent=1).encode("utf-8"))
+
+    def enqueue(self, path: Union[str, Path], name: Optional[str] = None) -> None:
+        """Queue *path* for upload as *name* (default: its file name).
+
+        A job for the same name that has not started yet already sends the
+        current file, so it is kept; a started one is restarted, because the
+        file may have changed under its session.
+        """
+        path = Path(path)
+        name = name or path.name
+        with self._lock:
+            queued = next((job for job in self.jobs if job["name"] == name), None)
+            if queued is not None and queued["session"] is None:
+                return
+            if queued is not None:
+                self.jobs.remove(queued)
+            self.jobs.append(
+                {
+                    "path": str(path.resolve()),
+                    "name": name,
+                    "session": None,
+                    "offset": 0,
+                    "attempts": 0,
+                    "next_attempt": 0.0,
+                    "error": None,
+                }
+            )
+            self._save()
+        self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self.jobs)
+
+    def _next_due(self) -> Optional[dict]:
+        now = self.clock()
+        with self._lock:
+            for job in self.jobs:
+                if job["next_attempt"] <= now:
+                    return job
+        return None
+
+    def _finish(self, job: dict) -> None:
+        with self._lock:
+            # enqueue() may have replaced the job meanwhile.
+            self.jobs = [queued for queued in self.jobs if queued is not job]
+            self._save()
+
+    def _upload(self, job: dict) -> None:
+        path = Path(job["path"])
+        size = path.stat().st_size
+        # Network calls run unlocked; job fields change under the lock that
+        # enqueue() and _save() read them with.
+        session = job["session"]
+        if session is None:
+            session, offset = self.backend.start(job["name"], size), 0
+        else:
+            offset = self.backend.query_offset(session, size)
+            if offset >= size:
+                return
+        with self._lock:
+            job["session"], job["offset"] = session, offset
+            self._save()
+        with open(path, "rb") as f:
+            while True:
+                f.seek(offset)
+                data = f.read(self.chunk_size)
+                received = self.backend.put(session, offset, data, size)
+                if received >= size:
+                    return
+                if received <= offset:
+                    raise ConnectionError(f"upload made no progress at byte {offset}")
+                # Resume from what the target confirmed, not from what was sent.
+                offset = received
+                with self._lock:
+                    job["offset"] = offset
+                    self._save()
+                if self._stop.is_set():
+                    raise InterruptedError("upload queue stopped")
+
+    def run_pending(self) -> int:
+        """Upload every job that is due; return how many completed."""
+        done = 0
+        attempted = set()
+        while True:
+            job = self._next_due()
+            if job is None or id(job) in attempted or self._stop.is_set():
+                return done
+            attempted.add(id(job))
+            try:
+                self._upload(job)
+            except FileNotFoundError:
+                # The source was pruned before it could be sent.
+                self._finish(job)
+            except KeyError:
+                # The remote session expired: start over on the next attempt.
+                self._retry_later(job, "upload session expired", reset=True)
+            except Exception as exc:
+                self._retry_later(job, str(exc))
+            else:
+                self._finish(job)
+                done += 1
+
+    def _retry_later(self, job: dict, error: str, reset: bool = False) -> None:
+        with self._lock:
+            job["attempts"] += 1
+            delay = min(BACKOFF_MAX, BACKOFF_BASE ** job["attempts"])
+            job["next_attempt"] = self.clock() + delay * random.uniform(0.5, 1.0)
+            job["error"] = error
+            if reset:
+                job["session"] = None
+                job["offset"] = 0
+            self._save()
+
+    # --- background worker ---
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        # Daemon thread: process exit never waits for an upload to finish.
+        self._thread = threading.Thread(target=self._run, name="upload-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Ask the worker to stop after the current chunk; does not wait."""
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.run_pending()
+            with self._lock:
+                due = [job["next_attempt"] for job in self.jobs]
+            timeout = max(0.0, min(due) - self.clock()) if due else None
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+
+def make_backend(config: dict) -> Optional[UploadBackend]:
+    """Build the backend selected by the ``upload_backend`` config key."""
+    kind = config.get("upload_backend", "none")
+    if kind == "local":
+        return LocalDirectoryBackend(config["upload_local_dir"])
+    if kind == "drive":
+        return DriveBackend(config["google_token_path"], config["drive_folder_id"])
+    return None
@@ -1,38 +1,62 @@
 """ISO week helpers and rollover logic."""
 from __future__ import annotations
 
+from collections import Counter
 from datetime import date, timedelta
 import sqlite3
+from typing import NamedTuple
 
+from .change_bus import CREATED, Change, publish
+from .db import transaction
 from .settings_service import get_setting, set_setting
 
 
+class RolloverReport(NamedTuple):
+    """Result of :func:`rollover_tasks`."""
+
+    week: str
+    counts: dict[str, int]  # source week -> tasks carried from it
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
 def iso_week(d: date) -> str:
     year, week, _ = d.isocalendar()
     return f"{year}-W{week:02d}"
 
 
-def rollover_tasks(conn: sqlite3.Connection, today: date | None = None) -> int:
+def rollover_tasks(conn: sqlite3.Connection, today: date | None = None) -> RolloverReport:
+    """Carry open tasks into the current week, catching up on missed weeks.
+
+    Every open task planned in a week since ``last_seen_iso_week`` (or, on the
+    first run, in the previous week) and not yet in the current one is planned
+    for the current week, remembering the latest week it came from.  Week keys
+    sort chronologically as text, so this is one ``INSERT ... SELECT`` over an
+    index range, however many weeks were skipped.
+    """
     today = today or date.today()
     curr = iso_week(today)
-    prev = iso_week(today - timedelta(days=7))
     last_seen = get_setting(conn, "last_seen_iso_week")
-    if last_seen == curr:
-        return 0
-
-    rows = conn.execute(
-        """
-        SELECT t.id FROM tasks t
-        JOIN weekly_assignments w ON w.task_id = t.id
-        WHERE w.iso_week = ? AND t.status NOT IN ('DONE','CANCELED')
-        """,
-        (prev,),
-    ).fetchall()
-    for row in rows:
-        conn.execute(
-            "INSERT OR IGNORE INTO weekly_assignments(task_id, iso_week, planned, rolled_over) VALUES (?, ?, 1, 1)",
-            (row["id"], curr),
-        )
-    set_setting(conn, "last_seen_iso_week", curr)
-    conn.commit()
-    return len(rows)
+    if last_seen is not None and last_seen >= curr:
+        return RolloverReport(curr, {})
+    first = last_seen or iso_week(today - timedelta(days=7))
+
+    with transaction(conn):
+        rolled = conn.execute(
+            """
+            INSERT OR IGNORE INTO weekly_assignments(task_id, iso_week, planned, rolled_over, rolled_from)
+            SELECT w.task_id, :curr, 1, 1, MAX(w.iso_week)
+            FROM weekly_assignments w
+            JOIN tasks t ON t.id = w.task_id
+            WHERE w.iso_week >= :first AND w.iso_week < :curr
+              AND t.status NOT IN ('DONE','CANCELED')
+            GROUP BY w.task_id
+            RETURNING task_id, rolled_from
+            """,
+            {"curr": curr, "first": first},
+        ).fetchall()
+        publish(conn, Change("assignment", CREATED, tuple(row[0] for row in rolled)))
+        set_setting(conn, "last_seen_iso_week", curr)
+    return RolloverReport(curr, dict(Counter(row["rolled_from"] for row in rolled)))
@@ -1,12 +1,220 @@
-"""Placeholder Calendar view."""
+"""Habit calendar: a scrollable heatmap, one band per month."""
 from __future__ import annotations
 
-from PySide6.QtWidgets import QVBoxLayout, QWidget, QLabel
+import calendar
+import logging
+from datetime import date
+from functools import partial
+from typing import Optional
+
+from PySide6.QtCore import QRect, Qt, QTimer
+from PySide6.QtGui import QColor, QPainter
+from PySide6.QtWidgets import QAbstractScrollArea, QLabel, QVBoxLayout, QWidget
+
+from services.calendar_service import Month, MonthCache, month_cache_for, shift_month
+from services.change_bus import Change
+from services.db_executor import NORMAL, REPORT
+from services.rollup_service import HabitProgress, today_progress
+from theming.palette import BG_COLOR, GRAY, GREEN, TEXT_COLOR
+
+from .db_runner import DbRunner
+
+log = logging.getLogger(__name__)
+
+CELL = 14
+LABEL_WIDTH = 150
+HEADER_HEIGHT = 22
+BAND_GAP = 8
+PREFETCH_MONTHS = 3  # beyond each edge of the viewport
+MIN_MONTHS = 12
+EMPTY_CELL = QColor("#2A2A2A")
+PERIOD_DAYS = {"daily": 1, "weekly": 7, "monthly": 30}
+
+
+def _blend(ratio: float) -> QColor:
+    low, high = QColor(BG_COLOR), QColor(GREEN)
+    ratio = 0.25 + 0.75 * min(1.0, ratio)
+    return QColor(
+        round(low.red() + (high.red() - low.red()) * ratio),
+        round(low.green() + (high.green() - low.green()) * ratio),
+        round(low.blue() + (high.blue() - low.blue()) * ratio),
+    )
+
+
+def _layout(conn) -> tuple[list[HabitProgress], Optional[str]]:
+    """Habits to draw and the oldest logged date."""
+    habits = list(today_progress(conn))
+    return habits, conn.execute("SELECT MIN(date) FROM habit_logs").fetchone()[0]
+
+
+def _load_months(conn, cache: MonthCache, months: list[Month]) -> None:
+    # *conn* may be a pooled reader; the cache keeps what it reads.
+    for month in months:
+        if cache.cached(month) is None:
+            cache.load(month, conn)
+
+
+class HeatmapView(QAbstractScrollArea):
+    """Months newest first; only bands inside the viewport are painted.
+
+    Visible months come from the :class:`MonthCache` (loaded on demand if
+    missing); the months just outside the viewport are prefetched through the
+    runner after each paint so scrolling finds them ready.  With a database executor, missing
+    months are drawn empty and repainted once the worker has loaded them.
+    """
+
+    def __init__(self, conn, parent=None, runner: Optional[DbRunner] = None):
+        super().__init__(parent)
+        self.conn = conn
+        self.runner = runner or DbRunner(conn, parent=self)
+        self.cache = month_cache_for(conn)
+        self._loading: set[Month] = set()
+        self.habits: list[HabitProgress] = []
+        self.months: list[Month] = []
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.timeout.connect(self._prefetch)
+        self._visible = (0, -1)
+        self.verticalScrollBar().setSingleStep(CELL)
+        self.reload()
+        self.runner.subscribe(self._habits_changed, ("habit", "habit_log"))
+
+    def _habits_changed(self, change: Change) -> None:
+        if change.entity == "habit":
+            self.reload()
+            return
+        # The write dropped its months from the cache before it committed;
+        # drop them again so a read that raced the commit is not kept.
+        months = {(day.year, day.month) for day in change.days}
+        self.cache.invalidate(months)
+        first, last = self._visible
+        if months.intersection(self.months[first : last + 1]):
+            self.viewport().update()
+
+    def reload(self) -> None:
+        """Re-read the habit list and month range, keeping the scroll position."""
+        self.runner.run(_layout, done=self._show_layout)
+
+    def _show_layout(self, layout: tuple[list[HabitProgress], Optional[str]]) -> None:
+        self.habits, oldest = layout
+        today = date.today()
+        last = (today.year, today.month)
+        first = shift_month(last, -(MIN_MONTHS - 1))
+        if oldest:
+            oldest = str(oldest)
+            first = min(first, (int(oldest[:4]), int(oldest[5:7])))
+        count = (last[0] - first[0]) * 12 + last[1] - first[1] + 1
+        self.months = [shift_month(last, -i) for i in range(count)]
+        self._update_scrollbar()
+        self.viewport().update()
+
+    def band_height(self) -> int:
+        return HEADER_HEIGHT + max(1, len(self.habits)) * CELL + BAND_GAP
+
+    def _update_scrollbar(self) -> None:
+        total = self.band_height() * len(self.months)
+        bar = self.verticalScrollBar()
+        bar.setPageStep(self.viewport().height())
+        bar.setRange(0, max(0, total - self.viewport().height()))
+
+    def visible_months(self) -> tuple[int, int]:
+        """Return the first and last month index intersecting the viewport."""
+        top = self.verticalScrollBar().value()
+        band = self.band_height()
+        first = top // band
+        last = min(len(self.months) - 1, (top + self.viewport().height()) // band)
+        return first, last
+
+    # Qt overrides
+    def resizeEvent(self, event):  # noqa: N802
+        super().resizeEvent(event)
+        self._update_scrollbar()
+
+    def scrollContentsBy(self, dx, dy):  # noqa: N802
+        self.viewport().update()
+
+    def paintEvent(self, event):  # noqa: N802
+        painter = QPainter(self.viewport())
+        painter.fillRect(event.rect(), QColor(BG_COLOR))
+        first, last = self.visible_months()
+        band = self.band_height()
+        offset = self.verticalScrollBar().value()
+        for index in range(first, last + 1):
+            self._paint_month(painter, index * band - offset, self.months[index])
+        painter.end()
+        self._visible = (first, last)
+        self._prefetch_timer.start(0)
+
+    def _paint_month(self, painter: QPainter, top: int, month: Month) -> None:
+        year, mon = month
+        days = calendar.monthrange(year, mon)[1]
+        block = self.cache.cached(month)
+        if block is None:
+            if self.runner.executor is None:
+                block = self.cache.get(month)
+            else:
+                self._load([month], NORMAL)
+                block = {}
+        painter.setPen(QColor(TEXT_COLOR))
+        painter.drawText(
+            QRect(4, top, LABEL_WIDTH, HEADER_HEIGHT), Qt.AlignVCenter, f"{year}-{mon:02d}"
+        )
+        for row, habit in enumerate(self.habits):
+            y = top + HEADER_HEIGHT + row * CELL
+            painter.setPen(QColor(GRAY))
+            painter.drawText(QRect(4, y, LABEL_WIDTH - 8, CELL), Qt.AlignVCenter, habit.name)
+            values = block.get(habit.id)
+            target = 1 if habit.type == "binary" else max(1, habit.goal // PERIOD_DAYS[habit.goal_type])
+            for day in range(days):
+                value = values[day] if values else 0
+                color = _blend(value / target) if value > 0 else EMPTY_CELL
+                painter.fillRect(LABEL_WIDTH + day * CELL, y + 1, CELL - 2, CELL - 2, color)
+
+    def _prefetch(self) -> None:
+        first, last = self._visible
+        if last < first:
+            return
+        lo = max(0, first - PREFETCH_MONTHS)
+        hi = min(len(self.months) - 1, last + PREFETCH_MONTHS)
+        months = [self.months[i] for i in range(lo, hi + 1) if not first <= i <= last]
+        self._load([m for m in months if self.cache.cached(m) is None], REPORT)
+
+    def _load(self, months: list[Month], priority: int) -> None:
+        """Load *months* on the database worker, then repaint."""
+        months = [m for m in months if m not in self._loading]
+        if months:
+            self._loading.update(months)
+            self.runner.run(
+                _load_months,
+                self.cache,
+                months,
+                done=partial(self._loaded, months),
+                failed=partial(self._load_failed, months),
+                priority=priority,
+                read_only=True,
+            )
+
+    def _loaded(self, months: list[Month], _result=None) -> None:
+        self._loading.difference_update(months)
+        self.viewport().update()
+
+    def _load_failed(self, months: list[Month], exc: BaseException) -> None:
+        log.error("heatmap months failed to load", exc_info=exc)
+        # Requested again by the next paint that needs them.
+        self._loading.difference_update(months)
 
 
 class CalendarView(QWidget):
-    def __init__(self, conn):
+    def __init__(self, conn, runner: Optional[DbRunner] = None):
         super().__init__()
         layout = QVBoxLayout()
         layout.addWidget(QLabel("Kalendarz nawyków"))
+        self.heatmap = HeatmapView(conn, runner=runner)
+        layout.addWidget(self.heatmap)
         self.setLayout(layout)
+
+    # Qt override
+    def showEvent(self, event):  # noqa: N802
+        # Catch up with the date (a new month) after the tab was hidden.
+        self.heatmap.reload()
+        super().showEvent(event)
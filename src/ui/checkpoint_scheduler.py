@@ -0,0 +1,96 @@
+"""Qt timers driving background checkpoints and auto-lock."""
+from __future__ import annotations
+
+import time
+from typing import Callable, Optional
+
+from PySide6.QtCore import QCoreApplication, QEvent, QObject, QTimer, Signal
+
+from services.checkpoint_service import Checkpointer
+
+_ACTIVITY_EVENTS = {
+    QEvent.KeyPress,
+    QEvent.MouseButtonPress,
+    QEvent.MouseMove,
+    QEvent.Wheel,
+}
+
+
+class CheckpointScheduler(QObject):
+    """Checkpoint periodically and after the user goes idle; lock on timeout.
+
+    Checkpoints run through :meth:`Checkpointer.checkpoint_async`, so the event
+    loop only pays for the in-memory snapshot.  When no input arrives for
+    *lock_ms* a final synchronous checkpoint is taken and :attr:`locked` fires.
+    When a database executor owns the connection, *run* hands each checkpoint
+    call to it (the snapshot must be taken on the connection's thread), the
+    final one included.
+    """
+
+    locked = Signal()
+
+    def __init__(
+        self,
+        checkpointer: Checkpointer,
+        interval_ms: int,
+        idle_ms: int,
+        lock_ms: int = 0,
+        parent=None,
+        run: Optional[Callable[[Callable[[], object]], object]] = None,
+    ):
+        super().__init__(parent)
+        self.checkpointer = checkpointer
+        self._run = run or (lambda fn: fn())
+        self._last_activity = 0.0
+
+        self._interval = QTimer(self)
+        self._interval.setInterval(interval_ms)
+        self._interval.timeout.connect(self._checkpoint_async)
+
+        self._idle = QTimer(self)
+        self._idle.setSingleShot(True)
+        self._idle.setInterval(idle_ms)
+        self._idle.timeout.connect(self._checkpoint_async)
+
+        self._lock = QTimer(self)
+        self._lock.setSingleShot(True)
+        self._lock.setInterval(lock_ms)
+        self._lock.timeout.connect(self.lock)
+        self._lock_enabled = lock_ms > 0
+
+        self._interval.start()
+        QCoreApplication.instance().installEventFilter(self)
+        self._activity()
+
+    # Qt override
+    def eventFilter(self, obj, event):  # noqa: N802
+        if event.type() in _ACTIVITY_EVENTS:
+            self._activity()
+        return False
+
+    def _checkpoint_async(self) -> None:
+        self._run(self.checkpointer.checkpoint_async)
+
+    def _activity(self) -> None:
+        # Restarting timers on every mouse move is wasteful; once a second is
+        # plenty for minute-scale timeouts.
+        now = time.monotonic()
+        if now - self._last_activity < 1.0:
+            return
+        self._last_activity = now
+        self._idle.start()
+        if self._lock_enabled:
+            self._lock.start()
+
+    def lock(self) -> None:
+        """Take a final checkpoint and signal that the session should lock."""
+        self.stop()
+        self._run(self.checkpointer.checkpoint)
+        self.locked.emit()
+
+    def stop(self) -> None:
+        for timer in (self._interval, self._idle, self._lock):
+            timer.stop()
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.removeEventFilter(self)
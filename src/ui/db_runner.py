@@ -0,0 +1,146 @@
+"""Bridge between views and the database executor."""
+from __future__ import annotations
+
+import inspect
+import logging
+import queue
+import socket
+import weakref
+from concurrent.futures import CancelledError, Future
+from functools import partial
+from typing import Callable, Iterable, Optional
+
+from PySide6.QtCore import QObject, QSocketNotifier
+
+from services import change_bus
+from services.db_executor import NORMAL, DbExecutor
+
+log = logging.getLogger(__name__)
+
+
+class DbRunner(QObject):
+    """Run service calls for views and hand results back on the GUI thread.
+
+    With an executor, :meth:`run` queues ``fn(conn, ...)`` on its worker and
+    *done* / *failed* are called later from the event loop.  Without one
+    (tests, tools) the call runs inline and the callbacks fire before
+    :meth:`run` returns, so views keep a single callback-style code path.
+
+    The worker never calls into Qt: it queues the callback and writes a byte
+    to a socket pair whose notifier wakes the GUI thread to run it.  The
+    returned future does not hold *done* / *failed*: views keep futures, and
+    a view -> future -> callback -> view cycle would leave the view to the
+    cyclic collector, which may run (and delete Qt objects) on the worker.
+    """
+
+    def __init__(self, conn, executor: Optional[DbExecutor] = None, parent=None):
+        super().__init__(parent)
+        self.conn = conn
+        self.executor = executor
+        if executor is not None:
+            self._calls: queue.SimpleQueue = queue.SimpleQueue()
+            self._callbacks: dict[Future, tuple[Optional[Callable], Optional[Callable]]] = {}
+            self._wake_read, self._wake_write = socket.socketpair()
+            self._wake_read.setblocking(False)
+            self._wake_write.setblocking(False)
+            self._notifier = QSocketNotifier(self._wake_read.fileno(), QSocketNotifier.Read, self)
+            self._notifier.activated.connect(self._drain)
+
+    @property
+    def checkpoint(self) -> Optional[Callable[[], None]]:
+        """Cancellation hook for long services, or None when running inline."""
+        return self.executor.checkpoint if self.executor is not None else None
+
+    def run(
+        self,
+        fn: Callable,
+        *args,
+        done: Optional[Callable] = None,
+        failed: Optional[Callable[[BaseException], None]] = None,
+        priority: int = NORMAL,
+        read_only: bool = False,
+        **kwargs,
+    ) -> Optional[Future]:
+        """Call ``fn(conn, *args, **kwargs)``; return its future when queued.
+
+        Errors go to *failed*; without it they are logged (or raised, inline).
+        Cancelled jobs call neither callback.  *read_only* lets a query of
+        committed data run on a pooled reader beside the writer.
+        """
+        if self.executor is None:
+            try:
+                result = fn(self.conn, *args, **kwargs)
+            except Exception as exc:
+                if failed is None:
+                    raise
+                failed(exc)
+                return None
+            if done is not None:
+                done(result)
+            return None
+        future = self.executor.submit(fn, *args, priority=priority, read_only=read_only, **kwargs)
+        # Only touched on the GUI thread: set here, popped by _finish.
+        self._callbacks[future] = (done, failed)
+        future.add_done_callback(lambda f: self._post(partial(self._finish, f)))
+        return future
+
+    def subscribe(self, callback: change_bus.Callback, entities: Optional[Iterable[str]] = None):
+        """Like :func:`services.change_bus.subscribe`, but always called on the GUI thread."""
+        if self.executor is None:
+            return change_bus.subscribe(self.conn, callback, entities)
+        # Held weakly like the bus does, so the view can still be collected.
+        ref = weakref.WeakMethod(callback) if inspect.ismethod(callback) else (lambda: callback)
+
+        def forward(change: change_bus.Change) -> None:
+            if ref() is None:
+                unsubscribe()
+            else:
+                self._post(partial(_notify, ref, change))
+
+        unsubscribe = change_bus.subscribe(self.conn, forward, entities)
+        return unsubscribe
+
+    def _post(self, fn: Callable[[], None]) -> None:
+        """Run *fn* on the GUI thread; safe to call from any thread."""
+        self._calls.put(fn)
+        try:
+            self._wake_write.send(b"\0")
+        except BlockingIOError:
+            pass  # the buffer is full of wake-ups already
+
+    def _drain(self, *_) -> None:
+        try:
+            while self._wake_read.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                fn = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn()
+            except Exception:
+                log.exception("database callback failed")
+
+    def _finish(self, future: Future) -> None:
+        done, failed = self._callbacks.pop(future)
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if isinstance(exc, CancelledError):
+            return  # stopped at a checkpoint after cancel()
+        if exc is None:
+            if done is not None:
+                done(future.result())
+        elif failed is not None:
+            failed(exc)
+        else:
+            log.error("database job failed", exc_info=exc)
+
+
+def _notify(ref, change: change_bus.Change) -> None:
+    callback = ref()
+    if callback is not None:
+        callback(change)
@@ -1,27 +1,94 @@
-"""Simple Reports view showing weekly task stats."""
+"""Reports view: weekly task flow metrics."""
 from __future__ import annotations
 
-from datetime import date
-from PySide6.QtWidgets import QVBoxLayout, QWidget, QLabel
+from concurrent.futures import Future
+from datetime import date, timedelta
+from typing import Optional
 
-from services.tasks_service import get_tasks_for_week
+import numpy as np
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QLabel, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget
+
+from services.analytics_service import WeeklyReport, weekly_report
+from services.change_bus import Change
+from services.db_executor import REPORT
 from services.week_service import iso_week
 
+from .db_runner import DbRunner
+
+REPORT_WEEKS = 12
+COLUMNS = ("Tydzień", "Plan", "Ukończone", "Przepustowość", "Przeniesione", "Cykl (dni)", "Realizacja (dni)")
+
+
+def _days(value: float) -> str:
+    return "–" if np.isnan(value) else f"{value:.1f}"
+
 
 class ReportsView(QWidget):
-    """Display basic statistics about tasks for the current week."""
+    """Current-week summary plus flow metrics for the last weeks."""
 
-    def __init__(self, conn):
+    def __init__(self, conn, runner: Optional[DbRunner] = None):
         super().__init__()
 
         self.conn = conn
+        self.runner = runner or DbRunner(conn, parent=self)
         layout = QVBoxLayout()
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+        self.burndown = QLabel()
+        layout.addWidget(self.burndown)
+        self.table = QTableWidget(REPORT_WEEKS, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
 
-        curr_week = iso_week(date.today())
-        rows = get_tasks_for_week(conn, curr_week)
-        total = len(rows)
-        done = sum(1 for r in rows if r["status"] == "DONE")
-        text = f"Zadania: {done}/{total} ukończone w tym tygodniu"
-        layout.addWidget(QLabel(text))
+        # A burst of writes (an import, a drag) recomputes once.
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.timeout.connect(self.refresh)
+        self._job: Optional[Future] = None
+        self.runner.subscribe(self._tasks_changed, ("task", "assignment"))
+        self.refresh()
 
-        self.setLayout(layout)
+    def _tasks_changed(self, change: Change) -> None:
+        self._refresh_timer.start(0)
+
+    def refresh(self) -> None:
+        """Recompute the report; queued behind interactive work when off-thread."""
+        job = self._job
+        if job is not None and not job.running() and not job.done():
+            return  # still queued, so it will see the latest writes anyway
+        today = date.today()
+        self._job = self.runner.run(
+            weekly_report,
+            iso_week(today - timedelta(weeks=REPORT_WEEKS - 1)),
+            iso_week(today),
+            done=self._show,
+            priority=REPORT,
+            read_only=True,
+        )
+
+    def _show(self, report: WeeklyReport) -> None:
+        """Rewrite only the cells whose text changed."""
+        today = date.today()
+        self.summary.setText(f"Zadania: {report.done[-1]}/{report.planned[-1]} ukończone w tym tygodniu")
+        burndown = " → ".join(str(n) for n in report.burndown[-1][: today.weekday() + 1])
+        self.burndown.setText(f"Burndown: {report.planned[-1]} → {burndown}")
+        for row, i in enumerate(reversed(range(len(report.weeks)))):
+            carry = report.carry_over[i]
+            cells = (
+                report.weeks[i],
+                str(report.planned[i]),
+                str(report.done[i]),
+                str(report.throughput[i]),
+                "–" if np.isnan(carry) else f"{carry:.0%}",
+                _days(report.cycle_time[i]),
+                _days(report.lead_time[i]),
+            )
+            for col, value in enumerate(cells):
+                item = self.table.item(row, col)
+                if item is None:
+                    self.table.setItem(row, col, QTableWidgetItem(value))
+                elif item.text() != value:
+                    item.setText(value)
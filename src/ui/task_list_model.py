@@ -0,0 +1,199 @@
+"""Paged list model of tasks for the backlog and the Kanban columns."""
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+from functools import partial
+from typing import Callable, Iterable, Optional
+
+from PySide6.QtCore import QAbstractListModel, QMimeData, QModelIndex, Qt
+
+from services.tasks_service import TaskRecord
+
+log = logging.getLogger(__name__)
+
+TASK_MIME_TYPE = "application/x-habits-tasks"
+PAGE_SIZE = 200
+
+# (after_id, limit, done=callback, failed=callback): passes the next records
+# ordered by id to *done*, or the error to *failed*, right away or later (e.g.
+# DbRunner.run with a page query).
+FetchPage = Callable[..., object]
+
+
+class TaskListModel(QAbstractListModel):
+    """Tasks ordered by id, loaded a page at a time as the view scrolls.
+
+    Pages may arrive asynchronously: one is requested at a time, a page
+    requested before :meth:`reload` is dropped, and one that was in flight
+    while records were patched is requested again (it may predate the write).  Only :class:`TaskRecord`
+    tuples are kept.  Drag and drop moves records between models through MIME
+    data; *on_drop* persists the move of the dropped records (or queues it) and
+    returns them as they are now (raise to refuse it).
+    """
+
+    def __init__(
+        self,
+        fetch_page: FetchPage,
+        on_drop: Optional[Callable[[list[TaskRecord]], list[TaskRecord]]] = None,
+        page_size: int = PAGE_SIZE,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self._fetch_page = fetch_page
+        self._on_drop = on_drop
+        self.page_size = page_size
+        self._records: list[TaskRecord] = []
+        self._ids: list[int] = []  # parallel to _records, for bisect
+        self._exhausted = False
+        self._fetching = False
+        self._stale = False  # patched while a page was in flight
+        self._generation = 0  # bumped by reload() to drop pages still in flight
+
+    # --- records ---
+    def record(self, row: int) -> TaskRecord:
+        return self._records[row]
+
+    def reload(self) -> None:
+        """Forget loaded pages; the view fetches the first one again."""
+        self.beginResetModel()
+        self._records.clear()
+        self._ids.clear()
+        self._exhausted = False
+        self._fetching = False
+        self._stale = False
+        self._generation += 1
+        self.endResetModel()
+
+    def add_records(self, records: Iterable[TaskRecord]) -> None:
+        """Show *records* that now belong to this list, or refresh them if listed.
+
+        Records past the last loaded page are skipped: the page that covers
+        their id brings them in, so they are not listed twice.
+        """
+        self._stale = self._stale or self._fetching
+        for record in records:
+            row = bisect.bisect_left(self._ids, record.id)
+            if row < len(self._ids) and self._ids[row] == record.id:
+                if self._records[row] != record:
+                    self._records[row] = record
+                    index = self.index(row)
+                    self.dataChanged.emit(index, index)
+                continue
+            if not self._exhausted and (not self._ids or record.id > self._ids[-1]):
+                continue
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._records.insert(row, record)
+            self._ids.insert(row, record.id)
+            self.endInsertRows()
+
+    def remove_ids(self, ids: Iterable[int]) -> None:
+        self._stale = self._stale or self._fetching
+        for task_id in ids:
+            row = bisect.bisect_left(self._ids, task_id)
+            if row < len(self._ids) and self._ids[row] == task_id:
+                self.removeRows(row, 1)
+
+    # --- Qt model API ---
+    def rowCount(self, parent=QModelIndex()):  # noqa: N802
+        return 0 if parent.isValid() else len(self._records)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self._records[index.row()]
+        if role == Qt.DisplayRole:
+            return record.title
+        if role == Qt.UserRole:
+            return record.id
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):  # noqa: N802
+        return not parent.isValid() and not self._exhausted and not self._fetching
+
+    def fetchMore(self, parent=QModelIndex()):  # noqa: N802
+        if parent.isValid() or self._exhausted or self._fetching:
+            return
+        self._fetching = True
+        after_id = self._ids[-1] if self._ids else 0
+        self._fetch_page(
+            after_id,
+            self.page_size,
+            done=partial(self._page_loaded, self._generation),
+            failed=partial(self._page_failed, self._generation),
+        )
+
+    def _page_failed(self, generation: int, exc: BaseException) -> None:
+        if generation != self._generation:
+            return
+        log.error("task page failed to load", exc_info=exc)
+        # Paging goes on: the view asks for the page again when it next needs rows.
+        self._fetching = False
+        self._stale = False
+
+    def _page_loaded(self, generation: int, page: list[TaskRecord]) -> None:
+        if generation != self._generation:
+            return
+        self._fetching = False
+        if self._stale:
+            self._stale = False
+            self.fetchMore()
+            return
+        # Patches skip ids past the last loaded page, so nothing in it is listed yet.
+        if len(page) < self.page_size:
+            self._exhausted = True
+        if not page:
+            return
+        first = len(self._records)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._records.extend(page)
+        self._ids.extend(record.id for record in page)
+        self.endInsertRows()
+
+    def removeRows(self, row, count, parent=QModelIndex()):  # noqa: N802
+        if parent.isValid() or row < 0 or row + count > len(self._records):
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        del self._records[row : row + count]
+        del self._ids[row : row + count]
+        self.endRemoveRows()
+        return True
+
+    # --- drag and drop ---
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled if self._on_drop else Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemNeverHasChildren
+        return flags | Qt.ItemIsDragEnabled if self._on_drop else flags
+
+    def supportedDropActions(self):  # noqa: N802
+        return Qt.MoveAction
+
+    def mimeTypes(self):  # noqa: N802
+        return [TASK_MIME_TYPE]
+
+    def mimeData(self, indexes):  # noqa: N802
+        rows = sorted({index.row() for index in indexes if index.isValid()})
+        mime = QMimeData()
+        mime.setData(TASK_MIME_TYPE, json.dumps([self._records[r] for r in rows]).encode())
+        return mime
+
+    def dropMimeData(self, data, action, row, column, parent):  # noqa: N802
+        if action != Qt.MoveAction or self._on_drop is None or not data.hasFormat(TASK_MIME_TYPE):
+            return False
+        records = [TaskRecord(*item) for item in json.loads(bytes(data.data(TASK_MIME_TYPE)))]
+        if all(record.id in self for record in records):
+            return False  # dropped back onto its own list
+        try:
+            moved = self._on_drop(records)
+        except Exception:
+            # A failed write must not crash the UI; the drag just does nothing.
+            return False
+        self.add_records(moved)
+        # Returning True lets the source view remove its copies (MoveAction).
+        return True
+
+    def __contains__(self, task_id: int) -> bool:
+        row = bisect.bisect_left(self._ids, task_id)
+        return row < len(self._ids) and self._ids[row] == task_id
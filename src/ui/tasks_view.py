@@ -1,103 +1,117 @@
 """Simple Kanban board with ability to add tasks."""
 from __future__ import annotations
 
+import logging
+import weakref
+from concurrent.futures import Future
 from datetime import date
-from typing import Callable, Dict
+from functools import partial
+from typing import Callable, Dict, Optional
 
-from PySide6.QtCore import Qt, QEvent
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtWidgets import (
+    QAbstractItemView,
     QHBoxLayout,
     QLabel,
-    QListWidget,
-    QListWidgetItem,
+    QListView,
+    QMessageBox,
     QPushButton,
     QVBoxLayout,
     QWidget,
 )
 
+from services.change_bus import Change
+from services.db import transaction
+from services.db_executor import BACKGROUND, INTERACTIVE
 from services.tasks_service import (
+    TaskRecord,
     add_task,
     assign_to_week,
+    get_backlog_page,
     get_or_create_default_project,
-    get_tasks_for_week,
-    get_backlog_tasks,  # <-- upewnij się, że istnieje; w razie czego podmień na właściwą
-    bulk_update,
+    get_week_page,
+    import_tasks,
+    locate_tasks,
     update_status,
 )
 from services.week_service import iso_week
 
+from .db_runner import DbRunner
+from .task_list_model import TaskListModel
 from .widgets.add_task_dialog import AddTaskDialog
 from .widgets.bulk_update_dialog import BulkUpdateDialog
 
 
 KANBAN_STATUSES = ("TODO", "IN_PROGRESS", "DONE")
+# Statuses without a column of their own are shown under TODO.
+COLUMN_STATUSES = {"TODO": ("TODO", "CANCELED"), "IN_PROGRESS": ("IN_PROGRESS",), "DONE": ("DONE",)}
+# Changes touching more tasks than this reload the lists instead of patching.
+PATCH_LIMIT = 500
 
+log = logging.getLogger(__name__)
 
-class StatusList(QListWidget):
-    """List widget representing a task status column with cross-list DnD."""
 
-    def __init__(self, status: str, on_change: Callable[[int, str], None]):
-        super().__init__()
-        self.status = status
-        self.on_change = on_change
-
-        self.setObjectName(status)
-
-        # DnD setup — umożliwia przeciąganie między listami:
-        self.setDragEnabled(True)
-        self.setAcceptDrops(True)
-        self.setDropIndicatorShown(True)
-        self.setDefaultDropAction(Qt.MoveAction)
-        self.setSelectionMode(QListWidget.SingleSelection)
-        # Pozwala na przenoszenie elementów między widgetami:
-        self.setDragDropMode(QListWidget.DragDrop)
-
-    # Qt override
-    def dropEvent(self, event):  # noqa: N802
-        """Po udanym dropie aktualizujemy status w DB."""
-        source = event.source()
-        if not isinstance(source, QListWidget):
-            return super().dropEvent(event)
-
-        # Zachowujemy referencję do przenoszonego itemu PRZED super().dropEvent,
-        # bo po przeniesieniu currentItem na źródle może się zmienić.
-        item: QListWidgetItem | None = source.currentItem()
-        super().dropEvent(event)
-
-        if item is None:
-            return
-        task_id = item.data(Qt.UserRole)
-        if task_id is None:
-            return
-        try:
-            self.on_change(int(task_id), self.status)
-        except Exception:
-            # w razie błędu operacyjnego – twardo ignorujemy żeby nie crashować UI
-            pass
-
-    # Opcjonalnie: wygładzenie UX – podświetlenie kolumny przy drag enter/leave
-    def dragEnterEvent(self, event):  # noqa: N802
-        if event.source() and isinstance(event.source(), QListWidget):
-            event.acceptProposedAction()
-        else:
-            event.ignore()
-
-    def dragMoveEvent(self, event):  # noqa: N802
-        if event.source() and isinstance(event.source(), QListWidget):
-            event.acceptProposedAction()
-        else:
-            event.ignore()
+def _add_planned_task(conn, iso_week: str, data: dict) -> int:
+    with transaction(conn):
+        task_id = add_task(
+            conn,
+            get_or_create_default_project(conn),
+            data["title"],
+            data.get("priority"),
+            data.get("estimate"),
+            data.get("notes"),
+        )
+        assign_to_week(conn, task_id, iso_week)
+    return task_id
+
+
+def _set_status(conn, records: list[TaskRecord], status: str) -> None:
+    with transaction(conn):
+        for record in records:
+            update_status(conn, record.id, status)
+
+
+def _task_list(model: TaskListModel, name: str) -> QListView:
+    view = QListView()
+    view.setObjectName(name)
+    view.setModel(model)
+    # Fixed row height lets the view lay out 100k rows without measuring them.
+    view.setUniformItemSizes(True)
+    view.setSelectionMode(QAbstractItemView.SingleSelection)
+    return view
+
+
+def _column_drop(view: "TasksView", status: str) -> Callable[[list[TaskRecord]], list[TaskRecord]]:
+    """on_drop of a Kanban column, holding the view weakly.
+
+    The models are the view's children; a strong reference back would make
+    a cycle that only the cyclic collector frees, on whatever thread it runs.
+    """
+    ref = weakref.ref(view)
+    return lambda records: ref()._status_changed(status, records)
+
+
+def _status_list(model: TaskListModel, status: str) -> QListView:
+    """A Kanban column; tasks are dragged between columns to change status."""
+    view = _task_list(model, status)
+    view.setDragEnabled(True)
+    view.setAcceptDrops(True)
+    view.setDropIndicatorShown(True)
+    view.setDragDropMode(QAbstractItemView.DragDrop)
+    view.setDefaultDropAction(Qt.MoveAction)
+    return view
 
 
 class TasksView(QWidget):
     """Kanban board view with an option to add tasks."""
 
-    def __init__(self, conn):
+    def __init__(self, conn, runner: Optional[DbRunner] = None):
         super().__init__()
 
         self.conn = conn
+        self.runner = runner or DbRunner(conn, parent=self)
         self.curr_week = iso_week(date.today())
-        self.project_id = get_or_create_default_project(conn)
+        self._import: Optional[Future] = None
 
         main = QVBoxLayout()
 
@@ -107,21 +121,32 @@ class TasksView(QWidget):
         # Left: Backlog
         left = QVBoxLayout()
         left.addWidget(QLabel("Backlog"))
-        self.backlog = QListWidget()
-        self.backlog.setSelectionMode(QListWidget.SingleSelection)
-        self.backlog.itemDoubleClicked.connect(self._plan_backlog_task)
+        self.backlog_model = TaskListModel(
+            partial(self.runner.run, get_backlog_page, read_only=True), parent=self
+        )
+        self.backlog = _task_list(self.backlog_model, "BACKLOG")
+        self.backlog.doubleClicked.connect(self._plan_backlog_task)
         left.addWidget(self.backlog)
         content.addLayout(left)
 
         # Right: Kanban board
         board = QHBoxLayout()
-        self.lists: Dict[str, StatusList] = {}
+        self.models: Dict[str, TaskListModel] = {}
+        self.lists: Dict[str, QListView] = {}
         for name in KANBAN_STATUSES:
             column = QVBoxLayout()
             column.addWidget(QLabel(name))
-            lst = StatusList(name, self._status_changed)
+            model = TaskListModel(
+                partial(
+                    self.runner.run, get_week_page, self.curr_week, COLUMN_STATUSES[name], read_only=True
+                ),
+                on_drop=_column_drop(self, name),
+                parent=self,
+            )
+            lst = _status_list(model, name)
             column.addWidget(lst)
             board.addLayout(column)
+            self.models[name] = model
             self.lists[name] = lst
         content.addLayout(board)
         main.addLayout(content)
@@ -133,35 +158,51 @@ class TasksView(QWidget):
         add_btn.clicked.connect(self._add_task)
         actions.addWidget(add_btn)
 
-        bulk_btn = QPushButton("Masowa aktualizacja")
-        bulk_btn.clicked.connect(self._bulk_update)
-        actions.addWidget(bulk_btn)
+        self.bulk_btn = QPushButton("Masowa aktualizacja")
+        self.bulk_btn.clicked.connect(self._bulk_update)
+        actions.addWidget(self.bulk_btn)
 
         main.addLayout(actions)
 
         self.setLayout(main)
-        self._load_tasks()
+        self.runner.subscribe(self._tasks_changed, ("task", "assignment"))
 
     # --- Data loading ---
     def _load_tasks(self) -> None:
-        for lst in self.lists.values():
-            lst.clear()
-        self.backlog.clear()
-
-        # Backlog
-        for row in get_backlog_tasks(self.conn) or []:
-            item = QListWidgetItem(row.get("title", "<no title>"))
-            item.setData(Qt.UserRole, row.get("id"))
-            self.backlog.addItem(item)
-
-        # Planned tasks (current week)
-        for row in get_tasks_for_week(self.conn, self.curr_week) or []:
-            title = row.get("title", "<no title>")
-            status = row.get("status", "TODO")
-            status = status if status in self.lists else "TODO"
-            item = QListWidgetItem(title)
-            item.setData(Qt.UserRole, row.get("id"))
-            self.lists[status].addItem(item)
+        """Drop loaded pages; each list fetches its first page again when shown."""
+        self.backlog_model.reload()
+        for model in self.models.values():
+            model.reload()
+
+    def _tasks_changed(self, change: Change) -> None:
+        """Move or refresh just the tasks a committed write touched."""
+        if len(change.ids) > PATCH_LIMIT:
+            self._load_tasks()
+            return
+        self.runner.run(
+            locate_tasks,
+            change.ids,
+            self.curr_week,
+            done=partial(self._place, change.ids),
+            priority=INTERACTIVE,
+            read_only=True,
+        )
+
+    def _place(self, ids: tuple[int, ...], found) -> None:
+        placements = {p.record.id: p for p in found}
+        for task_id in ids:
+            placement = placements.get(task_id)
+            target = None
+            if placement is not None and not placement.planned:
+                target = self.backlog_model
+            elif placement is not None and placement.in_week:
+                status = placement.record.status
+                target = self.models[status if status in self.models else "TODO"]
+            for model in (self.backlog_model, *self.models.values()):
+                if model is target:
+                    model.add_records([placement.record])
+                else:
+                    model.remove_ids([task_id])
 
     # --- Actions handlers ---
     def _add_task(self) -> None:
@@ -172,43 +213,64 @@ class TasksView(QWidget):
         title = (data.get("title") or "").strip()
         if not title:
             return
+        # The lists pick the new task up from the change bus.
+        self.runner.run(_add_planned_task, self.curr_week, {**data, "title": title}, priority=INTERACTIVE)
 
-        task_id = add_task(
-            self.conn,
-            self.project_id,
-            title,
-            data.get("priority"),
-            data.get("estimate"),
-            data.get("notes"),
-        )
-        assign_to_week(self.conn, task_id, self.curr_week)
-
-        item = QListWidgetItem(title)
-        item.setData(Qt.UserRole, task_id)
-        self.lists["TODO"].addItem(item)
+    def _status_changed(self, status: str, records: list[TaskRecord]) -> list[TaskRecord]:
+        # Shown moved right away; a failed write reloads the board.
+        self.runner.run(_set_status, records, status, failed=self._write_failed, priority=INTERACTIVE)
+        return [record._replace(status=status) for record in records]
 
-    def _status_changed(self, task_id: int, status: str) -> None:
-        update_status(self.conn, task_id, status)
+    def _write_failed(self, exc: BaseException) -> None:
+        log.error("task update failed", exc_info=exc)
+        # Not from inside the drop that is still being handled.
+        QTimer.singleShot(0, self._load_tasks)
 
-    def _plan_backlog_task(self, item: QListWidgetItem) -> None:
-        task_id = item.data(Qt.UserRole)
-        if task_id is None:
+    def _plan_backlog_task(self, index) -> None:
+        if not index.isValid():
             return
-        assign_to_week(self.conn, int(task_id), self.curr_week)
-
-        row = self.backlog.row(item)
-        self.backlog.takeItem(row)
-
-        new_item = QListWidgetItem(item.text())
-        new_item.setData(Qt.UserRole, task_id)
-        self.lists["TODO"].addItem(new_item)
+        self.runner.run(
+            assign_to_week, self.backlog_model.record(index.row()).id, self.curr_week, priority=INTERACTIVE
+        )
 
     def _bulk_update(self) -> None:
+        if self._import is not None:
+            # The button reads "Przerwij import" while one runs; the worker
+            # stops after the current batch and rolls the import back.
+            self._import.cancel()
+            self._import_finished()
+            return
         dlg = BulkUpdateDialog(self)
         if dlg.exec() != dlg.Accepted:
             return
-        tasks = dlg.get_tasks()
-        if not tasks:
-            return
-        bulk_update(self.conn, tasks)
-        self._load_tasks()
+        self._import = self.runner.run(
+            import_tasks,
+            dlg.get_records(),
+            checkpoint=self.runner.checkpoint,
+            done=self._import_done,
+            failed=self._import_failed,
+            priority=BACKGROUND,
+        )
+        if self._import is not None:
+            self.bulk_btn.setText("Przerwij import")
+
+    def _import_finished(self) -> None:
+        self._import = None
+        self.bulk_btn.setText("Masowa aktualizacja")
+
+    def _import_failed(self, exc: BaseException) -> None:
+        self._import_finished()
+        if not isinstance(exc, (OSError, ValueError)):
+            raise exc
+        QMessageBox.warning(self, "Masowa aktualizacja", f"Nie udało się wczytać danych: {exc}")
+
+    def _import_done(self, report) -> None:
+        self._import_finished()
+        if report.errors:
+            lines = [f"wiersz {r.row}: {r.error}" for r in report.errors[:10]]
+            QMessageBox.information(
+                self,
+                "Masowa aktualizacja",
+                f"Dodano {report.counts['inserted']}, zaktualizowano {report.counts['updated']}, "
+                f"pominięto {report.counts['error']}:\n" + "\n".join(lines),
+            )
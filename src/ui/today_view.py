@@ -2,7 +2,12 @@ from __future__ import annotations
 
 """Simple Today view with ability to add habits."""
 
-from PySide6.QtCore import Qt
+import logging
+from datetime import date
+from functools import partial
+from typing import Optional
+
+from PySide6.QtCore import QCoreApplication, Qt, QTimer
 from PySide6.QtWidgets import (
     QComboBox,
     QHBoxLayout,
@@ -16,21 +21,52 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
-from services.habits_service import add_habit, get_active_habits
+from services.change_bus import Change
+from services.db_executor import INTERACTIVE
+from services.habits_service import HabitLogBuffer, add_habit
+from services.rollup_service import HabitProgress, habit_streaks, today_progress
+
+from .db_runner import DbRunner
+
+# Clicks closer together than this are written as one change.
+LOG_DEBOUNCE_MS = 400
+PERIOD_LABELS = {"daily": "dziś", "weekly": "w tym tygodniu", "monthly": "w tym miesiącu"}
+
+log = logging.getLogger(__name__)
+
+
+def _flush_buffer(conn, buffer: HabitLogBuffer) -> int:
+    return buffer.flush()
 
 
 class TodayView(QWidget):
     """Minimal view showing today's habits and allowing new ones."""
 
-    def __init__(self, conn):
+    def __init__(self, conn, runner: Optional[DbRunner] = None):
         super().__init__()
         self.conn = conn
+        self.runner = runner or DbRunner(conn, parent=self)
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(LOG_DEBOUNCE_MS)
+        self._flush_timer.timeout.connect(self.flush)
+        # Primed from the loaded progress: the GUI thread never queries conn.
+        self.log_buffer = HabitLogBuffer(conn, schedule=self._flush_timer.start, read_through=False)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.flush)
 
         layout = QVBoxLayout()
         layout.addWidget(QLabel("Dzisiejsze nawyki"))
 
         self.list = QListWidget()
+        # Double-click: +1 for quantity habits, done/undone for binary ones.
+        self.list.itemDoubleClicked.connect(self._log_clicked)
         layout.addWidget(self.list)
+        self._items: dict[int, QListWidgetItem] = {}
+        self._progress: dict[int, HabitProgress] = {}
+        self._streaks: dict[int, int] = {}
         self._refresh()
 
         form = QHBoxLayout()
@@ -55,27 +91,107 @@ class TodayView(QWidget):
         layout.addLayout(form)
 
         self.setLayout(layout)
+        self.runner.subscribe(self._habits_changed, ("habit", "habit_log"))
 
     def _refresh(self) -> None:
+        self.day = date.today()
+        self.runner.run(today_progress, self.day, done=partial(self._show_all, self.day))
+
+    def _show_all(self, day: date, progress: list[HabitProgress]) -> None:
+        if day != self.day:
+            return  # superseded by a later refresh
         self.list.clear()
-        for row in get_active_habits(self.conn):
-            item = QListWidgetItem(row["name"])
-            item.setData(Qt.UserRole, row["id"])
-            self.list.addItem(item)
+        self._items = {}
+        self._streaks = {}
+        self._progress = {p.id: p for p in progress}
+        self.log_buffer.prime(day, ((p.id, p.type, p.today) for p in progress))
+        for habit_id in self._progress:
+            self._add_item(habit_id)
+        self._load_streaks(day, tuple(self._progress))
+
+    def _add_item(self, habit_id: int) -> None:
+        item = QListWidgetItem()
+        item.setData(Qt.UserRole, habit_id)
+        self._items[habit_id] = item
+        self._show_progress(item)
+        self.list.addItem(item)
+
+    def _habits_changed(self, change: Change) -> None:
+        """Patch the rows of habits a committed write touched."""
+        if change.entity == "habit_log" and self.day not in change.days:
+            # Earlier days only move streaks.
+            self._load_streaks(self.day, tuple(i for i in change.ids if i in self._items))
+            return
+        self.runner.run(today_progress, self.day, done=partial(self._show_changed, self.day, change.ids))
+
+    def _show_changed(self, day: date, ids: tuple[int, ...], progress: list[HabitProgress]) -> None:
+        if day != self.day:
+            return
+        self._progress = {p.id: p for p in progress}
+        touched = [self._progress[i] for i in ids if i in self._progress]
+        self.log_buffer.refresh(day, ((p.id, p.type, p.today) for p in touched))
+        for progress in touched:
+            item = self._items.get(progress.id)
+            if item is None:
+                self._add_item(progress.id)
+            else:
+                self._show_progress(item)
+        self._load_streaks(day, tuple(p.id for p in touched))
+
+    def _load_streaks(self, day: date, ids: tuple[int, ...]) -> None:
+        if ids:
+            self.runner.run(habit_streaks, ids, day, done=partial(self._show_streaks, day))
+
+    def _show_streaks(self, day: date, streaks: dict[int, int]) -> None:
+        if day != self.day:
+            return
+        self._streaks.update(streaks)
+        for habit_id in streaks:
+            item = self._items.get(habit_id)
+            if item is not None:
+                self._show_progress(item)
+
+    def _show_progress(self, item: QListWidgetItem) -> None:
+        p = self._progress[item.data(Qt.UserRole)]
+        # Unflushed clicks change today's value; carry that into the period total.
+        total = p.total + self.log_buffer.value(p.id, self.day) - p.today
+        mark = "✓ " if total >= p.goal else ""
+        streak = self._streaks.get(p.id)
+        suffix = f" · seria {streak}" if streak and streak > 1 else ""
+        item.setText(f"{mark}{p.name}: {total}/{p.goal} {PERIOD_LABELS[p.goal_type]}{suffix}")
+
+    def _log_clicked(self, item: QListWidgetItem) -> None:
+        if self.day != date.today():
+            self._refresh()  # the app stayed open past midnight
+            return
+        self.log_buffer.click(item.data(Qt.UserRole), self.day)
+        # Shown now; the write happens once the clicks stop.
+        self._show_progress(item)
+
+    def flush(self) -> None:
+        self._flush_timer.stop()
+        if self.log_buffer.pending():
+            # The committed write comes back through _habits_changed.
+            self.runner.run(
+                _flush_buffer, self.log_buffer, failed=self._flush_failed, priority=INTERACTIVE
+            )
+
+    def _flush_failed(self, exc: BaseException) -> None:
+        log.error("habit log write failed", exc_info=exc)
+        # The buffer kept the clicks; try again after the next pause.
+        self._flush_timer.start()
 
     def _add_clicked(self) -> None:
         name = self.name_edit.text().strip()
         if not name:
             return
-        habit_id = add_habit(
-            self.conn,
+        self.runner.run(
+            add_habit,
             name,
             self.type_combo.currentText(),
             self.goal_type_combo.currentText(),
             self.goal_spin.value(),
+            priority=INTERACTIVE,
         )
-        item = QListWidgetItem(name)
-        item.setData(Qt.UserRole, habit_id)
-        self.list.addItem(item)
         self.name_edit.clear()
 
@@ -1,18 +1,27 @@
-"""Dialog window allowing mass task updates via JSON."""
+"""Dialog window allowing mass task updates via JSON or NDJSON."""
 from __future__ import annotations
 
-import json
+from typing import Iterator, Optional
+
 from PySide6.QtWidgets import (
     QDialog,
     QDialogButtonBox,
+    QFileDialog,
     QLabel,
+    QPushButton,
     QTextEdit,
     QVBoxLayout,
 )
 
+from services.task_import import iter_records, parse_records
+
 
 class BulkUpdateDialog(QDialog):
-    """Prompt user for JSON describing tasks to add or update."""
+    """Prompt user for JSON describing tasks to add or update.
+
+    Records can be pasted or read from a ``.json`` / ``.ndjson`` file; a chosen
+    file is streamed at import time rather than loaded into the text box.
+    """
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -22,7 +31,8 @@ class BulkUpdateDialog(QDialog):
 
         fmt = (
             "Format:\n{\n  \"tasks\": [\n    {\"title\": \"Nowe\", \"week\": \"2024-W30\"},\n"
-            "    {\"id\": 1, \"status\": \"DONE\"}\n  ]\n}"
+            "    {\"id\": 1, \"status\": \"DONE\"}\n  ]\n}\n"
+            "lub NDJSON: jeden obiekt zadania w każdej linii."
         )
         info = QLabel(fmt)
         info.setWordWrap(True)
@@ -31,6 +41,13 @@ class BulkUpdateDialog(QDialog):
         self.text = QTextEdit()
         layout.addWidget(self.text)
 
+        self.path: Optional[str] = None
+        self.file_label = QLabel()
+        file_btn = QPushButton("Wczytaj z pliku…")
+        file_btn.clicked.connect(self._choose_file)
+        layout.addWidget(file_btn)
+        layout.addWidget(self.file_label)
+
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         buttons.accepted.connect(self.accept)
         buttons.rejected.connect(self.reject)
@@ -38,14 +55,20 @@ class BulkUpdateDialog(QDialog):
 
         self.setLayout(layout)
 
-    def get_tasks(self) -> list[dict]:
-        """Return parsed task data or an empty list on failure."""
-        try:
-            data = json.loads(self.text.toPlainText() or "{}")
-        except json.JSONDecodeError:
-            return []
-        if isinstance(data, dict):
-            tasks = data.get("tasks", [])
-            if isinstance(tasks, list):
-                return [t for t in tasks if isinstance(t, dict)]
-        return []
+    def _choose_file(self) -> None:
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Plik z zadaniami", "", "JSON (*.json *.ndjson *.jsonl);;Wszystkie pliki (*)"
+        )
+        if path:
+            self.set_path(path)
+
+    def set_path(self, path: Optional[str]) -> None:
+        self.path = path
+        self.text.setEnabled(path is None)
+        self.file_label.setText(path or "")
+
+    def get_records(self) -> Iterator[object]:
+        """Return a lazy stream of task records from the file or the text box."""
+        if self.path:
+            return iter_records(self.path)
+        return parse_records(self.text.toPlainText())
@@ -0,0 +1,124 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.analytics_service import task_timeline, weekly_report
+from services.db import SCHEMA_PATH, init_db, open_memory_db
+from services.tasks_service import (
+    add_task,
+    assign_to_week,
+    bulk_update,
+    get_or_create_default_project,
+    update_status,
+)
+
+
+def _db():
+    conn = open_memory_db()
+    init_db(conn)
+    return conn, get_or_create_default_project(conn)
+
+
+def _dated(conn, when: str) -> None:
+    """Move the latest status event to *when* (midday, so no time zone shifts the day)."""
+    conn.execute("UPDATE task_events SET at=? WHERE id=(SELECT MAX(id) FROM task_events)", (when + " 12:00:00",))
+    conn.commit()
+
+
+def _events(conn, task_id):
+    rows = conn.execute(
+        "SELECT from_status, to_status FROM task_events WHERE task_id=? ORDER BY id", (task_id,)
+    ).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def test_every_status_path_records_transitions_and_closed_at():
+    conn, project = _db()
+    task = add_task(conn, project, "a")
+    update_status(conn, task, "IN_PROGRESS")
+    update_status(conn, task, "IN_PROGRESS")  # no change, no event
+    update_status(conn, task, "DONE")
+    assert conn.execute("SELECT closed_at FROM tasks WHERE id=?", (task,)).fetchone()[0] is not None
+    bulk_update(conn, [{"id": task, "status": "TODO"}, {"title": "b", "status": "DONE"}])
+    assert _events(conn, task) == [
+        (None, "TODO"),
+        ("TODO", "IN_PROGRESS"),
+        ("IN_PROGRESS", "DONE"),
+        ("DONE", "TODO"),
+    ]
+    assert conn.execute("SELECT closed_at FROM tasks WHERE id=?", (task,)).fetchone()[0] is None
+    imported = conn.execute("SELECT id, closed_at FROM tasks WHERE title='b'").fetchone()
+    assert imported["closed_at"] is not None
+    assert _events(conn, imported["id"]) == [(None, "DONE")]
+
+
+def test_migration_backfills_history_for_existing_tasks():
+    conn = open_memory_db()
+    conn.executescript(SCHEMA_PATH.read_text(encoding="utf-8"))
+    conn.execute("INSERT INTO projects(name) VALUES ('General')")
+    conn.executemany(
+        "INSERT INTO tasks(project_id, title, status, created_at) VALUES (1, ?, ?, '2024-01-02 10:00:00')",
+        [("open", "TODO"), ("done", "DONE")],
+    )
+    conn.commit()
+    init_db(conn)
+    assert _events(conn, 1) == [(None, "TODO")]
+    assert _events(conn, 2) == [(None, "TODO"), ("TODO", "DONE")]
+    assert conn.execute("SELECT closed_at FROM tasks WHERE id=2").fetchone()[0] == "2024-01-02 10:00:00"
+
+
+def test_weekly_report_flow_metrics():
+    conn, project = _db()
+    a = add_task(conn, project, "a")
+    _dated(conn, "2024-01-01")
+    update_status(conn, a, "IN_PROGRESS")
+    _dated(conn, "2024-01-08")
+    update_status(conn, a, "DONE")
+    _dated(conn, "2024-01-10")
+    b = add_task(conn, project, "b")
+    _dated(conn, "2024-01-08")
+    c = add_task(conn, project, "c")
+    _dated(conn, "2024-01-02")
+    update_status(conn, c, "DONE")
+    _dated(conn, "2024-01-16")
+    d = add_task(conn, project, "d")
+    _dated(conn, "2024-01-02")
+    update_status(conn, d, "CANCELED")
+    _dated(conn, "2024-01-09")
+    for task in (a, b, c, d):
+        assign_to_week(conn, task, "2024-W02")
+
+    report = weekly_report(conn, "2024-W01", "2024-W03")
+    assert report.weeks == ["2024-W01", "2024-W02", "2024-W03"]
+    assert report.planned.tolist() == [0, 4, 0]
+    assert report.done.tolist() == [0, 1, 0]
+    assert report.throughput.tolist() == [0, 1, 1]
+    assert report.burndown[1].tolist() == [4, 3, 2, 2, 2, 2, 2]
+    assert report.carry_over[1] == 0.5 and np.isnan(report.carry_over[0])
+    assert report.cycle_time[1] == 2.0 and np.isnan(report.cycle_time[2])
+    assert report.lead_time.tolist()[1:] == [9.0, 14.0]
+
+
+def test_timeline_keeps_first_start_and_drops_reopened_close():
+    conn, project = _db()
+    task = add_task(conn, project, "a")
+    for status in ("IN_PROGRESS", "TODO", "IN_PROGRESS", "DONE", "TODO"):
+        update_status(conn, task, status)
+    first_start = conn.execute(
+        "SELECT MIN(id) FROM task_events WHERE to_status='IN_PROGRESS'"
+    ).fetchone()[0]
+    conn.execute("UPDATE task_events SET at='2024-03-01 12:00:00' WHERE id=?", (first_start,))
+    timeline = task_timeline(conn)
+    assert timeline.ids.tolist() == [task]
+    assert np.floor(timeline.started[0]) == (np.datetime64("2024-03-01") - np.datetime64("1970-01-01")).astype(int)
+    assert np.isnan(timeline.closed[0])
+
+
+def test_weekly_report_on_an_empty_database():
+    conn, _ = _db()
+    report = weekly_report(conn, "2024-W01", "2024-W02")
+    assert report.planned.tolist() == [0, 0] and report.throughput.tolist() == [0, 0]
+    assert report.burndown.shape == (2, 7)
@@ -1,14 +1,27 @@
 import os
+import shutil
+import subprocess
 import sys
 from pathlib import Path
 
 import pytest
+from PySide6.QtWidgets import QApplication
 
 # Ensure the Qt platform is set to offscreen to avoid display requirements
 os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
 
-sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+SRC = Path(__file__).resolve().parents[1] / "src"
+sys.path.insert(0, str(SRC))
 import app
+from services.db import get_connection, init_db, open_memory_db
+from services.page_store import PageStore, is_page_store
+from services.security_service import (
+    decrypt_file,
+    decrypt_to_bytes,
+    derive_session_key,
+    encrypt_bytes,
+    read_kdf_meta,
+)
 
 
 def test_main_starts(monkeypatch, tmp_path):
@@ -17,16 +30,103 @@ def test_main_starts(monkeypatch, tmp_path):
     config["db_plain_path"] = str(tmp_path / "data" / "app.db")
     config["db_encrypted_path"] = str(tmp_path / "data" / "app.db.enc")
     config["backup_path"] = str(tmp_path / "backup")
+    config["kdf_target_ms"] = 1
 
-    # Avoid external side effects during test
+    # Avoid external side effects during test; main() imports these when it
+    # reaches them, so they are patched where they live.
     monkeypatch.setattr(app, "load_config", lambda: config)
-    monkeypatch.setattr(app, "decrypt_file", lambda *a, **k: None)
-    monkeypatch.setattr(app, "encrypt_file", lambda *a, **k: None)
-    monkeypatch.setattr(app, "secure_delete", lambda *a, **k: None)
-    monkeypatch.setattr(app, "local_backup", lambda *a, **k: None)
+    monkeypatch.setattr("services.security_service.decrypt_file", lambda *a, **k: None)
+    monkeypatch.setattr("services.security_service.secure_delete", lambda *a, **k: None)
+    monkeypatch.setattr("services.backup_service.snapshot_backup", lambda *a, **k: None)
 
     # Do not enter the Qt event loop
     monkeypatch.setattr(app.QApplication, "exec", lambda self: 0)
 
     assert app.main() == 0
 
+
+def test_importing_the_app_loads_no_services():
+    probe = "import sys, app; print(sorted(m for m in sys.modules if m.split('.')[0] in {0!r}))"
+    loaded = subprocess.run(
+        [sys.executable, "-c", probe.format({"services", "ui", "yaml", "numpy", "cryptography"})],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert loaded.strip() == "[]"
+
+
+def _run_config(monkeypatch, tmp_path, **overrides) -> dict:
+    config = app.DEFAULT_CONFIG.copy()
+    config.update(
+        db_plain_path=str(tmp_path / "data" / "app.db"),
+        db_encrypted_path=str(tmp_path / "data" / "app.db.enc"),
+        backup_path=str(tmp_path / "backup"),
+        kdf_target_ms=1,
+        **overrides,
+    )
+    monkeypatch.setattr(app, "load_config", lambda: config)
+    monkeypatch.setattr("services.backup_service.snapshot_backup", lambda *a, **k: None)
+    monkeypatch.setattr(app.QApplication, "exec", lambda self: 0)
+    return config
+
+
+def test_switching_db_mode_converts_the_encrypted_file(monkeypatch, tmp_path):
+    config = _run_config(monkeypatch, tmp_path)
+    enc = Path(config["db_encrypted_path"])
+    assert app.main() == 0
+    session = derive_session_key("password", read_kdf_meta(enc))
+    conn = open_memory_db(decrypt_to_bytes(enc, session))
+    conn.execute("INSERT INTO app_settings(key, value) VALUES ('marker', 'kept')")
+    conn.commit()
+    encrypt_bytes(conn.serialize(), enc, session)
+
+    for mode, paged in (("paged", True), ("memory", False), ("file", False), ("paged", True), ("file", False)):
+        config["db_mode"] = mode
+        assert app.main() == 0
+        assert is_page_store(enc, session) == paged
+        blocks = list(enc.parent.glob("app.db.enc.*.blocks"))
+        assert len(blocks) == paged  # converted away from "paged": no stale block file
+        conn = open_memory_db(PageStore(enc, session).load())
+        assert conn.execute("SELECT value FROM app_settings WHERE key='marker'").fetchone()[0] == "kept"
+
+
+def test_file_mode_discards_sidecars_of_a_crashed_run(monkeypatch, tmp_path):
+    config = _run_config(monkeypatch, tmp_path, db_mode="file")
+    enc, plain = Path(config["db_encrypted_path"]), Path(config["db_plain_path"])
+    assert app.main() == 0
+    session = derive_session_key("password", read_kdf_meta(enc))
+
+    # A run that crashed with a write still in its WAL.
+    crashed = tmp_path / "crashed.db"
+    decrypt_file(enc, crashed, session)
+    conn = get_connection(str(crashed))
+    conn.execute("PRAGMA wal_autocheckpoint=0")
+    conn.execute("INSERT INTO app_settings(key, value) VALUES ('marker', 'stale')")
+    conn.commit()
+    shutil.copy(crashed.with_name("crashed.db-wal"), plain.with_name("app.db-wal"))
+    conn.close()
+
+    assert app.main() == 0
+    assert not list(plain.parent.glob("app.db*-*")) and not plain.exists()
+    conn = open_memory_db(decrypt_to_bytes(enc, session))
+    assert conn.execute("SELECT value FROM app_settings WHERE key='marker'").fetchone() is None
+
+
+def test_views_are_built_when_their_tab_is_first_shown():
+    QApplication.instance() or QApplication([])
+    conn = open_memory_db()
+    init_db(conn)
+    win = app.MainWindow(conn, default_view="minimal")
+
+    def built():
+        return [win.tabs.widget(i).layout().count() for i in range(win.tabs.count())]
+
+    assert win.tabs.currentIndex() == list(app.VIEWS).index("today")
+    assert built() == [1, 0, 0, 0]
+
+    win.tabs.setCurrentIndex(list(app.VIEWS).index("tasks"))
+    assert built() == [1, 0, 1, 0]
+    assert type(win.view(2)).__name__ == "TasksView" and win.view(2) is win.view(2)
+    win.deleteLater()
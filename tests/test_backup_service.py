@@ -0,0 +1,88 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.backup_service import BackupRepository, iter_chunks
+from services.db import init_db, open_memory_db
+from services.security_service import EncryptedFormatError, derive_session_key
+from services.tasks_service import add_task, get_backlog_tasks, get_or_create_default_project
+
+SESSION = derive_session_key("pw")
+
+
+def make_db(n_tasks: int):
+    conn = open_memory_db()
+    init_db(conn)
+    project = get_or_create_default_project(conn)
+    for i in range(n_tasks):
+        add_task(conn, project, f"Zadanie {i}", notes="y" * 300)
+    return conn
+
+
+def chunk_bytes(root: Path) -> int:
+    return sum(p.stat().st_size for p in (root / "chunks").glob("*/*"))
+
+
+def test_chunks_are_page_aligned_and_cover_image():
+    image = make_db(3000).serialize()
+    chunks = list(iter_chunks(image))
+    assert b"".join(chunks) == image
+    assert all(len(c) % 4096 == 0 for c in chunks[:-1])
+    assert len(chunks) > 5
+
+
+def test_snapshots_dedupe_and_restore(tmp_path):
+    # Large enough that two worst-case (max-size) changed chunks stay < 1/5.
+    conn = make_db(10000)
+    repo = BackupRepository.open(tmp_path, SESSION)
+    first = repo.snapshot(conn.serialize(), now=datetime(2024, 1, 1))
+    after_first = chunk_bytes(tmp_path)
+
+    add_task(conn, get_or_create_default_project(conn), "Nowe")
+    second = repo.snapshot(conn.serialize(), now=datetime(2024, 1, 2))
+    assert second["new_bytes"] < first["new_bytes"] / 5
+    assert chunk_bytes(tmp_path) - after_first < after_first / 5
+
+    reopened = BackupRepository.open(tmp_path, SESSION)
+    restored = open_memory_db(reopened.restore(second["name"]))
+    assert len(get_backlog_tasks(restored)) == 10001
+
+
+def test_prune_by_count_and_age(tmp_path):
+    repo = BackupRepository.open(tmp_path, SESSION)
+    for day in range(5):
+        conn = make_db(50 * (day + 1))
+        repo.snapshot(conn.serialize(), now=datetime(2024, 1, 1) + timedelta(days=day))
+    assert repo.prune(keep_last=3) == 2
+    assert len(repo.snapshots()) == 3
+    assert repo.prune(max_age_days=1, now=datetime(2024, 1, 5, 12)) == 2
+    names = repo.snapshots()
+    assert names == ["20240105T000000000000.snap"]
+    live = set(repo._manifest(names[0])["chunks"])
+    assert {p.name for p in (tmp_path / "chunks").glob("*/*")} == live
+    assert repo.restore(names[0])
+
+
+def test_rekeyed_session_rewraps_repo_key(tmp_path):
+    repo = BackupRepository.open(tmp_path, SESSION)
+    snap = repo.snapshot(make_db(10).serialize())
+    other = derive_session_key("pw")
+    with pytest.raises(EncryptedFormatError):
+        BackupRepository.open(tmp_path, other)
+    repo = BackupRepository.open(tmp_path, other, password="pw")
+    assert repo.restore(snap["name"])
+    assert BackupRepository.open(tmp_path, other).restore(snap["name"])
+
+
+def test_compressed_chunks_shrink_and_restore(tmp_path):
+    image = make_db(2000).serialize()
+    plain = BackupRepository.open(tmp_path / "plain", SESSION)
+    packed = BackupRepository.open(tmp_path / "packed", SESSION, codec="zlib")
+    plain.snapshot(image)
+    snap = packed.snapshot(image)
+    assert chunk_bytes(tmp_path / "packed") < chunk_bytes(tmp_path / "plain") / 3
+    assert bytes(packed.restore(snap["name"])) == image
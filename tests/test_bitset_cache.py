@@ -0,0 +1,112 @@
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.bitset_cache import bitsets_for, release_bitsets
+from services.db import init_db, open_memory_db, transaction
+from services.habits_service import add_habit, log_habits, toggle_binary_habit
+from services.rollup_service import habit_streak
+
+
+def _naive_streak(done: set, day: date) -> int:
+    if day not in done:
+        day -= timedelta(days=1)
+    n = 0
+    while day in done:
+        n += 1
+        day -= timedelta(days=1)
+    return n
+
+
+def _naive_longest(done: set) -> int:
+    best = 0
+    for day in done:
+        if day - timedelta(days=1) not in done:
+            n = 0
+            while day + timedelta(days=n) in done:
+                n += 1
+            best = max(best, n)
+    return best
+
+
+def test_bitsets_match_a_naive_scan_across_years():
+    conn = open_memory_db()
+    init_db(conn)
+    habit = add_habit(conn, "medytacja", "binary", "daily", 1)
+    rng = random.Random(5)
+    start = date(2022, 11, 1)
+    done = set()
+    for offset in range(800):
+        day = start + timedelta(days=offset)
+        if rng.random() < 0.85 or date(2023, 12, 20) <= day <= date(2024, 1, 10):
+            done.add(day)
+    conn.executemany("INSERT INTO habit_logs(habit_id, date, value) VALUES (?, ?, 1)", [(habit, d) for d in done])
+
+    cache = bitsets_for(conn)
+    assert bitsets_for(conn) is cache
+    for day in (date(2024, 1, 10), date(2024, 1, 1), date(2023, 12, 31), start + timedelta(days=799)):
+        assert cache.streak(habit, day) == _naive_streak(done, day)
+    assert cache.longest_streak(habit) == _naive_longest(done)
+    end = date(2024, 2, 29)
+    assert cache.window_count(habit, end, 90) == sum(end - timedelta(days=i) in done for i in range(90))
+    span = (date(2023, 12, 1), date(2024, 1, 31))
+    assert cache.done_days(habit, *span) == sorted(d for d in done if span[0] <= d <= span[1])
+
+    # Writes through the service keep a loaded cache in step.
+    toggle_binary_habit(conn, habit, date(2024, 1, 5))
+    assert not cache.is_done(habit, date(2024, 1, 5))
+    assert cache.streak(habit, date(2024, 1, 10)) == 5
+    toggle_binary_habit(conn, habit, date(2024, 1, 5))
+    assert cache.streak(habit, date(2024, 1, 10)) == _naive_streak(done, date(2024, 1, 10))
+    toggle_binary_habit(conn, habit, date(2030, 6, 1))  # outside the loaded span
+    assert cache.longest_streak(habit) == _naive_longest(done)
+    assert cache.is_done(habit, date(2030, 6, 1))
+    # habit_streak counts daily one-a-day goals here; the rollups agree.
+    for day in (date(2024, 1, 10), date(2023, 3, 1)):
+        assert habit_streak(conn, habit, day) == cache.streak(habit, day)
+
+    release_bitsets(conn)
+    assert bitsets_for(conn) is not cache
+    conn.close()
+
+
+def test_empty_habit():
+    conn = open_memory_db()
+    init_db(conn)
+    habit = add_habit(conn, "nic", "binary", "daily", 1)
+    cache = bitsets_for(conn)
+    assert cache.streak(habit, date(2024, 3, 1)) == 0
+    assert cache.longest_streak(habit) == 0
+    assert cache.window_count(habit, date(2024, 3, 1), 30) == 0
+    toggle_binary_habit(conn, habit, date(2024, 3, 1))
+    assert cache.longest_streak(habit) == 1
+    release_bitsets(conn)
+    conn.close()
+
+
+def test_rolled_back_writes_do_not_reach_the_bitmaps():
+    conn = open_memory_db()
+    init_db(conn)
+    habit = add_habit(conn, "bieg", "binary", "daily", 1)
+    day = date(2024, 5, 2)
+    cache = bitsets_for(conn)
+    assert not cache.is_done(habit, day)
+    try:
+        with transaction(conn):
+            toggle_binary_habit(conn, habit, day)
+            log_habits(conn, day + timedelta(days=1), {habit: 1})
+            raise RuntimeError("abort the unit of work")
+    except RuntimeError:
+        pass
+    assert conn.execute("SELECT COUNT(*) FROM habit_logs").fetchone()[0] == 0
+    assert not cache.is_done(habit, day) and cache.longest_streak(habit) == 0
+
+    with transaction(conn):
+        toggle_binary_habit(conn, habit, day)
+        log_habits(conn, day + timedelta(days=1), {habit: 1})
+    assert cache.streak(habit, day + timedelta(days=1)) == 2
+    release_bitsets(conn)
+    conn.close()
@@ -0,0 +1,104 @@
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.calendar_service import (
+    load_month,
+    month_cache_for,
+    release_month_cache,
+    shift_month,
+)
+from services.db import get_connection, get_read_connection, init_db, open_memory_db
+from services.habits_service import add_habit, increment_quantity_habit, log_habits, toggle_binary_habit
+
+
+def _db():
+    conn = open_memory_db()
+    init_db(conn)
+    return conn
+
+
+def test_shift_month_wraps_years():
+    assert shift_month((2024, 1), -1) == (2023, 12)
+    assert shift_month((2024, 12), 1) == (2025, 1)
+    assert shift_month((2024, 3), -27) == (2021, 12)
+
+
+def test_load_month_is_one_query_and_places_values_by_day():
+    conn = _db()
+    run = add_habit(conn, "bieg", "binary", "daily", 1)
+    water = add_habit(conn, "woda", "quantity", "daily", 3)
+    toggle_binary_habit(conn, run, date(2024, 2, 29))
+    increment_quantity_habit(conn, water, date(2024, 2, 1), 2)
+    increment_quantity_habit(conn, water, date(2024, 3, 1), 5)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    block = load_month(conn, (2024, 2))
+    conn.set_trace_callback(None)
+    assert len(statements) == 1
+    assert len(block[run]) == 29 and block[run][28] == 1 and sum(block[run]) == 1
+    assert block[water][0] == 2 and sum(block[water]) == 2
+
+
+def test_cache_is_bounded_and_least_recently_used_goes_first():
+    conn = _db()
+    cache = month_cache_for(conn, max_months=3)
+    for month in [(2024, 1), (2024, 2), (2024, 3)]:
+        cache.get(month)
+    cache.get((2024, 1))  # now most recent
+    cache.get((2024, 4))
+    assert len(cache) == 3
+    assert cache.cached((2024, 2)) is None
+    assert cache.cached((2024, 1)) is not None
+    release_month_cache(conn)
+
+
+def test_habit_writes_drop_only_the_months_they_touch():
+    conn = _db()
+    habit = add_habit(conn, "bieg", "binary", "daily", 1)
+    cache = month_cache_for(conn)
+    cache.get((2024, 5))
+    cache.get((2024, 6))
+    toggle_binary_habit(conn, habit, date(2024, 5, 3))
+    assert cache.cached((2024, 5)) is None
+    assert cache.cached((2024, 6)) is not None
+    assert cache.get((2024, 5))[habit][2] == 1
+    log_habits(conn, date(2024, 6, 1), {habit: 1})
+    assert cache.get((2024, 6))[habit][0] == 1
+    release_month_cache(conn)
+
+
+def test_stale_prefetch_result_is_not_stored():
+    conn = _db()
+    cache = month_cache_for(conn)
+    version = cache._version((2024, 1))
+    cache.invalidate([(2024, 1)])
+    cache._store((2024, 1), {}, version)
+    assert cache.cached((2024, 1)) is None
+    release_month_cache(conn)
+
+
+def test_cache_keeps_months_read_through_another_connection(tmp_path):
+    path = tmp_path / "app.db"
+    conn = get_connection(str(path))
+    init_db(conn)
+    habit = add_habit(conn, "woda", "quantity", "daily", 3)
+    for day in range(1, 11):
+        increment_quantity_habit(conn, habit, date(2023, 12, day), day)
+    cache = month_cache_for(conn)
+    reader = get_read_connection(path)
+    for month in [(2023, 11), (2023, 12), (2024, 1)]:
+        cache.load(month, reader)
+    assert cache.cached((2023, 12))[habit][:10] == list(range(1, 11))
+    assert cache.cached((2024, 1)) == {}
+
+    # A load that read before invalidate() (of every month) is not kept.
+    version = cache._version((2024, 2))
+    cache.invalidate()
+    cache._store((2024, 2), {}, version)
+    assert len(cache) == 0
+    reader.close()
+    release_month_cache(conn)
+    conn.close()
@@ -0,0 +1,98 @@
+import gc
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.change_bus import CREATED, UPDATED, Change, publish, subscribe
+from services.db import init_db, open_memory_db, transaction
+from services.habits_service import add_habit, log_habits
+from services.tasks_service import add_task, assign_to_week, get_or_create_default_project, import_tasks, update_status
+from services.week_service import rollover_tasks
+
+
+def _db():
+    conn = open_memory_db()
+    init_db(conn)
+    return conn
+
+
+def test_changes_arrive_after_the_outermost_commit_and_not_after_rollback():
+    conn = _db()
+    project = get_or_create_default_project(conn)
+    seen = []
+
+    def on_change(change):
+        # Subscribers see committed data.
+        assert not conn.in_transaction
+        seen.append(change)
+
+    unsubscribe = subscribe(conn, on_change, ("task",))
+    with transaction(conn):
+        task = add_task(conn, project, "a")
+        update_status(conn, task, "DONE")
+        assert seen == []
+    assert seen == [Change("task", CREATED, (task,)), Change("task", UPDATED, (task,), frozenset({"status"}))]
+
+    with pytest.raises(RuntimeError):
+        with transaction(conn):
+            update_status(conn, task, "TODO")
+            raise RuntimeError
+    assign_to_week(conn, task, "2024-W01")  # filtered out
+    assert len(seen) == 2
+
+    unsubscribe()
+    update_status(conn, task, "TODO")
+    assert len(seen) == 2
+
+
+def test_failing_or_collected_subscribers_do_not_break_writers(caplog):
+    conn = _db()
+    seen = []
+
+    class View:
+        def on_change(self, change):
+            seen.append(change.entity)
+
+    def broken(change):
+        raise ValueError("boom")
+
+    view = View()
+    subscribe(conn, view.on_change)
+    publish(conn, Change("habit", CREATED, (1,)))
+    del view
+    gc.collect()
+    publish(conn, Change("habit", CREATED, (2,)))
+    assert seen == ["habit"]
+
+    subscribe(conn, broken)
+    subscribe(conn, seen.append)
+    publish(conn, Change("habit", CREATED, (3,)))
+    assert seen == ["habit", Change("habit", CREATED, (3,))]
+    assert "change subscriber failed" in caplog.text
+
+def test_services_describe_what_they_changed():
+    conn = _db()
+    project = get_or_create_default_project(conn)
+    old = add_task(conn, project, "old")
+    assign_to_week(conn, old, "2024-W01")
+    habit = add_habit(conn, "woda", "quantity", "daily", 3)
+    seen = []
+    subscribe(conn, seen.append)
+
+    import_tasks(conn, [{"title": "n", "week": "2024-W02"}, {"id": old, "notes": "x"}, {"title": ""}])
+    new = old + 1
+    assert seen == [
+        Change("task", CREATED, (new,)),
+        Change("task", UPDATED, (old,), frozenset({"notes"})),
+        Change("assignment", CREATED, (new,)),
+    ]
+    seen.clear()
+    log_habits(conn, date(2024, 1, 2), {habit: 2})
+    assert seen == [Change("habit_log", UPDATED, (habit,), frozenset({"value"}), (date(2024, 1, 2),))]
+    seen.clear()
+    rollover_tasks(conn, date(2024, 1, 10))
+    assert seen == [Change("assignment", CREATED, (old,))]
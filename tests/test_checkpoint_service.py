@@ -0,0 +1,76 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from PySide6.QtWidgets import QApplication
+
+from services.checkpoint_service import Checkpointer
+from services.db import init_db, open_memory_db
+from services.security_service import decrypt_to_bytes, derive_session_key, encrypt_bytes
+from services.tasks_service import add_task, get_backlog_tasks, get_or_create_default_project
+from ui.checkpoint_scheduler import CheckpointScheduler
+
+SESSION = derive_session_key("pw")
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
+def make_checkpointer(tmp_path):
+    enc = tmp_path / "app.db.enc"
+    conn = open_memory_db()
+    init_db(conn)
+    saves = []
+
+    def save(image):
+        saves.append(len(image))
+        encrypt_bytes(image, enc, SESSION)
+
+    return conn, enc, saves, Checkpointer(conn, save)
+
+
+def test_checkpoints_only_when_dirty(tmp_path):
+    conn, enc, saves, cp = make_checkpointer(tmp_path)
+    assert cp.checkpoint() is True
+    assert cp.checkpoint() is False
+
+    add_task(conn, get_or_create_default_project(conn), "A")
+    future = cp.checkpoint_async()
+    assert future is not None
+    future.result()
+    assert cp.checkpoint_async() is None
+    assert len(saves) == 2
+    assert list(tmp_path.iterdir()) == [enc]
+
+    restored = open_memory_db(decrypt_to_bytes(enc, SESSION))
+    assert [r["title"] for r in get_backlog_tasks(restored)] == ["A"]
+    cp.close()
+
+
+def test_open_transaction_is_not_captured(tmp_path):
+    conn, enc, saves, cp = make_checkpointer(tmp_path)
+    cp.checkpoint()
+    conn.execute("INSERT INTO app_settings(key, value) VALUES ('k', 'v')")
+    assert conn.in_transaction
+    assert cp.checkpoint() is False
+    conn.commit()
+    assert cp.checkpoint() is True
+    cp.close()
+
+
+def test_scheduler_lock_takes_final_checkpoint(qapp, tmp_path):
+    conn, enc, saves, cp = make_checkpointer(tmp_path)
+    scheduler = CheckpointScheduler(cp, interval_ms=60_000, idle_ms=60_000, lock_ms=60_000)
+    fired = []
+    scheduler.locked.connect(lambda: fired.append(True))
+    scheduler.lock()
+    assert fired == [True]
+    assert saves and enc.exists()
+    cp.close()
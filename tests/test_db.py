@@ -0,0 +1,231 @@
+import sqlite3
+import sys
+import threading
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services import (
+    analytics_service,
+    calendar_service,
+    habits_service,
+    rollup_service,
+    settings_service,
+    tasks_service,
+    week_service,
+)
+from services.db import (
+    SCHEMA_PATH,
+    SCHEMA_VERSION,
+    ReadPool,
+    get_connection,
+    init_db,
+    migrate,
+    open_memory_db,
+    schema_version,
+    transaction,
+)
+from services.security_service import decrypt_to_bytes, derive_session_key, encrypt_bytes
+from services.tasks_service import add_task, get_backlog_tasks, get_or_create_default_project
+
+
+def test_memory_db_roundtrips_through_encrypted_image(tmp_path):
+    enc = tmp_path / "app.db.enc"
+    session = derive_session_key("pw")
+
+    conn = open_memory_db()
+    init_db(conn)
+    add_task(conn, get_or_create_default_project(conn), "Zadanie")
+    encrypt_bytes(conn.serialize(), enc, session)
+    conn.close()
+
+    assert list(tmp_path.iterdir()) == [enc]
+    conn = open_memory_db(decrypt_to_bytes(enc, session))
+    init_db(conn)
+    assert [row["title"] for row in get_backlog_tasks(conn)] == ["Zadanie"]
+    conn.close()
+
+
+def test_migrations_upgrade_legacy_db_and_fold_duplicate_logs():
+    conn = open_memory_db()
+    conn.executescript(SCHEMA_PATH.read_text(encoding="utf-8"))
+    conn.execute("INSERT INTO habits(name, type, goal_type, goal_value) VALUES ('q', 'quantity', 'daily', 5)")
+    conn.execute("INSERT INTO habits(name, type, goal_type, goal_value) VALUES ('b', 'binary', 'daily', 1)")
+    conn.executemany(
+        "INSERT INTO habit_logs(habit_id, date, value) VALUES (?, ?, ?)",
+        [(1, "2024-01-01", 2), (1, "2024-01-01", 3), (2, "2024-01-01", 1), (2, "2024-01-01", 1)],
+    )
+    conn.commit()
+    assert schema_version(conn) == 0
+
+    init_db(conn)
+    assert schema_version(conn) == SCHEMA_VERSION
+    rows = conn.execute("SELECT habit_id, value FROM habit_logs ORDER BY habit_id").fetchall()
+    assert [tuple(r) for r in rows] == [(1, 5), (2, 1)]
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO habit_logs(habit_id, date) VALUES (2, '2024-01-01')")
+    conn.rollback()
+
+    assert migrate(conn) == SCHEMA_VERSION
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    with pytest.raises(RuntimeError):
+        migrate(conn)
+
+
+def _plans(conn, statements):
+    plans = []
+    for sql in statements:
+        if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+            continue
+        detail = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        plans.append((sql, detail))
+    return plans
+
+
+def test_service_queries_use_indexes():
+    """Every service statement must search, not scan, except listed full listings."""
+    conn = open_memory_db()
+    init_db(conn)
+    project = tasks_service.get_or_create_default_project(conn)
+    habit = habits_service.add_habit(conn, "h", "quantity", "daily", 3)
+    task = tasks_service.add_task(conn, project, "t")
+    day = date(2024, 1, 8)
+
+    calls = {
+        "get_or_create_default_project": lambda: tasks_service.get_or_create_default_project(conn),
+        "get_tasks_for_week": lambda: tasks_service.get_tasks_for_week(conn, "2024-W02"),
+        "get_backlog_tasks": lambda: tasks_service.get_backlog_tasks(conn),
+        "get_backlog_page": lambda: tasks_service.get_backlog_page(conn, 0, 50),
+        "locate_tasks": lambda: tasks_service.locate_tasks(conn, [task], "2024-W02"),
+        "get_week_page": lambda: tasks_service.get_week_page(conn, "2024-W02", ("TODO", "CANCELED"), 0, 50),
+        "assign_to_week": lambda: tasks_service.assign_to_week(conn, task, "2024-W01"),
+        "update_status": lambda: tasks_service.update_status(conn, task, "IN_PROGRESS"),
+        "bulk_update": lambda: tasks_service.bulk_update(conn, [{"id": task, "title": "u", "week": "2024-W01"}, {"title": "n"}]),
+        "get_active_habits": lambda: habits_service.get_active_habits(conn),
+        "toggle_binary_habit": lambda: habits_service.toggle_binary_habit(conn, habit, day),
+        "increment_quantity_habit": lambda: habits_service.increment_quantity_habit(conn, habit, day, 2),
+        "decrement_quantity_habit": lambda: habits_service.increment_quantity_habit(conn, habit, day, -9),
+        "log_habits": lambda: habits_service.log_habits(conn, day, {habit: 3}),
+        "goal_progress": lambda: rollup_service.goal_progress(conn, habit, day),
+        "habit_streak": lambda: rollup_service.habit_streak(conn, habit, day),
+        "today_progress": lambda: rollup_service.today_progress(conn, day),
+        "completion_rate": lambda: rollup_service.completion_rate(conn, habit, day, day),
+        "load_month": lambda: calendar_service.load_month(conn, (2024, 1)),
+        "weekly_report": lambda: analytics_service.weekly_report(conn, "2024-W01", "2024-W10"),
+        "get_setting": lambda: settings_service.get_setting(conn, "k"),
+        "set_setting": lambda: settings_service.set_setting(conn, "k", "v"),
+        "rollover_tasks": lambda: week_service.rollover_tasks(conn, day),
+    }
+    # Listings that return (almost) the whole table may scan it.
+    allowed_scans = {
+        "get_active_habits": {"SCAN habits"},
+        "today_progress": {"SCAN h"},
+        "get_backlog_tasks": {"SCAN t"},
+        # Tiny id-sequence table, the id list being looked up and the staging table.
+        "bulk_update": {
+            "SCAN CONSTANT ROW",
+            "SCAN sqlite_sequence",
+            "SCAN json_each VIRTUAL TABLE INDEX 1:",
+            "SCAN temp.import_weeks",
+        },
+        "log_habits": {"SCAN json_each VIRTUAL TABLE INDEX 1:"},
+        "locate_tasks": {"SCAN json_each VIRTUAL TABLE INDEX 1:"},
+        # Reads the whole status history once by design.
+        "weekly_report": {"SCAN task_events"},
+    }
+    for name, call in calls.items():
+        statements = []
+        conn.set_trace_callback(statements.append)
+        call()
+        conn.set_trace_callback(None)
+        assert statements, name
+        for sql, detail in _plans(conn, statements):
+            scans = {d for d in detail if d.startswith("SCAN")}
+            assert scans <= allowed_scans.get(name, set()), (name, sql, detail)
+
+
+def test_bulk_update_commits_once_and_skips_invalid_rows():
+    conn = open_memory_db()
+    init_db(conn)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    tasks_service.bulk_update(conn, [{"title": f"t{i}", "week": "2024-W01"} for i in range(50)])
+    conn.set_trace_callback(None)
+    assert sum(s.strip().upper() == "COMMIT" for s in statements) == 1
+
+    report = tasks_service.bulk_update(conn, [{"title": "kept"}, {"priority": 1}])  # second item has no title
+    assert [r.action for r in report.results] == ["inserted", "error"]
+    titles = [r["title"] for r in conn.execute("SELECT title FROM tasks")]
+    assert "kept" in titles and len(titles) == 51
+    assert not conn.in_transaction
+    conn.close()
+
+
+def test_nested_transactions_join_the_outer_unit():
+    conn = open_memory_db()
+    init_db(conn)
+    project = get_or_create_default_project(conn)
+    with pytest.raises(RuntimeError):
+        with transaction(conn):
+            add_task(conn, project, "a")  # would commit on its own outside the block
+            raise RuntimeError
+    assert get_backlog_tasks(conn) == []
+    conn.close()
+
+
+def test_file_connections_use_wal_profile(tmp_path):
+    conn = get_connection(str(tmp_path / "app.db"))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    conn.close()
+
+
+def test_read_pool_bounds_and_reuses_read_only_connections(tmp_path):
+    path = tmp_path / "app.db"
+    writer = get_connection(str(path))
+    init_db(writer)
+    project = get_or_create_default_project(writer)
+    pool = ReadPool(path, size=2)
+
+    with pool.connection() as first:
+        second = pool.acquire()
+        with pytest.raises(TimeoutError):
+            pool.acquire(timeout=0.05)
+        assert first.execute("PRAGMA query_only").fetchone()[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            first.execute("DELETE FROM tasks")
+        # Readers see what the writer committed, even while one is checked out.
+        add_task(writer, project, "Zadanie")
+        assert [row["title"] for row in get_backlog_tasks(second)] == ["Zadanie"]
+        pool.release(second)
+    again = pool.acquire()
+    assert again in (first, second)
+    pool.release(again)
+
+    # Checkout from several threads at once never exceeds the bound and only
+    # ever hands out the two connections opened above.
+    in_use, used, peak, lock = set(), set(), [0], threading.Lock()
+
+    def read():
+        for _ in range(50):
+            with pool.connection() as conn:
+                with lock:
+                    in_use.add(id(conn))
+                    used.add(id(conn))
+                    peak[0] = max(peak[0], len(in_use))
+                conn.execute("SELECT COUNT(*) FROM tasks").fetchone()
+                with lock:
+                    in_use.discard(id(conn))
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 1 <= peak[0] <= pool.size
+    assert used <= {id(first), id(second)}
+    pool.close()
+    writer.close()
@@ -0,0 +1,130 @@
+import sys
+import threading
+from concurrent.futures import CancelledError
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.change_bus import subscribe
+from services.db import ReadPool, get_connection, init_db, open_memory_db
+from services.db_executor import BACKGROUND, INTERACTIVE, NORMAL, REPORT, DbExecutor
+from services.tasks_service import import_tasks
+
+
+def _executor():
+    conn = open_memory_db(check_same_thread=False)
+    init_db(conn)
+    return DbExecutor(conn)
+
+
+def _block(executor):
+    """Occupy the worker until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def wait(conn):
+        started.set()
+        release.wait(5)
+
+    executor.submit(wait)
+    assert started.wait(5)
+    return release
+
+
+def test_jobs_run_on_the_worker_in_priority_order():
+    executor = _executor()
+    release = _block(executor)
+    ran = []
+
+    def job(conn, name):
+        ran.append((name, threading.current_thread().name))
+        return name
+
+    futures = [
+        executor.submit(job, "report", priority=REPORT),
+        executor.submit(job, "import", priority=BACKGROUND),
+        executor.submit(job, "load", priority=NORMAL),
+        executor.submit(job, "click", priority=INTERACTIVE),
+        executor.submit(job, "drag", priority=INTERACTIVE),
+    ]
+    release.set()
+    assert [f.result(5) for f in futures] == ["report", "import", "load", "click", "drag"]
+    assert ran == [(name, "db") for name in ("click", "drag", "load", "report", "import")]
+
+    failing = executor.submit(lambda conn: conn.execute("SELECT nope"))
+    with pytest.raises(Exception, match="nope"):
+        failing.result(5)
+    executor.shutdown()
+
+
+def test_cancel_drops_queued_jobs_and_stops_a_running_import():
+    executor = _executor()
+    conn = executor.conn
+    seen = []
+    subscribe(conn, seen.append)
+    release = _block(executor)
+    queued = executor.submit(lambda conn: pytest.fail("cancelled job ran"))
+    assert queued.cancel()
+
+    batches = []
+
+    def records():
+        for i in range(10_000):
+            if i and i % 1000 == 0:
+                batches.append(i)
+                if len(batches) == 2:
+                    job.cancel()  # as if the user pressed "stop" mid-import
+            yield {"title": f"t{i}"}
+
+    job = executor.submit(
+        import_tasks, records(), batch_size=1000, checkpoint=executor.checkpoint, priority=BACKGROUND
+    )
+    release.set()
+    with pytest.raises(CancelledError):
+        job.result(5)
+    assert job.cancel_requested and len(batches) == 2
+    # Rolled back as a whole, and no change was announced.
+    count = executor.submit(lambda conn: conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0])
+    assert count.result(5) == 0 and seen == []
+    executor.shutdown()
+
+
+def test_shutdown_finishes_queued_jobs_first():
+    executor = _executor()
+    release = _block(executor)
+    last = executor.submit(lambda conn: import_tasks(conn, [{"title": "a"}]), priority=BACKGROUND)
+    release.set()
+    executor.shutdown()
+    assert last.done() and last.result().counts["inserted"] == 1
+    with pytest.raises(RuntimeError):
+        executor.submit(lambda conn: None)
+    # The worker has stopped; the connection is free for the caller again.
+    assert executor.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == 1
+
+
+def test_read_only_jobs_run_on_pooled_readers_beside_the_writer(tmp_path):
+    path = tmp_path / "app.db"
+    conn = get_connection(str(path), check_same_thread=False)
+    init_db(conn)
+    import_tasks(conn, [{"title": "a"}])
+    executor = DbExecutor(conn, read_pool=ReadPool(path, size=2))
+    release = _block(executor)  # a long write holds the writer
+
+    both = threading.Barrier(2, timeout=5)
+
+    def report(reader):
+        both.wait()  # only passes if the two reads run at the same time
+        return reader is not conn, reader.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    reads = [executor.submit(report, priority=REPORT, read_only=True) for _ in range(2)]
+    assert [f.result(5) for f in reads] == [(True, 1), (True, 1)]
+    write = executor.submit(lambda conn: import_tasks(conn, [{"title": "b"}]), priority=INTERACTIVE)
+    assert not write.done()
+    release.set()
+    write.result(5)
+    count = executor.submit(lambda c: c.execute("SELECT COUNT(*) FROM tasks").fetchone()[0], read_only=True)
+    assert count.result(5) == 2
+    executor.shutdown()
+    executor.read_pool.close()
+    conn.close()
@@ -0,0 +1,135 @@
+import sqlite3
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.db import init_db, open_memory_db
+from services.habits_service import (
+    HabitLogBuffer,
+    add_habit,
+    increment_quantity_habit,
+    log_habits,
+    toggle_binary_habit,
+)
+from services.rollup_service import goal_progress, today_progress, verify_rollups
+
+DAY = date(2024, 3, 4)
+
+
+def setup_conn():
+    conn = open_memory_db()
+    init_db(conn)
+    return conn
+
+
+def _trace(conn, call):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    result = call()
+    conn.set_trace_callback(None)
+    log_writes = [s for s in statements if "habit_logs" in s]
+    commits = sum(s.strip().upper() == "COMMIT" for s in statements)
+    return result, log_writes, commits
+
+
+def test_single_statement_write_paths():
+    conn = setup_conn()
+    water = add_habit(conn, "woda", "quantity", "daily", 8)
+    read = add_habit(conn, "czytanie", "binary", "daily", 1)
+
+    new, writes, commits = _trace(conn, lambda: increment_quantity_habit(conn, water, DAY, 1))
+    assert (new, len(writes), commits) == (1, 1, 1)
+    new, writes, _ = _trace(conn, lambda: increment_quantity_habit(conn, water, DAY, 2))
+    assert (new, len(writes)) == (3, 1)
+    assert increment_quantity_habit(conn, water, DAY, -5) == 0
+    assert increment_quantity_habit(conn, water, DAY, -1) == 0
+    assert conn.execute("SELECT COUNT(*) FROM habit_logs").fetchone()[0] == 0
+
+    done, writes, _ = _trace(conn, lambda: toggle_binary_habit(conn, read, DAY))
+    assert done is True and len(writes) == 2  # probe-by-DELETE, then INSERT
+    done, writes, _ = _trace(conn, lambda: toggle_binary_habit(conn, read, DAY))
+    assert done is False and len(writes) == 1
+    assert verify_rollups(conn) == []
+    conn.close()
+
+
+def test_log_habits_batch_clamps_and_commits_once():
+    conn = setup_conn()
+    water = add_habit(conn, "woda", "quantity", "daily", 8)
+    read = add_habit(conn, "czytanie", "binary", "daily", 1)
+    increment_quantity_habit(conn, water, DAY, 2)
+
+    values, _, commits = _trace(conn, lambda: log_habits(conn, DAY, {water: 3, read: 5, 999: 1}))
+    assert values == {water: 5, read: 1}
+    assert commits == 1
+    assert log_habits(conn, DAY, {water: -9, read: -1}) == {water: 0, read: 0}
+    assert conn.execute("SELECT COUNT(*) FROM habit_logs").fetchone()[0] == 0
+    assert verify_rollups(conn) == []
+    conn.close()
+
+
+def test_buffer_shows_clicks_immediately_and_writes_once():
+    conn = setup_conn()
+    water = add_habit(conn, "woda", "quantity", "daily", 8)
+    read = add_habit(conn, "czytanie", "binary", "daily", 1)
+    scheduled = []
+    buffer = HabitLogBuffer(conn, schedule=lambda: scheduled.append(1))
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    assert [buffer.add(water, DAY, 1) for _ in range(5)] == [1, 2, 3, 4, 5]
+    assert buffer.toggle(read, DAY) == 1
+    assert buffer.toggle(read, DAY) == 0
+    assert buffer.toggle(read, DAY) == 1
+    conn.set_trace_callback(None)
+    assert not [s for s in statements if s.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))]
+    assert len(scheduled) == 8 and buffer.pending() == 2
+
+    increment_quantity_habit(conn, water, DAY, 10)  # another writer meanwhile
+    _, _, commits = _trace(conn, buffer.flush)
+    assert commits == 1 and buffer.pending() == 0
+    assert goal_progress(conn, water, DAY).total == 15
+    assert buffer.value(read, DAY) == 1
+    assert buffer.flush() == 0
+    assert verify_rollups(conn) == []
+    conn.close()
+
+
+def test_buffer_keeps_clicks_when_the_write_fails(monkeypatch):
+    conn = setup_conn()
+    water = add_habit(conn, "woda", "quantity", "daily", 8)
+    buffer = HabitLogBuffer(conn)
+    for _ in range(3):
+        buffer.add(water, DAY, 1)
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    with monkeypatch.context() as patch:
+        patch.setattr("services.habits_service.log_habits", locked)
+        with pytest.raises(sqlite3.OperationalError):
+            buffer.flush()
+    assert buffer.pending() == 1
+    assert buffer.add(water, DAY, 1) == 4  # clicked again before the retry
+    assert buffer.flush() == 1
+    assert goal_progress(conn, water, DAY).total == 4
+    conn.close()
+
+
+def test_buffer_off_the_connection_thread_never_queries():
+    conn = setup_conn()
+    water = add_habit(conn, "woda", "quantity", "daily", 8)
+    buffer = HabitLogBuffer(conn, read_through=False)
+    with pytest.raises(KeyError):
+        buffer.value(water, DAY)
+    today_progress(conn, DAY)  # cached snapshot, as the Today view loads it
+    statements = []
+    conn.set_trace_callback(statements.append)
+    assert buffer.add(water, DAY, 2) == 2
+    conn.set_trace_callback(None)
+    assert statements == []
+    conn.close()
@@ -0,0 +1,89 @@
+import sys
+from pathlib import Path
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.db import init_db, open_memory_db
+from services.page_store import PageStore, is_page_store
+from services.security_service import EncryptedFormatError, derive_session_key, encrypt_bytes, rekey_file
+from services.tasks_service import add_task, get_backlog_tasks, get_or_create_default_project
+
+SESSION = derive_session_key("pw")
+
+
+def make_db(n_tasks: int):
+    conn = open_memory_db()
+    init_db(conn)
+    project = get_or_create_default_project(conn)
+    for i in range(n_tasks):
+        add_task(conn, project, f"Zadanie {i}", notes="x" * 200)
+    return conn
+
+
+def test_save_rewrites_only_changed_blocks(tmp_path):
+    conn = make_db(2000)
+    store = PageStore(tmp_path / "app.db.enc", SESSION, pages_per_block=1)
+    total = store.save(conn.serialize())
+    assert total > 50
+    assert store.save(conn.serialize()) == 0
+
+    add_task(conn, get_or_create_default_project(conn), "Nowe")
+    assert 0 < store.save(conn.serialize()) < total / 10
+
+    fresh = PageStore(tmp_path / "app.db.enc", SESSION, pages_per_block=1)
+    loaded = open_memory_db(fresh.load())
+    assert len(get_backlog_tasks(loaded)) == 2001
+    assert bytes(fresh.load()) == conn.serialize()
+
+
+def test_stale_block_is_rejected(tmp_path):
+    conn = make_db(300)
+    store = PageStore(tmp_path / "app.db.enc", SESSION, pages_per_block=1)
+    store.save(conn.serialize())
+    blocks = store.files()[1]
+    before = blocks.read_bytes()
+
+    conn.execute("UPDATE tasks SET title='changed'")
+    conn.commit()
+    store.save(conn.serialize())
+    # Roll the block file back: live slots now hold previous generations.
+    blocks.write_bytes(before)
+    with pytest.raises(InvalidTag):
+        PageStore(tmp_path / "app.db.enc", SESSION).load()
+
+
+def test_rekey_only_rewrites_manifest(tmp_path):
+    conn = make_db(50)
+    manifest = tmp_path / "app.db.enc"
+    store = PageStore(manifest, SESSION)
+    store.save(conn.serialize())
+    blocks = store.files()[1].read_bytes()
+
+    session = rekey_file(manifest, derive_session_key("pw", SESSION.kdf), "pw", {
+        "time_cost": 1, "memory_cost": 2 ** 13, "parallelism": 1,
+    })
+    assert store.files()[1].read_bytes() == blocks
+    assert bytes(PageStore(manifest, session).load()) == conn.serialize()
+
+
+def test_whole_image_from_another_mode_is_converted_on_save(tmp_path):
+    conn = make_db(50)
+    path = tmp_path / "app.db.enc"
+    encrypt_bytes(conn.serialize(), path, SESSION, codec="zlib")  # as db_mode "memory" saves it
+    assert not is_page_store(path, SESSION)
+
+    store = PageStore(path, SESSION)
+    assert bytes(store.load()) == conn.serialize() and store.files() == []
+    assert store.save(conn.serialize()) > 0
+    assert is_page_store(path, SESSION)
+    assert bytes(PageStore(path, SESSION).load()) == conn.serialize()
+
+    encrypt_bytes(b'{"not": "a manifest"}', path, SESSION)
+    with pytest.raises(EncryptedFormatError):
+        PageStore(path, SESSION).load()
+    encrypt_bytes(bytes(range(256)), path, SESSION)
+    with pytest.raises(EncryptedFormatError):
+        PageStore(path, SESSION).load()
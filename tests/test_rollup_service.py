@@ -0,0 +1,139 @@
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.db import SCHEMA_PATH, init_db, open_memory_db, transaction
+from services.habits_service import add_habit, increment_quantity_habit, toggle_binary_habit
+from services.rollup_service import (
+    completion_rate,
+    goal_progress,
+    habit_streak,
+    rebuild_rollups,
+    today_progress,
+    verify_rollups,
+)
+
+
+def setup_conn():
+    conn = open_memory_db()
+    init_db(conn)
+    return conn
+
+
+def test_incremental_rollups_match_a_rebuild():
+    conn = setup_conn()
+    rng = random.Random(3)
+    binary = add_habit(conn, "b", "binary", "weekly", 3)
+    quantity = add_habit(conn, "q", "quantity", "daily", 5)
+    start = date(2023, 12, 20)  # spans a year and ISO-week boundary
+    for _ in range(400):
+        day = start + timedelta(days=rng.randrange(40))
+        if rng.random() < 0.5:
+            toggle_binary_habit(conn, binary, day)
+        else:
+            increment_quantity_habit(conn, quantity, day, rng.choice([-3, -1, 1, 2, 4]))
+    assert verify_rollups(conn) == []
+    before = conn.execute("SELECT * FROM habit_rollups ORDER BY 1, 2, 3").fetchall()
+    rebuild_rollups(conn)
+    assert conn.execute("SELECT * FROM habit_rollups ORDER BY 1, 2, 3").fetchall() == before
+    assert not conn.execute("SELECT 1 FROM habit_rollups WHERE days <= 0").fetchall()
+
+    conn.execute("UPDATE habit_rollups SET total = total + 1 WHERE period = 'month'")
+    assert {row[1] for row in verify_rollups(conn)} == {"month"}
+    rebuild_rollups(conn, quantity)
+    assert {row[0] for row in verify_rollups(conn)} == {binary}
+    conn.close()
+
+
+def test_progress_streak_and_completion_rate():
+    conn = setup_conn()
+    daily = add_habit(conn, "pompki", "quantity", "daily", 10)
+    weekly = add_habit(conn, "bieg", "binary", "weekly", 2)
+    monday = date(2024, 1, 8)
+    for offset in range(4):  # Mon-Thu meet the goal
+        increment_quantity_habit(conn, daily, monday + timedelta(days=offset), 10)
+    increment_quantity_habit(conn, daily, monday + timedelta(days=4), 4)
+
+    friday = monday + timedelta(days=4)
+    progress = goal_progress(conn, daily, friday)
+    assert (progress.key, progress.total, progress.done, progress.ratio) == ("2024-01-12", 4, False, 0.4)
+    assert habit_streak(conn, daily, friday) == 4  # today is still open
+    assert habit_streak(conn, daily, friday + timedelta(days=1)) == 0
+    assert completion_rate(conn, daily, monday, monday + timedelta(days=6)) == 4 / 7
+
+    for day in (date(2023, 12, 26), date(2023, 12, 28), date(2024, 1, 2), date(2024, 1, 4), date(2024, 1, 9)):
+        toggle_binary_habit(conn, weekly, day)
+    assert goal_progress(conn, weekly, monday).key == "2024-W02"
+    assert habit_streak(conn, weekly, monday) == 2  # W52 and W01; W02 not done yet
+    toggle_binary_habit(conn, weekly, date(2024, 1, 10))
+    assert habit_streak(conn, weekly, monday) == 3
+    assert completion_rate(conn, weekly, date(2023, 12, 25), date(2024, 1, 21)) == 3 / 4
+    conn.close()
+
+
+def test_migration_backfills_rollups_from_existing_logs():
+    conn = open_memory_db()
+    conn.executescript(SCHEMA_PATH.read_text(encoding="utf-8"))
+    conn.execute("INSERT INTO habits(name, type, goal_type, goal_value) VALUES ('q', 'quantity', 'monthly', 5)")
+    conn.executemany(
+        "INSERT INTO habit_logs(habit_id, date, value) VALUES (1, ?, ?)",
+        [("2024-01-31", 2), ("2024-02-01", 3), ("2024-02-05", 1)],
+    )
+    init_db(conn)
+    rows = conn.execute("SELECT period, period_key, total, days FROM habit_rollups ORDER BY 1, 2").fetchall()
+    assert [tuple(r) for r in rows] == [
+        ("day", "2024-01-31", 2, 1),
+        ("day", "2024-02-01", 3, 1),
+        ("day", "2024-02-05", 1, 1),
+        ("month", "2024-01", 2, 1),
+        ("month", "2024-02", 4, 2),
+        ("week", "2024-W05", 5, 2),
+        ("week", "2024-W06", 1, 1),
+    ]
+    assert verify_rollups(conn) == []
+    conn.close()
+
+
+def test_today_progress_is_one_query_and_cached_until_a_write():
+    conn = setup_conn()
+    water = add_habit(conn, "woda", "quantity", "daily", 8)
+    run = add_habit(conn, "bieg", "binary", "weekly", 3)
+    books = add_habit(conn, "książki", "quantity", "monthly", 2)
+    conn.execute("UPDATE habits SET is_active = 0 WHERE id = ?", (books,))
+    wednesday = date(2024, 1, 10)
+    increment_quantity_habit(conn, water, wednesday, 5)
+    increment_quantity_habit(conn, water, wednesday - timedelta(days=1), 4)
+    toggle_binary_habit(conn, run, wednesday - timedelta(days=2))
+    toggle_binary_habit(conn, run, wednesday)
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    progress = today_progress(conn, wednesday)
+    assert today_progress(conn, wednesday) is progress
+    conn.set_trace_callback(None)
+    assert len(statements) == 1
+    assert [(p.name, p.total, p.today, p.goal, p.done) for p in progress] == [
+        ("woda", 5, 5, 8, False),
+        ("bieg", 2, 1, 3, False),
+    ]
+
+    increment_quantity_habit(conn, water, wednesday, 3)
+    assert today_progress(conn, wednesday)[0].done
+    add_habit(conn, "nowy", "binary", "daily", 1)
+    assert len(today_progress(conn, wednesday)) == 3
+    assert today_progress(conn, wednesday + timedelta(days=1))[0].total == 0
+
+    # Progress read inside a transaction that rolls back is not kept.
+    before = today_progress(conn, wednesday)
+    with pytest.raises(RuntimeError):
+        with transaction(conn):
+            increment_quantity_habit(conn, water, wednesday, 10)
+            assert today_progress(conn, wednesday)[0].today == 18
+            raise RuntimeError("rolled back")
+    assert today_progress(conn, wednesday) == before
+    conn.close()
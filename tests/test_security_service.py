@@ -0,0 +1,215 @@
+import io
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import services.security_service as sec
+from services.compression import READ_SIZE, compress, iter_decompressed
+from services.db import init_db
+from services.security_service import (
+    MIN_MEMORY_COST,
+    EncryptedFormatError,
+    _derive_key,
+    calibrate_kdf,
+    decrypt_file,
+    decrypt_stream,
+    derive_session_key,
+    encrypt_file,
+    encrypt_stream,
+    read_header,
+    store_security_meta,
+)
+
+KEY = bytes(range(32))
+
+
+@pytest.mark.parametrize("size", [0, 1, 63, 64, 65, 64 * 5])
+def test_stream_roundtrip_across_segment_boundaries(size):
+    data = os.urandom(size)
+    enc = io.BytesIO()
+    encrypt_stream(io.BytesIO(data), enc, KEY, segment_size=64)
+    out = io.BytesIO()
+    decrypt_stream(io.BytesIO(enc.getvalue()), out, KEY)
+    assert out.getvalue() == data
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma", "bz2"])
+def test_decompression_output_is_bounded(codec):
+    # An empty database image shrinks a thousandfold; it must not be inflated
+    # into one buffer.
+    data = bytes(8 * 1024 * 1024)
+    pieces = list(iter_decompressed([compress(data, codec)], codec))
+    assert max(len(piece) for piece in pieces) <= READ_SIZE
+    assert sum(len(piece) for piece in pieces) == len(data)
+
+
+def test_truncated_container_is_rejected():
+    enc = io.BytesIO()
+    encrypt_stream(io.BytesIO(b"x" * 200), enc, KEY, segment_size=64)
+    blob = enc.getvalue()
+    # Drop the final segment: the new last segment was not sealed as final.
+    last = 4 + 12 + (200 - 3 * 64) + 16
+    with pytest.raises(InvalidTag):
+        decrypt_stream(io.BytesIO(blob[:-last]), io.BytesIO(), KEY)
+    with pytest.raises(EncryptedFormatError):
+        decrypt_stream(io.BytesIO(blob[:-5]), io.BytesIO(), KEY)
+
+
+def test_file_roundtrip_and_legacy_blob(tmp_path):
+    plain = tmp_path / "app.db"
+    enc = tmp_path / "app.db.enc"
+    out = tmp_path / "out.db"
+    plain.write_bytes(os.urandom(5000))
+
+    encrypt_file(plain, enc, "pw", segment_size=1024)
+    decrypt_file(enc, out, "pw")
+    assert out.read_bytes() == plain.read_bytes()
+
+    nonce = os.urandom(12)
+    legacy = AESGCM(_derive_key("pw")).encrypt(nonce, b"old format", None)
+    enc.write_bytes(nonce + legacy)
+    decrypt_file(enc, out, "pw")
+    assert out.read_bytes() == b"old format"
+
+
+def test_wrong_password_leaves_no_plaintext(tmp_path):
+    plain = tmp_path / "app.db"
+    enc = tmp_path / "app.db.enc"
+    out = tmp_path / "out.db"
+    plain.write_bytes(b"secret")
+    encrypt_file(plain, enc, "pw")
+    with pytest.raises(InvalidTag):
+        decrypt_file(enc, out, "wrong")
+    assert not out.exists()
+
+
+def test_session_key_reuses_salt_and_reads_legacy(tmp_path, monkeypatch):
+    calls = []
+    real = sec._derive_key
+    monkeypatch.setattr(sec, "_derive_key", lambda *a, **k: calls.append(a) or real(*a, **k))
+
+    plain = tmp_path / "app.db"
+    enc = tmp_path / "app.db.enc"
+    out = tmp_path / "out.db"
+
+    nonce = os.urandom(12)
+    enc.write_bytes(nonce + AESGCM(real("pw")).encrypt(nonce, b"legacy", None))
+
+    session = sec.unlock(enc, "pw")
+    decrypt_file(enc, plain, session)
+    encrypt_file(plain, enc, session)
+    decrypt_file(enc, out, session)
+    assert out.read_bytes() == b"legacy"
+    # One derive for the legacy static salt, one for the fresh per-file salt.
+    assert len(calls) == 2
+    assert sec.read_kdf_meta(enc)["salt"] == session.kdf["salt"]
+
+    session.zeroize()
+    with pytest.raises(RuntimeError):
+        session.key
+
+    calls.clear()
+    again = sec.unlock(enc, "pw")
+    decrypt_file(enc, out, again)
+    assert out.read_bytes() == b"legacy"
+    assert len(calls) == 1
+
+
+def test_store_security_meta(tmp_path):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    session = derive_session_key("pw")
+    store_security_meta(conn, session)
+    rows = dict(conn.execute("SELECT key, value FROM security_meta").fetchall())
+    assert rows["kdf_salt"] == session.kdf["salt"]
+    assert rows["kdf_time_cost"] == "3"
+
+
+def test_calibrate_kdf_scales_memory_then_passes():
+    # Fake cost model: 0.1s per pass at the minimum memory, linear in memory.
+    def measure(params):
+        return 0.1 * params["memory_cost"] / MIN_MEMORY_COST * params["time_cost"]
+
+    params = calibrate_kdf(1.0, max_parallelism=4, measure=measure)
+    assert params["parallelism"] == 4
+    assert params["memory_cost"] == MIN_MEMORY_COST * 8
+    assert params["time_cost"] == 1
+    assert params["target_ms"] == 1000
+
+    capped = calibrate_kdf(1.0, max_memory_cost=MIN_MEMORY_COST * 2, measure=measure)
+    assert capped["memory_cost"] == MIN_MEMORY_COST * 2
+    assert capped["time_cost"] == 5
+
+
+def test_open_session_rekeys_outdated_file(tmp_path, monkeypatch):
+    fast = {"time_cost": 1, "memory_cost": 2 ** 13, "parallelism": 2, "target_ms": 7}
+    monkeypatch.setattr(sec, "calibrate_kdf", lambda *a, **k: dict(fast))
+
+    plain = tmp_path / "app.db"
+    enc = tmp_path / "app.db.enc"
+    out = tmp_path / "out.db"
+    plain.write_bytes(os.urandom(3000))
+    encrypt_file(plain, enc, "pw")
+    assert sec.read_kdf_meta(enc)["time_cost"] == 3
+
+    session = sec.open_session(enc, "pw", target_ms=7)
+    kdf = sec.read_kdf_meta(enc)
+    assert kdf["memory_cost"] == 2 ** 13 and kdf["target_ms"] == 7
+    decrypt_file(enc, out, session)
+    assert out.read_bytes() == plain.read_bytes()
+    assert list(tmp_path.glob("*.tmp")) == []
+
+    # Up-to-date files are unlocked with their stored parameters.
+    monkeypatch.setattr(sec, "calibrate_kdf", None)
+    again = sec.open_session(enc, "pw", target_ms=7)
+    assert again.kdf == session.kdf
+
+
+def test_secure_delete_overwrites_in_place_with_sidecars(tmp_path, monkeypatch):
+    db = tmp_path / "app.db"
+    wal = tmp_path / "app.db-wal"
+    db.write_bytes(b"A" * 10_000)
+    wal.write_bytes(b"B" * 3_000)
+    (tmp_path / "other.db-wal").write_bytes(b"keep")
+
+    written = {}
+    real = sec._overwrite
+
+    def spy(path, buf):
+        size = real(path, buf)
+        data = path.read_bytes()
+        written[path.name] = data
+        return size
+
+    monkeypatch.setattr(sec, "_overwrite", spy)
+    report = sec.secure_delete(db, buffer_size=4096)
+
+    assert report.files == [db, wal]
+    assert report.bytes == 13_000
+    # Overwritten in place: same size, original content gone.
+    assert len(written["app.db"]) == 10_000 and b"AAAA" not in written["app.db"]
+    assert len(written["app.db-wal"]) == 3_000 and b"BBBB" not in written["app.db-wal"]
+    assert not db.exists() and not wal.exists()
+    assert (tmp_path / "other.db-wal").exists()
+    assert sec.secure_delete(db).files == []
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma", "bz2"])
+def test_compressed_container_roundtrip(codec):
+    data = b"habit log row " * 20_000 + os.urandom(1000)
+    enc = io.BytesIO()
+    encrypt_stream(io.BytesIO(data), enc, KEY, segment_size=4096, codec=codec)
+    assert len(enc.getvalue()) < len(data) / 4
+    _, header = read_header(io.BytesIO(enc.getvalue()))
+    assert codec in header.decode()
+    out = io.BytesIO()
+    decrypt_stream(io.BytesIO(enc.getvalue()), out, KEY)
+    assert out.getvalue() == data
@@ -0,0 +1,57 @@
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services import task_import
+from services.task_import import RecordError, iter_json_records, iter_records, parse_records
+
+
+def test_json_reader_streams_wrapped_and_bare_arrays(monkeypatch):
+    # A tiny read size forces values to straddle buffer refills.
+    monkeypatch.setattr(task_import, "READ_SIZE", 7)
+    tasks = [
+        {"title": f"zadanie {i} – źle", "priority": 12345, "notes": None, "done": False, "estimate": -1.5e-3}
+        for i in range(20)
+    ]
+    wrapped = json.dumps({"version": 1, "tasks": tasks, "after": True}, indent=2)
+    assert list(iter_json_records(io.StringIO(wrapped))) == tasks
+    assert list(iter_json_records(io.StringIO(json.dumps(tasks)))) == tasks
+    assert list(iter_json_records(io.StringIO('{"tasks": []}'))) == []
+    assert list(iter_json_records(io.StringIO("{}"))) == []
+    with pytest.raises(ValueError):
+        list(iter_json_records(io.StringIO('{"tasks": [{"title": "a"} {"title": "b"}]}')))
+
+
+def test_json_reader_stops_at_a_malformed_element(monkeypatch):
+    monkeypatch.setattr(task_import, "READ_SIZE", 64)
+    reads = []
+
+    class Counting(io.StringIO):
+        def read(self, size=-1):
+            reads.append(size)
+            return super().read(size)
+
+    rest = ", ".join(['{"title": "ok"}'] * 10_000)
+    records = iter_json_records(Counting('[{"title": "a"}, {"title": nope}, ' + rest + "]"))
+    assert next(records) == {"title": "a"}
+    with pytest.raises(ValueError):
+        next(records)
+    assert len(reads) <= 2  # the rest of the file was never read
+
+
+def test_ndjson_files_and_pasted_text(tmp_path):
+    path = tmp_path / "tasks.ndjson"
+    path.write_text('{"title": "a"}\n\n{"id": 1, "status": "DONE"}\nnot json\n', encoding="utf-8")
+    records = list(iter_records(path))
+    assert records[:2] == [{"title": "a"}, {"id": 1, "status": "DONE"}]
+    assert isinstance(records[2], RecordError) and "line 4" in str(records[2])
+
+    assert list(parse_records(path.read_text(encoding="utf-8")))[:2] == records[:2]
+    assert list(parse_records('{"tasks": [{"title": "x"}]}')) == [{"title": "x"}]
+    assert list(parse_records('{\n "tasks": [{"title": "x"}]\n}')) == [{"title": "x"}]
+    assert list(parse_records("  ")) == []
@@ -2,13 +2,18 @@ import sqlite3
 from datetime import date
 
 from services.db import init_db
+from services.task_import import RecordError
 from services.tasks_service import (
     add_task,
     assign_to_week,
+    get_backlog_page,
     get_backlog_tasks,
     get_or_create_default_project,
     get_tasks_for_week,
+    get_week_page,
     bulk_update,
+    import_tasks,
+    update_status,
 )
 from services.week_service import iso_week
 
@@ -57,3 +62,81 @@ def test_bulk_update_creates_and_updates_tasks():
     rows = get_tasks_for_week(conn, "2024-W02")
     assert [row["title"] for row in rows] == ["B2"]
     conn.close()
+
+
+def test_import_tasks_reports_each_row_and_applies_set_based_changes():
+    conn = setup_conn()
+    project = get_or_create_default_project(conn)
+    existing = add_task(conn, project, "Stare")
+    records = [
+        {"title": "A", "week": "2024-W01"},
+        {"id": existing, "status": "DONE", "week": "2024-W01"},
+        {"id": existing, "title": "Stare 2"},  # repeated id: applied after the first edit
+        {"id": 999, "title": "brak"},
+        {"title": "", "week": "2024-W01"},
+        {"title": "B", "priority": 9},
+        RecordError("line 7: Expecting value"),
+        "nie obiekt",
+        {"title": "C", "week": "2024-05"},
+        {"id": existing + 1, "notes": "nowe"},  # the task inserted by row 1
+    ]
+    report = import_tasks(conn, records, batch_size=3)
+    assert [(r.row, r.action) for r in report.results] == [
+        (1, "inserted"),
+        (2, "updated"),
+        (3, "updated"),
+        (4, "error"),
+        (5, "error"),
+        (6, "error"),
+        (7, "error"),
+        (8, "error"),
+        (9, "error"),
+        (10, "updated"),
+    ]
+    assert report.counts == {"inserted": 1, "updated": 3, "unchanged": 0, "error": 6}
+    assert report.assigned == 2
+    new_id = report.results[0].task_id
+    assert new_id == existing + 1
+
+    rows = {r["id"]: r for r in conn.execute("SELECT * FROM tasks")}
+    assert (rows[existing]["title"], rows[existing]["status"]) == ("Stare 2", "DONE")
+    assert rows[new_id]["notes"] == "nowe"
+    assert [r["id"] for r in get_tasks_for_week(conn, "2024-W01")] == [existing, new_id]
+
+    # Deleted ids are never handed out again (AUTOINCREMENT semantics).
+    conn.execute("DELETE FROM weekly_assignments")
+    conn.execute("DELETE FROM tasks WHERE id=?", (new_id,))
+    report = import_tasks(conn, iter([{"title": "D"}]), keep_results=False)
+    assert report.results == [] and report.counts["inserted"] == 1
+    assert conn.execute("SELECT MAX(id) FROM tasks").fetchone()[0] == new_id + 1
+    conn.close()
+
+
+def test_import_reaches_checkpoints_through_runs_of_bad_rows():
+    conn = setup_conn()
+    checkpoints = []
+    records = [RecordError(f"line {i}: Expecting value") for i in range(1, 51)]
+    report = import_tasks(
+        conn, records, batch_size=10, keep_results=False, checkpoint=lambda: checkpoints.append(1)
+    )
+    assert report.counts["error"] == 50 and len(report.errors) == 50
+    assert len(checkpoints) == 5
+    conn.close()
+
+
+def test_pages_walk_backlog_and_week_columns_by_id():
+    conn = setup_conn()
+    project = get_or_create_default_project(conn)
+    ids = [add_task(conn, project, f"t{i}") for i in range(7)]
+    for task_id in ids[:3]:
+        assign_to_week(conn, task_id, "2024-W02")
+    update_status(conn, ids[1], "DONE")
+    update_status(conn, ids[2], "CANCELED")
+
+    first = get_backlog_page(conn, 0, 3)
+    assert [r.id for r in first] == ids[3:6]
+    assert [r.id for r in get_backlog_page(conn, first[-1].id, 3)] == ids[6:]
+    assert get_backlog_page(conn, ids[-1], 3) == []
+    assert [r.id for r in get_week_page(conn, "2024-W02", ("TODO", "CANCELED"))] == [ids[0], ids[2]]
+    assert get_week_page(conn, "2024-W02", ("DONE",)) == [(ids[1], "t1", "DONE")]
+    conn.close()
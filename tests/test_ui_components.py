@@ -1,10 +1,15 @@
+import gc
 import os
 import sys
 from pathlib import Path
 import sqlite3
-from datetime import date
+import threading
+import time
+import weakref
+from datetime import date, timedelta
 
 import pytest
+from PySide6.QtCore import QEventLoop, Qt, QTimer
 from PySide6.QtWidgets import QApplication, QLabel
 
 # Ensure Qt uses offscreen rendering
@@ -13,16 +18,26 @@ os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
 # Make application code importable
 sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
 
-from services.db import init_db
+from services.calendar_service import month_cache_for, release_month_cache
+from services.db import init_db, open_memory_db
+from services.db_executor import BACKGROUND, NORMAL, DbExecutor
+from services.habits_service import add_habit, log_habits, toggle_binary_habit
 from services.tasks_service import (
+    TaskRecord,
     add_task,
     assign_to_week,
     get_or_create_default_project,
+    import_tasks,
     update_status,
 )
 from services.week_service import iso_week
+from ui.calendar_view import CalendarView
+from ui.db_runner import DbRunner
 from ui.widgets.add_task_dialog import AddTaskDialog
 from ui.reports_view import ReportsView
+from ui.task_list_model import TaskListModel
+from ui.tasks_view import TasksView
+from ui.today_view import TodayView
 
 
 @pytest.fixture(scope="module")
@@ -64,3 +79,246 @@ def test_reports_view_shows_weekly_completion(qapp):
     assert label is not None
     assert label.text() == "Zadania: 1/2 ukończone w tym tygodniu"
     conn.close()
+
+
+def test_today_view_shows_clicks_before_the_debounced_write(qapp):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    add_habit(conn, "Woda", "quantity", "daily", 3)
+    add_habit(conn, "Bieg", "binary", "weekly", 2)
+    view = TodayView(conn)
+    item = view.list.item(0)
+    assert item.text() == "Woda: 0/3 dziś"
+    assert view.list.item(1).text() == "Bieg: 0/2 w tym tygodniu"
+    for _ in range(3):
+        view._log_clicked(item)
+    assert item.text() == "✓ Woda: 3/3 dziś"
+    assert conn.execute("SELECT COUNT(*) FROM habit_logs").fetchone()[0] == 0
+    view.flush()
+    assert conn.execute("SELECT value FROM habit_logs").fetchone()[0] == 3
+    view._log_clicked(view.list.item(1))
+    assert view.list.item(1).text() == "Bieg: 1/2 w tym tygodniu"
+
+
+def test_today_view_shows_streaks_and_follows_writes(qapp):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    habit = add_habit(conn, "Medytacja", "binary", "daily", 1)
+    today = date.today()
+    for days_ago in (1, 2):
+        log_habits(conn, today - timedelta(days=days_ago), {habit: 1})
+    view = TodayView(conn)
+    assert view.list.item(0).text() == "Medytacja: 0/1 dziś · seria 2"
+    toggle_binary_habit(conn, habit, today)
+    assert view.list.item(0).text() == "✓ Medytacja: 1/1 dziś · seria 3"
+    toggle_binary_habit(conn, habit, today - timedelta(days=1))
+    assert view.list.item(0).text() == "✓ Medytacja: 1/1 dziś"
+    conn.close()
+
+
+def test_calendar_view_loads_only_months_near_the_viewport(qapp):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    habit = add_habit(conn, "Bieg", "binary", "daily", 1)
+    toggle_binary_habit(conn, habit, date(date.today().year - 10, 1, 1))
+    view = CalendarView(conn)
+    view.resize(700, 300)
+    view.show()
+    view.grab()
+    heatmap = view.heatmap
+    assert len(heatmap.months) > 120
+    first, last = heatmap.visible_months()
+    assert first == 0 and last < 10
+    qapp.processEvents()  # idle prefetch of the neighbouring months
+    cache = month_cache_for(conn)
+    assert 0 < len(cache) < 20
+    assert cache.cached(heatmap.months[-1]) is None
+    heatmap.verticalScrollBar().setValue(heatmap.verticalScrollBar().maximum())
+    heatmap.grab()
+    assert cache.cached(heatmap.months[-1])[habit][0] == 1
+    view.close()
+    release_month_cache(conn)
+    conn.close()
+
+
+def test_heatmap_requests_months_again_after_a_failed_load(qapp, monkeypatch):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    view = CalendarView(conn)
+    heatmap = view.heatmap
+    month = heatmap.months[0]
+    cache = month_cache_for(conn)
+    cache.invalidate()
+
+    def locked(month, conn=None):
+        raise sqlite3.OperationalError("database is locked")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(cache, "load", locked)
+        heatmap._load([month], NORMAL)
+    assert month not in heatmap._loading and cache.cached(month) is None
+    heatmap._load([month], NORMAL)
+    assert cache.cached(month) == {}
+    view.close()
+    release_month_cache(conn)
+    conn.close()
+
+
+def test_task_list_model_keeps_paging_after_a_failed_page(qapp):
+    calls = []
+
+    def fetch_page(after_id, limit, done, failed):
+        calls.append(after_id)
+        if len(calls) == 2:
+            failed(sqlite3.OperationalError("database is locked"))
+        else:
+            done([TaskRecord(after_id + i + 1, f"t{after_id + i + 1}", "TODO") for i in range(limit)])
+
+    model = TaskListModel(fetch_page, page_size=2)
+    model.fetchMore()
+    model.fetchMore()  # fails
+    assert model.rowCount() == 2 and model.canFetchMore()
+    model.fetchMore()
+    assert model.rowCount() == 4 and calls == [0, 2, 2]
+
+
+def test_tasks_view_pages_the_backlog_and_moves_tasks_by_drag_and_drop(qapp):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    project = get_or_create_default_project(conn)
+    conn.executemany(
+        "INSERT INTO tasks(project_id, title) VALUES (?, ?)", [(project, f"t{i}") for i in range(1000)]
+    )
+    conn.commit()
+    week = iso_week(date.today())
+    assign_to_week(conn, 1, week)
+
+    view = TasksView(conn)
+    view.resize(800, 400)
+    view.show()
+    qapp.processEvents()
+    backlog = view.backlog_model
+    assert 0 < backlog.rowCount() < 1000
+    assert backlog.record(0).id == 2
+    view.backlog.scrollToBottom()
+    qapp.processEvents()
+    assert backlog.rowCount() > backlog.page_size
+
+    # Plan a task from the backlog, then drag it from TODO to DONE.
+    view._plan_backlog_task(backlog.index(0))
+    todo, done = view.models["TODO"], view.models["DONE"]
+    assert [todo.record(r).id for r in range(todo.rowCount())] == [1, 2]
+    mime = todo.mimeData([todo.index(1)])
+    assert done.dropMimeData(mime, Qt.MoveAction, -1, -1, done.index(-1))
+    todo.removeRows(1, 1)
+    assert conn.execute("SELECT status FROM tasks WHERE id=2").fetchone()[0] == "DONE"
+    assert [done.record(r) for r in range(done.rowCount())] == [(2, "t1", "DONE")]
+    assert not done.dropMimeData(done.mimeData([done.index(0)]), Qt.MoveAction, -1, -1, done.index(-1))
+    view.close()
+    conn.close()
+
+
+def test_views_patch_rows_after_writes_made_elsewhere(qapp):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    project = get_or_create_default_project(conn)
+    week = iso_week(date.today())
+    task = add_task(conn, project, "A")
+    assign_to_week(conn, task, week)
+    habit = add_habit(conn, "Woda", "quantity", "daily", 3)
+
+    tasks = TasksView(conn)
+    reports = ReportsView(conn)
+    today = TodayView(conn)
+    tasks.show()
+    qapp.processEvents()
+    todo, done = tasks.models["TODO"], tasks.models["DONE"]
+    assert todo.rowCount() == 1 and done.rowCount() == 0
+
+    update_status(conn, task, "DONE")
+    assert todo.rowCount() == 0 and done.record(0) == (task, "A", "DONE")
+    import_tasks(conn, [{"title": "B"}, {"title": "C", "week": week}])
+    assert [todo.record(r).title for r in range(todo.rowCount())] == ["C"]
+    assert tasks.backlog_model.record(0).title == "B"
+    qapp.processEvents()  # coalesced report refresh
+    assert reports.summary.text() == "Zadania: 1/2 ukończone w tym tygodniu"
+
+    log_habits(conn, date.today(), {habit: 3})
+    assert today.list.item(0).text() == "✓ Woda: 3/3 dziś"
+    add_habit(conn, "Bieg", "binary", "weekly", 2)
+    assert today.list.count() == 2
+    tasks.close()
+    conn.close()
+
+
+def test_views_run_database_work_on_the_executor(qapp):
+    conn = open_memory_db(check_same_thread=False)
+    init_db(conn)
+    add_habit(conn, "Woda", "quantity", "daily", 3)
+    executor = DbExecutor(conn)
+    runner = DbRunner(conn, executor)
+    calls = []
+    runner.subscribe(lambda change: calls.append(threading.current_thread()), ("task",))
+
+    def settle():
+        # Run the event loop until the worker is idle and its results are
+        # handled; twice, for the reloads those results queue in turn.
+        for _ in range(2):
+            marker = runner.run(lambda conn: None, priority=BACKGROUND)
+            loop = QEventLoop()
+            poll = QTimer()
+            poll.timeout.connect(lambda: marker.done() and not executor.pending() and loop.quit())
+            poll.start(5)
+            QTimer.singleShot(10_000, loop.quit)
+            loop.exec()
+            poll.stop()
+            assert marker.done()
+            QTimer.singleShot(20, loop.quit)
+            loop.exec()
+
+    tasks = TasksView(conn, runner)
+    reports = ReportsView(conn, runner)
+    today = TodayView(conn, runner)
+    tasks.show()
+    settle()
+    assert today.list.item(0).text() == "Woda: 0/3 dziś"
+
+    # The GUI thread keeps ticking while the worker imports.
+    ticks = []
+    timer = QTimer()
+    timer.timeout.connect(lambda: ticks.append(time.monotonic()))
+    timer.start(10)
+    week = iso_week(date.today())
+    job = runner.run(import_tasks, [{"title": f"t{i}", "week": week} for i in range(20_000)], priority=BACKGROUND)
+    settle()
+    timer.stop()
+    assert job.result().counts["inserted"] == 20_000
+    assert len(ticks) > 2 and max(b - a for a, b in zip(ticks, ticks[1:])) < 0.25
+
+    # Results and change notifications were handled on the GUI thread.
+    assert calls == [threading.main_thread()] * len(calls) and calls
+    assert tasks.models["TODO"].rowCount() > 0
+    assert reports.summary.text() == "Zadania: 0/20000 ukończone w tym tygodniu"
+    today._log_clicked(today.list.item(0))
+    today.flush()
+    settle()
+    assert today.list.item(0).text() == "Woda: 1/3 dziś"
+
+    # Views are freed as soon as they are dropped: left to the cyclic
+    # collector, they could be deleted on the worker, and Qt would crash.
+    tasks.close()
+    views = [weakref.ref(view) for view in (tasks, reports, today)]
+    gc.disable()
+    try:
+        del tasks, reports, today
+        assert [ref() for ref in views] == [None, None, None]
+    finally:
+        gc.enable()
+    executor.shutdown()
+    conn.close()
@@ -0,0 +1,175 @@
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.backup_service import BackupRepository, drive_backup
+from services.security_service import derive_session_key
+from services.upload_service import DriveBackend, LocalDirectoryBackend, UploadBackend, UploadQueue
+
+
+class FlakyBackend(LocalDirectoryBackend):
+    """Fails every third chunk once."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.calls = 0
+
+    def put(self, session, offset, data, size):
+        self.calls += 1
+        if self.calls % 3 == 0:
+            raise ConnectionError("network down")
+        return super().put(session, offset, data, size)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_queue_retries_with_backoff_and_resumes(tmp_path):
+    src = tmp_path / "snap.bin"
+    src.write_bytes(bytes(range(256)) * 40)  # 10 KiB
+    clock = Clock()
+    backend = FlakyBackend(tmp_path / "remote")
+    queue = UploadQueue(tmp_path / "queue.json", backend, chunk_size=1024, clock=clock)
+    queue.enqueue(src, "dir/snap.bin")
+
+    assert queue.run_pending() == 0
+    job = queue.jobs[0]
+    assert job["attempts"] == 1 and job["offset"] == 2048 and job["error"] == "network down"
+    assert queue.run_pending() == 0  # backing off
+
+    # A fresh queue (e.g. after restart) resumes from the persisted state.
+    backend = LocalDirectoryBackend(tmp_path / "remote")
+    clock.now += 10
+    queue = UploadQueue(tmp_path / "queue.json", backend, chunk_size=1024, clock=clock)
+    assert queue.pending() == 1
+    assert queue.run_pending() == 1
+    assert queue.pending() == 0
+    assert (tmp_path / "remote" / "dir" / "snap.bin").read_bytes() == src.read_bytes()
+
+
+def test_drive_backup_queues_only_new_repository_files(tmp_path):
+    repo_root = tmp_path / "backup"
+    repo = BackupRepository.open(repo_root, derive_session_key("pw"))
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t(x)")
+    conn.executemany("INSERT INTO t VALUES (?)", [("row %d" % i,) for i in range(5000)])
+    conn.commit()
+    first = repo.snapshot(conn.serialize())
+    second = repo.snapshot(conn.serialize())
+    assert len(second["files"]) == 1  # only the manifest is new
+
+    queue = UploadQueue(tmp_path / "queue.json", LocalDirectoryBackend(tmp_path / "remote"))
+    assert drive_backup(queue, repo_root, first["files"]) == len(first["files"]) + 1
+    assert queue.run_pending() == len(first["files"]) + 1
+    uploaded = {p.relative_to(tmp_path / "remote") for p in (tmp_path / "remote").rglob("*") if p.is_file()}
+    assert {p.relative_to(repo_root) for p in first["files"]} <= uploaded
+    assert Path("repo.key") in uploaded
+
+
+def test_worker_thread_drains_queue(tmp_path):
+    src = tmp_path / "a.bin"
+    src.write_bytes(b"x" * 5000)
+    queue = UploadQueue(tmp_path / "queue.json", LocalDirectoryBackend(tmp_path / "remote"), chunk_size=1024)
+    queue.start()
+    queue.enqueue(src)
+    for _ in range(200):
+        if queue.pending() == 0:
+            break
+        time.sleep(0.01)
+    queue.stop()
+    assert (tmp_path / "remote" / "a.bin").read_bytes() == src.read_bytes()
+
+
+class FakeDriveHttp:
+    """Stands in for AuthorizedHttp: remembers files by their appProperties path.
+
+    With *keep*, at most that many bytes of each chunk are stored, as Drive
+    may do; the 308 reply says how far the session got.
+    """
+
+    class Response(dict):
+        def __init__(self, status, **headers):
+            super().__init__(headers)
+            self.status = status
+
+    def __init__(self, keep=None):
+        self.keep = keep
+        self.files = {}  # path -> (id, data)
+        self.sessions = {}
+        self.received = {}  # session -> bytes stored so far
+        self.requests = []
+
+    def request(self, uri, method, body=None, headers=None):
+        self.requests.append((method, uri.split("?")[0]))
+        if method == "GET":
+            query = parse_qs(urlsplit(uri).query)["q"][0]
+            path = query.split("value='")[1].split("'")[0]
+            found = [{"id": self.files[path][0]}] if path in self.files else []
+            return self.Response(200), json.dumps({"files": found}).encode()
+        if method in ("POST", "PATCH"):
+            meta = json.loads(body)
+            path = meta["appProperties"]["path"]
+            file_id = self.files[path][0] if method == "PATCH" else f"id{len(self.files)}"
+            session = f"https://upload/{len(self.sessions)}"
+            self.sessions[session] = (path, file_id, meta["name"])
+            self.received[session] = b""
+            return self.Response(200, location=session), b""
+        path, file_id, _ = self.sessions[uri]
+        span, size = headers["Content-Range"].split()[1].split("/")
+        if span != "*":
+            start = int(span.split("-")[0])
+            assert start == len(self.received[uri])  # no gaps, no overlaps
+            self.received[uri] += body[: self.keep]
+        if len(self.received[uri]) == int(size):
+            self.files[path] = (file_id, self.received[uri])
+            return self.Response(200), b""
+        held = len(self.received[uri])
+        return self.Response(308, **({"range": f"bytes=0-{held - 1}"} if held else {})), b""
+
+
+def test_drive_updates_files_by_path_instead_of_duplicating(tmp_path):
+    key = tmp_path / "repo.key"
+    chunk = tmp_path / "chunk"
+    chunk.write_bytes(b"c")
+    http = FakeDriveHttp()
+    backend = DriveBackend(tmp_path / "token.json", "folder")
+    backend._http = http
+    queue = UploadQueue(tmp_path / "queue.json", backend)
+    for content in (b"key v1", b"key v2"):
+        key.write_bytes(content)
+        queue.enqueue(key, "repo.key")
+        queue.enqueue(key, "repo.key")  # still waiting: not queued twice
+        queue.enqueue(chunk, "chunks/ab/abcd")
+        queue.run_pending()
+    assert http.files == {"repo.key": ("id0", b"key v2"), "chunks/ab/abcd": ("id1", b"c")}
+    assert [m for m, _ in http.requests if m in ("POST", "PATCH")] == ["POST", "POST", "PATCH", "PATCH"]
+    assert {name for _, _, name in http.sessions.values()} == {"repo.key", "abcd"}
+
+
+def test_drive_resumes_from_the_bytes_the_server_kept(tmp_path):
+    src = tmp_path / "snap.bin"
+    src.write_bytes(bytes(range(256)) * 40)
+    http = FakeDriveHttp(keep=700)  # stores 700 of each 1024-byte chunk
+    backend = DriveBackend(tmp_path / "token.json", "folder")
+    backend._http = http
+    queue = UploadQueue(tmp_path / "queue.json", backend, chunk_size=1024)
+    queue.enqueue(src, "snap.bin")
+    assert queue.run_pending() == 1
+    assert http.files["snap.bin"][1] == src.read_bytes()
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        UploadBackend()
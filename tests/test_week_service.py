@@ -0,0 +1,59 @@
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from services.db import init_db, open_memory_db
+from services.settings_service import get_setting, set_setting
+from services.tasks_service import add_task, assign_to_week, get_or_create_default_project, update_status
+from services.week_service import rollover_tasks
+
+
+def test_rollover_catches_up_on_missed_weeks():
+    conn = open_memory_db()
+    init_db(conn)
+    project = get_or_create_default_project(conn)
+    set_setting(conn, "last_seen_iso_week", "2023-W51")
+
+    old = add_task(conn, project, "sprzed ostatniej wizyty")
+    assign_to_week(conn, old, "2023-W50")
+    a = add_task(conn, project, "a")
+    assign_to_week(conn, a, "2023-W51")
+    b = add_task(conn, project, "b")
+    assign_to_week(conn, b, "2023-W51")
+    assign_to_week(conn, b, "2023-W52")  # already carried once: latest week wins
+    c = add_task(conn, project, "c")
+    assign_to_week(conn, c, "2024-W01")
+    done = add_task(conn, project, "done")
+    assign_to_week(conn, done, "2024-W01")
+    update_status(conn, done, "DONE")
+
+    report = rollover_tasks(conn, date(2024, 1, 17))  # 2024-W03, three weeks later
+    assert report.week == "2024-W03"
+    assert report.counts == {"2023-W51": 1, "2023-W52": 1, "2024-W01": 1}
+    assert report.total == 3
+    rows = conn.execute(
+        "SELECT task_id, rolled_over, rolled_from FROM weekly_assignments WHERE iso_week='2024-W03' ORDER BY task_id"
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [(a, 1, "2023-W51"), (b, 1, "2023-W52"), (c, 1, "2024-W01")]
+    assert get_setting(conn, "last_seen_iso_week") == "2024-W03"
+
+    # Same week again, or a clock that went backwards: nothing to do.
+    assert rollover_tasks(conn, date(2024, 1, 18)).total == 0
+    assert rollover_tasks(conn, date(2024, 1, 1)).total == 0
+    assert get_setting(conn, "last_seen_iso_week") == "2024-W03"
+    conn.close()
+
+
+def test_first_rollover_only_looks_at_previous_week():
+    conn = open_memory_db()
+    init_db(conn)
+    project = get_or_create_default_project(conn)
+    older = add_task(conn, project, "older")
+    assign_to_week(conn, older, "2024-W01")
+    prev = add_task(conn, project, "prev")
+    assign_to_week(conn, prev, "2024-W02")
+
+    assert rollover_tasks(conn, date(2024, 1, 17)).counts == {"2024-W02": 1}
+    conn.close()